@@ -24,6 +24,15 @@ from app.utils.logger import emoji_logger
 
 from app.config import settings
 from app.integrations.supabase_client import supabase_client
+from app.agents.turn_context import TurnContext
+from app.agents.lead_state import EmotionalState, LeadState, lead_state_store
+from app.services.response_cache import response_cache
+from app.agents.conversation_features import (
+    ConversationFeatures,
+    EMOTION_KEYWORDS,
+    conversation_feature_store,
+    keyword_matcher
+)
 from app.teams.sdr_team import SDRTeam
 
 
@@ -41,17 +50,6 @@ class ConversationContext(Enum):
     CRM_UPDATE_NEEDED = "crm_update_needed"
 
 
-class EmotionalState(Enum):
-    """Estados emocionais do AGENTIC SDR"""
-    ENTUSIASMADA = "entusiasmada"
-    EMPATICA = "empatica"
-    CANSADA = "cansada"
-    DETERMINADA = "determinada"
-    FRUSTRADA_SUTIL = "frustrada_sutil"
-    CURIOSA = "curiosa"
-    SATISFEITA = "satisfeita"
-
-
 class AgenticSDR:
     """
     Agente Principal AGENTIC SDR Ultra-Humanizado
@@ -79,11 +77,8 @@ class AgenticSDR:
         self.lead_scoring_enabled = settings.enable_lead_scoring
         self.emoji_usage_enabled = settings.enable_emoji_usage
         
-        # Estado emocional e cognitivo
-        self.emotional_state = EmotionalState.ENTUSIASMADA
-        self.cognitive_load = 0.0
-        self.conversations_today = 0
-        self.last_break_time = datetime.now()
+        # Estado emocional e cognitivo fica por lead no lead_state_store:
+        # a instância é compartilhada entre leads (e não guarda estado de conversa)
         
         # Configuração do PostgreSQL/Supabase para storage
         postgres_config = {
@@ -271,8 +266,8 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
             debug_mode=settings.debug,
             # Configurações de personalidade
             system_prompt_kwargs={
-                "emotional_state": self.emotional_state.value,
-                "cognitive_load": self.cognitive_load,
+                "emotional_state": EmotionalState.ENTUSIASMADA.value,
+                "cognitive_load": 0.0,
                 "current_time": datetime.now().strftime("%H:%M"),
                 "day_of_week": datetime.now().strftime("%A")
             }
@@ -294,23 +289,24 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
         Returns:
             Análise contextual completa
         """
+        # Buscar últimas 100 mensagens
+        messages = await self.get_last_100_messages(phone)
+        
+        return self._build_context_analysis(messages, current_message)
+    
+    def _build_context_analysis(
+        self,
+        messages: List[Dict[str, Any]],
+        current_message: str,
+        features: Optional[ConversationFeatures] = None
+    ) -> Dict[str, Any]:
+        """Análise contextual sobre agregados da conversa (ou o histórico já carregado)"""
         try:
-            # Buscar últimas 100 mensagens
-            messages = await self.get_last_100_messages(phone)
+            if features is None:
+                features = ConversationFeatures.from_messages(messages)
             
             # Análise de padrões
-            context_analysis = {
-                "message_count": len(messages),
-                "conversation_duration": self._calculate_duration(messages),
-                "lead_engagement_level": self._analyze_engagement(messages),
-                "detected_intents": self._detect_intents(messages),
-                "emotional_trajectory": self._analyze_emotional_trajectory(messages),
-                "key_topics": self._extract_key_topics(messages),
-                "qualification_signals": self._detect_qualification_signals(messages),
-                "objections_raised": self._extract_objections(messages),
-                "decision_stage": self._determine_decision_stage(messages),
-                "urgency_level": self._assess_urgency(messages, current_message)
-            }
+            context_analysis = features.to_analysis(current_message)
             
             # Determinar contexto principal
             context_analysis["primary_context"] = self._determine_primary_context(
@@ -323,7 +319,7 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
             )
             
             emoji_logger.agentic_context(f"Contexto identificado: {context_analysis['primary_context']}",
-                                        messages_analyzed=len(messages),
+                                        messages_analyzed=context_analysis['message_count'],
                                         context_type=context_analysis['primary_context'])
             
             return context_analysis
@@ -352,18 +348,8 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
             if not conversation:
                 return []
             
-            # Buscar últimas 100 mensagens
-            query = supabase_client.client.table("messages")\
-                .select("*")\
-                .eq("conversation_id", conversation["id"])\
-                .order("created_at", desc=True)\
-                .limit(100)
-            
-            response = await query.execute()
-            messages = response.data if response.data else []
-            
-            # Reverter para ordem cronológica
-            messages.reverse()
+            # Janela de contexto em Redis (já em ordem cronológica)
+            messages = await supabase_client.get_conversation_window(conversation["id"], limit=100)
             
             emoji_logger.supabase_success(f"Mensagens recuperadas: {len(messages)}",
                                          execution_time=0.1)
@@ -396,43 +382,13 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
                 "message": "Análise emocional desabilitada"
             }
         
-        triggers = {
-            "frustration_indicators": 0,
-            "excitement_indicators": 0,
-            "hesitation_indicators": 0,
-            "urgency_indicators": 0,
-            "trust_indicators": 0
-        }
-        
-        # Palavras-chave para cada emoção
-        frustration_words = ["demora", "difícil", "complicado", "não entendo", "problema"]
-        excitement_words = ["ótimo", "excelente", "adorei", "perfeito", "maravilha"]
-        hesitation_words = ["não sei", "talvez", "preciso pensar", "dúvida", "será"]
-        urgency_words = ["urgente", "rápido", "agora", "hoje", "imediato"]
-        trust_words = ["confio", "acredito", "verdade", "sério", "garantia"]
+        triggers = {f"{emotion}_indicators": 0 for emotion in EMOTION_KEYWORDS}
         
         for msg in messages[-20:]:  # Últimas 20 mensagens
-            content = msg.get("content", "").lower()
-            
-            for word in frustration_words:
-                if word in content:
-                    triggers["frustration_indicators"] += 1
-            
-            for word in excitement_words:
-                if word in content:
-                    triggers["excitement_indicators"] += 1
-            
-            for word in hesitation_words:
-                if word in content:
-                    triggers["hesitation_indicators"] += 1
-            
-            for word in urgency_words:
-                if word in content:
-                    triggers["urgency_indicators"] += 1
-            
-            for word in trust_words:
-                if word in content:
-                    triggers["trust_indicators"] += 1
+            # Uma passada por mensagem: contagem de palavras-chave por emoção
+            emotions = keyword_matcher.scan(msg.get("content") or "").get("emotion", {})
+            for emotion, count in emotions.items():
+                triggers[f"{emotion}_indicators"] += count
         
         # Determinar estado emocional dominante
         max_trigger = max(triggers, key=triggers.get)
@@ -465,16 +421,16 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
             "reasoning": []
         }
         
+        delegation = keyword_matcher.scan(current_message).get("delegation", {})
+        
         # Fator 1: Complexidade da solicitação
-        if any(word in current_message.lower() for word in 
-               ["agendar", "reunião", "marcar", "horário", "disponibilidade"]):
+        if "scheduling" in delegation:
             decision_factors["complexity_score"] += 0.4
             decision_factors["recommended_agent"] = "CalendarAgent"
             decision_factors["reasoning"].append("Solicitação de agendamento detectada")
         
         # Fator 2: Análise de conta necessária
-        if context_analysis.get("has_bill_image") or \
-           "conta de luz" in current_message.lower():
+        if context_analysis.get("has_bill_image") or "bill_analysis" in delegation:
             decision_factors["complexity_score"] += 0.5
             decision_factors["recommended_agent"] = "BillAnalyzerAgent"
             decision_factors["reasoning"].append("Análise de conta necessária")
@@ -628,194 +584,6 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
             return []
     
     # Métodos auxiliares privados
-    def _calculate_duration(self, messages: List[Dict[str, Any]]) -> float:
-        """Calcula duração da conversa em horas"""
-        if len(messages) < 2:
-            return 0
-        
-        first_msg = datetime.fromisoformat(messages[0]["created_at"])
-        last_msg = datetime.fromisoformat(messages[-1]["created_at"])
-        
-        return (last_msg - first_msg).total_seconds() / 3600
-    
-    def _analyze_engagement(self, messages: List[Dict[str, Any]]) -> str:
-        """Analisa nível de engajamento do lead"""
-        if not messages:
-            return "low"
-        
-        # Calcular métricas de engajamento
-        user_messages = [m for m in messages if m.get("sender") == "user"]
-        avg_response_length = sum(len(m.get("content", "")) for m in user_messages) / max(len(user_messages), 1)
-        response_frequency = len(user_messages) / max(self._calculate_duration(messages), 1)
-        
-        if avg_response_length > 50 and response_frequency > 2:
-            return "high"
-        elif avg_response_length > 20 and response_frequency > 1:
-            return "medium"
-        else:
-            return "low"
-    
-    def _detect_intents(self, messages: List[Dict[str, Any]]) -> List[str]:
-        """Detecta intenções na conversa"""
-        intents = []
-        
-        intent_keywords = {
-            "save_money": ["economizar", "desconto", "reduzir", "conta alta"],
-            "install_solar": ["instalar", "painéis", "usina", "solar"],
-            "get_information": ["como funciona", "informações", "saber mais", "entender"],
-            "schedule_meeting": ["reunião", "agendar", "marcar", "conversar"],
-            "compare_options": ["diferença", "comparar", "melhor", "opções"]
-        }
-        
-        for msg in messages:
-            content = msg.get("content", "").lower()
-            for intent, keywords in intent_keywords.items():
-                if any(kw in content for kw in keywords) and intent not in intents:
-                    intents.append(intent)
-        
-        return intents
-    
-    def _analyze_emotional_trajectory(self, messages: List[Dict[str, Any]]) -> str:
-        """Analisa trajetória emocional da conversa"""
-        if not messages:
-            return "neutral"
-        
-        # Simplificado: análise das últimas mensagens
-        recent_messages = messages[-10:] if len(messages) > 10 else messages
-        
-        positive_count = 0
-        negative_count = 0
-        
-        for msg in recent_messages:
-            content = msg.get("content", "").lower()
-            
-            # Palavras positivas
-            if any(word in content for word in ["ótimo", "excelente", "perfeito", "adorei", "sim"]):
-                positive_count += 1
-            
-            # Palavras negativas
-            if any(word in content for word in ["não", "difícil", "caro", "problema", "dúvida"]):
-                negative_count += 1
-        
-        if positive_count > negative_count:
-            return "positive"
-        elif negative_count > positive_count:
-            return "negative"
-        else:
-            return "neutral"
-    
-    def _extract_key_topics(self, messages: List[Dict[str, Any]]) -> List[str]:
-        """Extrai tópicos principais da conversa"""
-        topics = []
-        
-        topic_keywords = {
-            "pricing": ["preço", "valor", "custo", "investimento"],
-            "savings": ["economia", "desconto", "redução"],
-            "contract": ["contrato", "prazo", "fidelidade"],
-            "installation": ["instalação", "obra", "telhado"],
-            "guarantee": ["garantia", "segurança", "risco"]
-        }
-        
-        for msg in messages:
-            content = msg.get("content", "").lower()
-            for topic, keywords in topic_keywords.items():
-                if any(kw in content for kw in keywords) and topic not in topics:
-                    topics.append(topic)
-        
-        return topics
-    
-    def _detect_qualification_signals(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Detecta sinais de qualificação do lead"""
-        signals = {
-            "bill_value": 0,
-            "has_decision_power": False,
-            "timeline_mentioned": False,
-            "budget_discussed": False,
-            "competitor_mentioned": False
-        }
-        
-        for msg in messages:
-            content = msg.get("content", "").lower()
-            
-            # Detectar valor da conta
-            import re
-            valores = re.findall(r'r\$?\s*(\d+\.?\d*)', content)
-            if valores:
-                signals["bill_value"] = max(signals["bill_value"], 
-                                           max(float(v.replace(".", "")) for v in valores))
-            
-            # Detectar poder de decisão
-            if any(word in content for word in ["eu decido", "sou o responsável", "minha empresa"]):
-                signals["has_decision_power"] = True
-            
-            # Timeline
-            if any(word in content for word in ["este mês", "urgente", "logo", "quando"]):
-                signals["timeline_mentioned"] = True
-            
-            # Budget
-            if any(word in content for word in ["orçamento", "investimento", "posso pagar"]):
-                signals["budget_discussed"] = True
-            
-            # Concorrência
-            if any(word in content for word in ["origo", "setta", "outro fornecedor"]):
-                signals["competitor_mentioned"] = True
-        
-        return signals
-    
-    def _extract_objections(self, messages: List[Dict[str, Any]]) -> List[str]:
-        """Extrai objeções mencionadas"""
-        objections = []
-        
-        objection_patterns = {
-            "price": ["muito caro", "não tenho dinheiro", "fora do orçamento"],
-            "trust": ["não confio", "é golpe", "enganação"],
-            "timing": ["não é o momento", "depois", "ano que vem"],
-            "need": ["não preciso", "não vale a pena", "satisfeito"],
-            "competitor": ["já tenho", "outro fornecedor", "contrato vigente"]
-        }
-        
-        for msg in messages:
-            content = msg.get("content", "").lower()
-            for objection_type, patterns in objection_patterns.items():
-                if any(p in content for p in patterns) and objection_type not in objections:
-                    objections.append(objection_type)
-        
-        return objections
-    
-    def _determine_decision_stage(self, messages: List[Dict[str, Any]]) -> str:
-        """Determina estágio de decisão do lead"""
-        if len(messages) < 5:
-            return "awareness"
-        
-        # Análise simplificada baseada em palavras-chave
-        recent_content = " ".join([m.get("content", "") for m in messages[-10:]])
-        
-        if any(word in recent_content.lower() for word in ["fechado", "vamos fazer", "aceito"]):
-            return "decision"
-        elif any(word in recent_content.lower() for word in ["quanto", "como funciona", "garantias"]):
-            return "consideration"
-        elif any(word in recent_content.lower() for word in ["interessante", "me conta mais"]):
-            return "interest"
-        else:
-            return "awareness"
-    
-    def _assess_urgency(self, messages: List[Dict[str, Any]], current_message: str) -> str:
-        """Avalia nível de urgência"""
-        urgency_keywords = {
-            "high": ["urgente", "agora", "hoje", "imediato"],
-            "medium": ["esta semana", "breve", "logo"],
-            "low": ["futuramente", "talvez", "vou pensar"]
-        }
-        
-        combined_text = current_message.lower() + " " + \
-                       " ".join([m.get("content", "") for m in messages[-5:]])
-        
-        for level, keywords in urgency_keywords.items():
-            if any(kw in combined_text for kw in keywords):
-                return level
-        
-        return "medium"
-    
     def _determine_primary_context(self, analysis: Dict[str, Any]) -> str:
         """Determina contexto principal da conversa"""
         # Lógica de priorização baseada na análise
@@ -887,7 +655,8 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
         message: str,
         lead_data: Optional[Dict[str, Any]] = None,
         conversation_id: Optional[str] = None,
-        media: Optional[Dict[str, Any]] = None
+        media: Optional[Dict[str, Any]] = None,
+        turn: Optional[TurnContext] = None
     ) -> str:
         """
         Processa mensagem com análise contextual inteligente
@@ -898,6 +667,7 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
             lead_data: Dados do lead
             conversation_id: ID da conversa
             media: Mídia anexada
+            turn: Contexto do turno já carregado (sem ele, é carregado aqui)
             
         Returns:
             Resposta do AGENTIC SDR
@@ -906,12 +676,26 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
             if not self.is_initialized:
                 await self.initialize()
             
-            # 1. SEMPRE fazer análise contextual completa
-            context_analysis = await self.analyze_conversation_context(phone, message)
+            # Conversa e histórico carregados uma única vez para todo o turno
+            if turn is None:
+                turn = await TurnContext.load(phone, message, lead=lead_data, media=media)
             
-            # 2. Detectar gatilhos emocionais
-            messages_history = await self.get_last_100_messages(phone)
-            emotional_triggers = await self.detect_emotional_triggers(messages_history)
+            # Estado emocional da Helen nesta conversa
+            lead_state = await lead_state_store.get(phone)
+            turn.lead_state = lead_state
+            
+            # 1. SEMPRE fazer análise contextual completa
+            # (agregados incrementais: só as mensagens novas são analisadas)
+            features = await conversation_feature_store.update(turn.conversation_id, turn.messages)
+            context_analysis = self._build_context_analysis(turn.messages, message, features)
+            turn.context_analysis = context_analysis
+            
+            # 2. Detectar gatilhos emocionais (também mantidos nos agregados)
+            if self.emotional_triggers_enabled:
+                emotional_triggers = features.emotional_triggers()
+            else:
+                emotional_triggers = await self.detect_emotional_triggers(turn.messages)
+            turn.emotional_triggers = emotional_triggers
             
             # 3. Processar multimodal se necessário
             multimodal_result = None
@@ -925,39 +709,31 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
                 # Adicionar ao contexto
                 context_analysis["has_media"] = True
                 context_analysis["media_analysis"] = multimodal_result
+                turn.multimodal_result = multimodal_result
             
             # 4. Decidir inteligentemente sobre SDR Team
             should_call, recommended_agent, reasoning = await self.should_call_sdr_team(
                 context_analysis,
                 message
             )
+            turn.sdr_team_used = bool(should_call and recommended_agent)
+            turn.recommended_agent = recommended_agent
+            turn.reasoning = reasoning
             
             # 5. Se precisar do SDR Team E contexto justificar
             if should_call and recommended_agent:
                 emoji_logger.team_delegate(recommended_agent, reasoning)
                 
-                # Preparar contexto enriquecido para o Team
-                enriched_context = {
-                    "phone": phone,
-                    "message": message,
-                    "lead_data": lead_data,
-                    "conversation_id": conversation_id,
-                    "context_analysis": context_analysis,
-                    "emotional_triggers": emotional_triggers,
-                    "recommended_agent": recommended_agent,
-                    "reasoning": reasoning,
-                    "multimodal_result": multimodal_result
-                }
-                
-                # Chamar SDR Team com contexto completo
+                # Chamar SDR Team com o contexto completo do turno
                 team_response = await self.sdr_team.process_message_with_context(
-                    enriched_context
+                    turn.to_enriched_context()
                 )
                 
                 # AGENTIC SDR ainda personaliza a resposta final
                 response = await self._personalize_team_response(
                     team_response,
-                    emotional_triggers
+                    emotional_triggers,
+                    lead_state
                 )
                 
             else:
@@ -983,25 +759,43 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
                 Responda de forma natural, empática e personalizada.
                 """
                 
-                # Usar reasoning para casos complexos
-                if context_analysis.get("complexity_score", 0) > 0.5:
-                    result = await self.reasoning_model.run(contextual_prompt)
-                else:
-                    result = await self.agent.run(contextual_prompt)
+                # Perguntas repetidas (FAQ) reaproveitam a resposta; mídia sempre vai ao LLM
+                response = None
+                if not multimodal_result:
+                    response = await response_cache.get(message, context_analysis, emotional_triggers)
                 
-                response = result.content
+                if response is None:
+                    # Usar reasoning para casos complexos
+                    if context_analysis.get("complexity_score", 0) > 0.5:
+                        result = await self.reasoning_model.run(contextual_prompt)
+                    else:
+                        result = await self.agent.run(contextual_prompt)
+                    
+                    response = result.content
+                    
+                    if not multimodal_result:
+                        await response_cache.put(
+                            message,
+                            context_analysis,
+                            response,
+                            lead_data=turn.lead,
+                            emotional_triggers=emotional_triggers
+                        )
+                else:
+                    emoji_logger.agentic_thinking("Resposta reaproveitada do cache")
             
             # 7. Ajustar estado emocional da Helen
-            self._update_emotional_state(emotional_triggers, context_analysis)
+            self._update_emotional_state(lead_state, emotional_triggers, context_analysis)
+            await lead_state_store.save(phone, lead_state)
             
             # 8. Salvar na memória
             await self.memory.add(
                 message=message,
                 user_id=phone,
                 metadata={
-                    "context_analysis": context_analysis,
-                    "emotional_state": self.emotional_state.value,
-                    "sdr_team_used": should_call
+                    "context_analysis": turn.context_analysis,
+                    "emotional_state": lead_state.emotional_state,
+                    "sdr_team_used": turn.sdr_team_used
                 }
             )
             
@@ -1017,7 +811,8 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
     async def _personalize_team_response(
         self,
         team_response: str,
-        emotional_triggers: Dict[str, Any]
+        emotional_triggers: Dict[str, Any],
+        lead_state: LeadState
     ) -> str:
         """Personaliza resposta do Team com toque do AGENTIC SDR"""
         
@@ -1026,7 +821,7 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
         Resposta técnica: {team_response}
         
         Emoção do lead: {emotional_triggers.get('dominant_emotion')}
-        Seu estado emocional: {self.emotional_state.value}
+        Seu estado emocional: {lead_state.emotional_state}
         
         Reescreva mantendo a informação mas com seu toque pessoal,
         empatia e naturalidade. Mantenha breve e direto.
@@ -1037,35 +832,36 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
     
     def _update_emotional_state(
         self,
+        lead_state: LeadState,
         emotional_triggers: Dict[str, Any],
         context_analysis: Dict[str, Any]
     ):
-        """Atualiza estado emocional do AGENTIC SDR baseado na conversa"""
+        """Atualiza estado emocional do AGENTIC SDR com o lead baseado na conversa"""
         
         # Lógica simplificada de transição de estados
         dominant_emotion = emotional_triggers.get("dominant_emotion")
         
         if dominant_emotion == "frustration" and \
            emotional_triggers.get("frustration_indicators", 0) > 3:
-            self.emotional_state = EmotionalState.FRUSTRADA_SUTIL
+            lead_state.emotional_state = EmotionalState.FRUSTRADA_SUTIL.value
         
         elif dominant_emotion == "excitement":
-            self.emotional_state = EmotionalState.ENTUSIASMADA
+            lead_state.emotional_state = EmotionalState.ENTUSIASMADA.value
         
         elif dominant_emotion == "hesitation":
-            self.emotional_state = EmotionalState.EMPATICA
+            lead_state.emotional_state = EmotionalState.EMPATICA.value
         
         elif context_analysis.get("decision_stage") == "decision":
-            self.emotional_state = EmotionalState.DETERMINADA
+            lead_state.emotional_state = EmotionalState.DETERMINADA.value
         
-        elif self.conversations_today > 20:
-            self.emotional_state = EmotionalState.CANSADA
+        elif lead_state.conversations_today > 20:
+            lead_state.emotional_state = EmotionalState.CANSADA.value
         
         # Incrementar contador de conversas
-        self.conversations_today += 1
+        lead_state.conversations_today += 1
         
-        emoji_logger.agentic_thinking(f"Estado emocional atualizado: {self.emotional_state.value}",
-                                     emotional_state=self.emotional_state.value)
+        emoji_logger.agentic_thinking(f"Estado emocional atualizado: {lead_state.emotional_state}",
+                                     emotional_state=lead_state.emotional_state)
     
     def _apply_typing_simulation(self, text: str) -> str:
         """Aplica simulação de digitação natural"""
@@ -1097,9 +893,8 @@ LEMBRE-SE: Você resolve 90% das conversas sozinha!
     def get_metrics(self) -> Dict[str, Any]:
         """Retorna métricas do agente"""
         return {
-            "emotional_state": self.emotional_state.value,
-            "conversations_today": self.conversations_today,
-            "cognitive_load": self.cognitive_load,
+            "lead_state": lead_state_store.get_stats(),
+            "response_cache": response_cache.get_stats(),
             "is_initialized": self.is_initialized
         }
 
@@ -0,0 +1,434 @@
+"""
+Conversation Features - Agregados incrementais da conversa para a análise contextual
+Cada mensagem é analisada uma única vez; o estado fica em um hash Redis por conversa
+Todas as tabelas de palavras-chave são casadas em uma passada pelo keyword_matcher
+"""
+
+import re
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.config import settings
+from app.integrations.redis_client import redis_client
+from app.utils.keyword_matcher import KeywordHits, KeywordMatcher
+
+# Palavras-chave das heurísticas de conversa
+INTENT_KEYWORDS = {
+    "save_money": ["economizar", "desconto", "reduzir", "conta alta"],
+    "install_solar": ["instalar", "painéis", "usina", "solar"],
+    "get_information": ["como funciona", "informações", "saber mais", "entender"],
+    "schedule_meeting": ["reunião", "agendar", "marcar", "conversar"],
+    "compare_options": ["diferença", "comparar", "melhor", "opções"]
+}
+
+TOPIC_KEYWORDS = {
+    "pricing": ["preço", "valor", "custo", "investimento"],
+    "savings": ["economia", "desconto", "redução"],
+    "contract": ["contrato", "prazo", "fidelidade"],
+    "installation": ["instalação", "obra", "telhado"],
+    "guarantee": ["garantia", "segurança", "risco"]
+}
+
+OBJECTION_KEYWORDS = {
+    "price": ["muito caro", "não tenho dinheiro", "fora do orçamento"],
+    "trust": ["não confio", "é golpe", "enganação"],
+    "timing": ["não é o momento", "depois", "ano que vem"],
+    "need": ["não preciso", "não vale a pena", "satisfeito"],
+    "competitor": ["já tenho", "outro fornecedor", "contrato vigente"]
+}
+
+SIGNAL_KEYWORDS = {
+    "has_decision_power": ["eu decido", "sou o responsável", "minha empresa"],
+    "timeline_mentioned": ["este mês", "urgente", "logo", "quando"],
+    "budget_discussed": ["orçamento", "investimento", "posso pagar"],
+    "competitor_mentioned": ["origo", "setta", "outro fornecedor"]
+}
+
+SENTIMENT_KEYWORDS = {
+    "positive": ["ótimo", "excelente", "perfeito", "adorei", "sim"],
+    "negative": ["não", "difícil", "caro", "problema", "dúvida"]
+}
+
+# Estágios em ordem de prioridade (o mais avançado nas mensagens recentes vence)
+STAGE_KEYWORDS = {
+    "decision": ["fechado", "vamos fazer", "aceito"],
+    "consideration": ["quanto", "como funciona", "garantias"],
+    "interest": ["interessante", "me conta mais"]
+}
+STAGE_ORDER = list(STAGE_KEYWORDS)
+
+URGENCY_KEYWORDS = {
+    "high": ["urgente", "agora", "hoje", "imediato"],
+    "medium": ["esta semana", "breve", "logo"],
+    "low": ["futuramente", "talvez", "vou pensar"]
+}
+URGENCY_ORDER = list(URGENCY_KEYWORDS)
+
+# Gatilhos emocionais (contagem de palavras-chave por mensagem)
+EMOTION_KEYWORDS = {
+    "frustration": ["demora", "difícil", "complicado", "não entendo", "problema"],
+    "excitement": ["ótimo", "excelente", "adorei", "perfeito", "maravilha"],
+    "hesitation": ["não sei", "talvez", "preciso pensar", "dúvida", "será"],
+    "urgency": ["urgente", "rápido", "agora", "hoje", "imediato"],
+    "trust": ["confio", "acredito", "verdade", "sério", "garantia"]
+}
+
+# Pedidos que justificam delegar ao SDR Team
+DELEGATION_KEYWORDS = {
+    "scheduling": ["agendar", "reunião", "marcar", "horário", "disponibilidade"],
+    "bill_analysis": ["conta de luz"]
+}
+
+# Compilado uma vez na importação
+keyword_matcher = KeywordMatcher({
+    "intent": INTENT_KEYWORDS,
+    "topic": TOPIC_KEYWORDS,
+    "objection": OBJECTION_KEYWORDS,
+    "signal": SIGNAL_KEYWORDS,
+    "sentiment": SENTIMENT_KEYWORDS,
+    "stage": STAGE_KEYWORDS,
+    "urgency": URGENCY_KEYWORDS,
+    "emotion": EMOTION_KEYWORDS,
+    "delegation": DELEGATION_KEYWORDS
+})
+
+BILL_VALUE_RE = re.compile(r'r\$?\s*(\d+\.?\d*)')
+
+# Mensagens recentes consideradas por cada sinal
+SENTIMENT_WINDOW = 10
+STAGE_WINDOW = 10
+URGENCY_WINDOW = 5
+EMOTION_WINDOW = 20
+EMOTION_ORDER = list(EMOTION_KEYWORDS)
+
+
+def _urgency_mask(hits: KeywordHits) -> int:
+    """Bits dos níveis de urgência encontrados (high=1, medium=2, low=4)"""
+    levels = hits.get("urgency", {})
+    mask = 0
+    for bit, level in enumerate(URGENCY_ORDER):
+        if level in levels:
+            mask |= 1 << bit
+    return mask
+
+
+def _hours_between(start: str, end: str) -> float:
+    """Horas entre dois timestamps ISO (0 se não comparáveis)"""
+    try:
+        return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds() / 3600
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass
+class ConversationFeatures:
+    """
+    Estado agregado da conversa
+
+    Conjuntos (intenções, tópicos, objeções), máximos (valor da conta),
+    contadores (mensagens, caracteres, sentimento) e janelas curtas para
+    os sinais que dependem só das últimas mensagens. add() incorpora uma
+    mensagem em O(1); to_analysis() gera o mesmo dicionário que a
+    análise completa sobre o histórico.
+    """
+    message_count: int = 0
+    user_message_count: int = 0
+    user_chars: int = 0
+    first_at: str = ""
+    last_at: str = ""
+    last_message_id: str = ""
+
+    intents: List[str] = field(default_factory=list)
+    topics: List[str] = field(default_factory=list)
+    objections: List[str] = field(default_factory=list)
+
+    bill_value: float = 0
+    has_decision_power: bool = False
+    timeline_mentioned: bool = False
+    budget_discussed: bool = False
+    competitor_mentioned: bool = False
+
+    positive_count: int = 0
+    negative_count: int = 0
+
+    # Janelas curtas: um caractere por mensagem, mais recente no fim
+    recent_sentiment: str = ""  # p, n, b (ambos) ou -
+    recent_stage: str = ""      # índice em STAGE_ORDER ou -
+    recent_urgency: str = ""    # máscara de _urgency_mask (0-7)
+    recent_emotions: str = ""   # um dígito por emoção de EMOTION_ORDER por mensagem
+
+    @classmethod
+    def from_messages(cls, messages: List[Dict[str, Any]]) -> "ConversationFeatures":
+        """Reconstrói o estado a partir do histórico completo"""
+        features = cls()
+        for message in messages:
+            features.add(message)
+        return features
+
+    def add(self, message: Dict[str, Any]):
+        """Incorpora uma nova mensagem ao estado"""
+        content = (message.get("content") or "").lower()
+        hits = keyword_matcher.scan(content)
+        created_at = message.get("created_at") or ""
+
+        self.message_count += 1
+        if created_at:
+            self.first_at = self.first_at or created_at
+            self.last_at = created_at
+        self.last_message_id = str(message.get("id") or "")
+
+        if message.get("sender") == "user":
+            self.user_message_count += 1
+            self.user_chars += len(message.get("content") or "")
+
+        # Ordem das tabelas: rótulos da mesma mensagem entram na ordem original
+        for name in INTENT_KEYWORDS:
+            if name in hits.get("intent", {}) and name not in self.intents:
+                self.intents.append(name)
+
+        for name in TOPIC_KEYWORDS:
+            if name in hits.get("topic", {}) and name not in self.topics:
+                self.topics.append(name)
+
+        for name in OBJECTION_KEYWORDS:
+            if name in hits.get("objection", {}) and name not in self.objections:
+                self.objections.append(name)
+
+        values = BILL_VALUE_RE.findall(content)
+        if values:
+            self.bill_value = max(self.bill_value, max(float(v.replace(".", "")) for v in values))
+
+        for name in hits.get("signal", {}):
+            setattr(self, name, True)
+
+        positive = "positive" in hits.get("sentiment", {})
+        negative = "negative" in hits.get("sentiment", {})
+        self.positive_count += positive
+        self.negative_count += negative
+        sentiment = "b" if positive and negative else "p" if positive else "n" if negative else "-"
+        self.recent_sentiment = (self.recent_sentiment + sentiment)[-SENTIMENT_WINDOW:]
+
+        stage = next(
+            (str(index) for index, name in enumerate(STAGE_ORDER) if name in hits.get("stage", {})),
+            "-"
+        )
+        self.recent_stage = (self.recent_stage + stage)[-STAGE_WINDOW:]
+
+        self.recent_urgency = (self.recent_urgency + str(_urgency_mask(hits)))[-URGENCY_WINDOW:]
+
+        emotions = hits.get("emotion", {})
+        digits = "".join(str(min(emotions.get(name, 0), 9)) for name in EMOTION_ORDER)
+        self.recent_emotions = (self.recent_emotions + digits)[-EMOTION_WINDOW * len(EMOTION_ORDER):]
+
+    # ============= DERIVADOS =============
+
+    @property
+    def duration_hours(self) -> float:
+        """Duração da conversa em horas"""
+        if self.message_count < 2:
+            return 0
+        return _hours_between(self.first_at, self.last_at)
+
+    def engagement_level(self) -> str:
+        """Nível de engajamento do lead"""
+        if not self.message_count:
+            return "low"
+
+        avg_response_length = self.user_chars / max(self.user_message_count, 1)
+        response_frequency = self.user_message_count / max(self.duration_hours, 1)
+
+        if avg_response_length > 50 and response_frequency > 2:
+            return "high"
+        elif avg_response_length > 20 and response_frequency > 1:
+            return "medium"
+        return "low"
+
+    def emotional_trajectory(self) -> str:
+        """Trajetória emocional nas mensagens recentes"""
+        positive = sum(flag in "pb" for flag in self.recent_sentiment)
+        negative = sum(flag in "nb" for flag in self.recent_sentiment)
+
+        if positive > negative:
+            return "positive"
+        elif negative > positive:
+            return "negative"
+        return "neutral"
+
+    def decision_stage(self) -> str:
+        """Estágio de decisão pelas mensagens recentes"""
+        if self.message_count < 5:
+            return "awareness"
+
+        stages = [int(flag) for flag in self.recent_stage if flag != "-"]
+        if stages:
+            return STAGE_ORDER[min(stages)]
+        return "awareness"
+
+    def urgency_level(self, current_message: str) -> str:
+        """Nível de urgência pela mensagem atual e as últimas mensagens"""
+        mask = _urgency_mask(keyword_matcher.scan(current_message))
+        for flag in self.recent_urgency:
+            mask |= int(flag)
+
+        for bit, level in enumerate(URGENCY_ORDER):
+            if mask & (1 << bit):
+                return level
+        return "medium"
+
+    def emotional_triggers(self) -> Dict[str, Any]:
+        """Contagem de gatilhos emocionais nas mensagens recentes"""
+        triggers = {f"{name}_indicators": 0 for name in EMOTION_ORDER}
+        for index, digit in enumerate(self.recent_emotions):
+            triggers[f"{EMOTION_ORDER[index % len(EMOTION_ORDER)]}_indicators"] += int(digit)
+
+        # Emoção dominante (empate: a primeira da tabela)
+        dominant = max(triggers, key=triggers.get)
+        triggers["dominant_emotion"] = dominant.replace("_indicators", "")
+        return triggers
+
+    def to_analysis(self, current_message: str) -> Dict[str, Any]:
+        """Dicionário da análise contextual"""
+        return {
+            "message_count": self.message_count,
+            "conversation_duration": self.duration_hours,
+            "lead_engagement_level": self.engagement_level(),
+            "detected_intents": list(self.intents),
+            "emotional_trajectory": self.emotional_trajectory(),
+            "key_topics": list(self.topics),
+            "qualification_signals": {
+                "bill_value": self.bill_value,
+                "has_decision_power": self.has_decision_power,
+                "timeline_mentioned": self.timeline_mentioned,
+                "budget_discussed": self.budget_discussed,
+                "competitor_mentioned": self.competitor_mentioned
+            },
+            "objections_raised": list(self.objections),
+            "decision_stage": self.decision_stage(),
+            "urgency_level": self.urgency_level(current_message)
+        }
+
+    # ============= SERIALIZAÇÃO (HASH REDIS) =============
+
+    def to_hash(self) -> Dict[str, str]:
+        """Campos do hash Redis"""
+        encoded = {}
+        for name, value in asdict(self).items():
+            if isinstance(value, list):
+                value = ",".join(value)
+            elif isinstance(value, bool):
+                value = int(value)
+            encoded[name] = str(value)
+        return encoded
+
+    @classmethod
+    def from_hash(cls, data: Dict[str, str]) -> "ConversationFeatures":
+        """Estado a partir do hash Redis"""
+        values = {}
+        for spec in fields(cls):
+            if spec.name not in data:
+                continue
+            raw = data[spec.name]
+            if spec.type == List[str]:
+                values[spec.name] = raw.split(",") if raw else []
+            elif spec.type is bool:
+                values[spec.name] = raw == "1"
+            elif spec.type is int:
+                values[spec.name] = int(raw)
+            elif spec.type is float:
+                values[spec.name] = float(raw)
+            else:
+                values[spec.name] = raw
+        return cls(**values)
+
+
+class ConversationFeatureStore:
+    """
+    Persistência dos agregados por conversa em hash Redis
+
+    update() recebe a janela de mensagens do turno e incorpora apenas as
+    mensagens posteriores à última já vista (last_message_id). Sem
+    estado em cache, ou se a última mensagem vista saiu da janela, o
+    estado é reconstruído a partir da janela inteira.
+    """
+
+    def __init__(self):
+        """Inicializa o store com o TTL da janela de conversa"""
+        self.ttl = settings.conversation_window_ttl
+        self.rebuilds = 0
+        self.incremental_updates = 0
+
+    async def update(
+        self,
+        conversation_id: Optional[str],
+        messages: List[Dict[str, Any]]
+    ) -> ConversationFeatures:
+        """
+        Atualiza e persiste os agregados da conversa
+
+        Args:
+            conversation_id: ID da conversa
+            messages: Janela de mensagens em ordem cronológica
+
+        Returns:
+            Estado atualizado
+        """
+        if not conversation_id:
+            return ConversationFeatures.from_messages(messages)
+
+        key = f"features:{conversation_id}"
+        features = None
+
+        cached = await redis_client.get_hash(key)
+        if cached:
+            try:
+                features = ConversationFeatures.from_hash(cached)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Agregados inválidos da conversa {conversation_id}, reconstruindo: {e}")
+
+        new_messages = self._messages_after(features, messages) if features else None
+        if new_messages is None:
+            features = ConversationFeatures.from_messages(messages)
+            self.rebuilds += 1
+        elif new_messages:
+            for message in new_messages:
+                features.add(message)
+            self.incremental_updates += 1
+        else:
+            # Nada novo desde o último turno
+            return features
+
+        await redis_client.set_hash(key, features.to_hash(), ttl=self.ttl)
+        return features
+
+    def _messages_after(
+        self,
+        features: ConversationFeatures,
+        messages: List[Dict[str, Any]]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Mensagens da janela posteriores à última incorporada
+
+        Percorre a janela de trás para frente até a última mensagem vista.
+        Retorna None quando ela não está na janela (exige reconstrução).
+        """
+        if not features.last_message_id:
+            return None
+
+        for index in range(len(messages) - 1, -1, -1):
+            if str(messages[index].get("id")) == features.last_message_id:
+                return messages[index + 1:]
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna contadores de reconstrução e atualização incremental"""
+        return {
+            "rebuilds": self.rebuilds,
+            "incremental_updates": self.incremental_updates
+        }
+
+
+# Singleton global
+conversation_feature_store = ConversationFeatureStore()
@@ -0,0 +1,148 @@
+"""
+Lead State - Estado emocional e cognitivo do AGENTIC SDR por lead
+Hash Redis compacto por telefone com cache LRU em memória na frente
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, fields, replace
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.integrations.redis_client import redis_client
+
+
+class EmotionalState(Enum):
+    """Estados emocionais do AGENTIC SDR"""
+    ENTUSIASMADA = "entusiasmada"
+    EMPATICA = "empatica"
+    CANSADA = "cansada"
+    DETERMINADA = "determinada"
+    FRUSTRADA_SUTIL = "frustrada_sutil"
+    CURIOSA = "curiosa"
+    SATISFEITA = "satisfeita"
+
+
+@dataclass
+class LeadState:
+    """
+    Estado do AGENTIC SDR na conversa com um lead
+
+    conversations_today é zerado na virada do dia (campo day).
+    """
+    emotional_state: str = EmotionalState.ENTUSIASMADA.value
+    cognitive_load: float = 0.0
+    conversations_today: int = 0
+    day: str = field(default_factory=lambda: date.today().isoformat())
+    last_break_time: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def roll_day(self):
+        """Zera os contadores diários na virada do dia"""
+        today = date.today().isoformat()
+        if self.day != today:
+            self.day = today
+            self.conversations_today = 0
+
+    def to_hash(self) -> Dict[str, str]:
+        """Campos do hash Redis"""
+        return {name: str(value) for name, value in asdict(self).items()}
+
+    @classmethod
+    def from_hash(cls, data: Dict[str, str]) -> "LeadState":
+        """Estado a partir do hash Redis"""
+        values = {}
+        for spec in fields(cls):
+            if spec.name in data:
+                values[spec.name] = spec.type(data[spec.name])
+        return cls(**values)
+
+
+class LeadStateStore:
+    """
+    Estado por lead fora do agente singleton
+
+    Leituras passam por um LRU em processo; entradas mais antigas que
+    local_ttl são relidas do Redis, então vários workers ou réplicas
+    enxergam o estado gravado pelos outros. Gravações são write-through
+    (LRU e hash Redis com TTL).
+    """
+
+    def __init__(self):
+        """Inicializa o store com as configurações do .env"""
+        self.max_size = settings.lead_state_cache_size
+        self.local_ttl = settings.lead_state_local_ttl
+        self.ttl = settings.lead_state_ttl
+
+        self._cache: "OrderedDict[str, Tuple[LeadState, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, phone: str) -> LeadState:
+        """
+        Obtém o estado do lead
+
+        Args:
+            phone: Número do telefone
+
+        Returns:
+            Estado do lead (padrão se ainda não existe)
+        """
+        cached = self._cache.get(phone)
+        if cached and time.monotonic() - cached[1] < self.local_ttl:
+            self._cache.move_to_end(phone)
+            self.hits += 1
+            state = cached[0]
+        else:
+            self.misses += 1
+            state = LeadState()
+
+            data = await redis_client.get_hash(f"lead_state:{phone}")
+            if data:
+                try:
+                    state = LeadState.from_hash(data)
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"Estado inválido do lead {phone}, usando padrão: {e}")
+
+            self._remember(phone, state)
+
+        # Cópia: o turno altera o estado e só save() publica a alteração
+        state = replace(state)
+        state.roll_day()
+        return state
+
+    async def save(self, phone: str, state: LeadState):
+        """
+        Grava o estado do lead (LRU e Redis)
+
+        Args:
+            phone: Número do telefone
+            state: Estado atualizado
+        """
+        self._remember(phone, state)
+        await redis_client.set_hash(f"lead_state:{phone}", state.to_hash(), ttl=self.ttl)
+
+    def _remember(self, phone: str, state: LeadState):
+        """Adiciona ao LRU descartando o menos usado"""
+        self._cache[phone] = (state, time.monotonic())
+        self._cache.move_to_end(phone)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna ocupação e taxa de acerto do LRU"""
+        lookups = self.hits + self.misses
+        return {
+            "cached_leads": len(self._cache),
+            "cache_capacity": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+# Singleton global
+lead_state_store = LeadStateStore()
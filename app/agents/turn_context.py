@@ -0,0 +1,95 @@
+"""
+Turn Context - Estado de um turno do AGENTIC SDR
+Lead, conversa e janela de mensagens carregados uma vez por mensagem recebida
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.integrations.supabase_client import supabase_client
+from app.agents.lead_state import LeadState
+
+
+@dataclass
+class TurnContext:
+    """
+    Contexto de um turno de conversa
+
+    Criado uma vez no processamento da mensagem e repassado a todas as
+    etapas do agente (análise contextual, gatilhos emocionais, SDR Team,
+    memória), que leem daqui em vez de voltar ao Supabase. As etapas
+    preenchem os resultados de análise conforme avançam.
+    """
+    phone: str
+    message: str
+    lead: Optional[Dict[str, Any]] = None
+    conversation: Optional[Dict[str, Any]] = None
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    media: Optional[Dict[str, Any]] = None
+
+    # Resultados preenchidos pelo agente
+    lead_state: Optional[LeadState] = None
+    context_analysis: Dict[str, Any] = field(default_factory=dict)
+    emotional_triggers: Dict[str, Any] = field(default_factory=dict)
+    multimodal_result: Optional[Dict[str, Any]] = None
+    sdr_team_used: bool = False
+    recommended_agent: Optional[str] = None
+    reasoning: str = ""
+
+    @classmethod
+    async def load(
+        cls,
+        phone: str,
+        message: str,
+        lead: Optional[Dict[str, Any]] = None,
+        conversation: Optional[Dict[str, Any]] = None,
+        media: Optional[Dict[str, Any]] = None
+    ) -> "TurnContext":
+        """
+        Carrega o contexto do turno (conversa e janela de mensagens)
+
+        Args:
+            phone: Número do telefone
+            message: Mensagem (possivelmente agrupada) a processar
+            lead: Lead já resolvido, se houver
+            conversation: Conversa já resolvida, se houver
+            media: Mídia anexada
+
+        Returns:
+            Contexto pronto para o agente
+        """
+        if conversation is None:
+            conversation = await supabase_client.get_conversation_by_phone(phone)
+
+        messages = []
+        if conversation:
+            messages = await supabase_client.get_conversation_window(conversation["id"])
+
+        return cls(
+            phone=phone,
+            message=message,
+            lead=lead,
+            conversation=conversation,
+            messages=messages,
+            media=media
+        )
+
+    @property
+    def conversation_id(self) -> Optional[str]:
+        """ID da conversa do turno"""
+        return self.conversation["id"] if self.conversation else None
+
+    def to_enriched_context(self) -> Dict[str, Any]:
+        """Contexto enriquecido no formato esperado pelo SDR Team"""
+        return {
+            "phone": self.phone,
+            "message": self.message,
+            "lead_data": self.lead,
+            "conversation_id": self.conversation_id,
+            "messages": self.messages,
+            "context_analysis": self.context_analysis,
+            "emotional_triggers": self.emotional_triggers,
+            "recommended_agent": self.recommended_agent,
+            "reasoning": self.reasoning,
+            "multimodal_result": self.multimodal_result
+        }
@@ -86,6 +86,21 @@ async def metrics(request: Request):
             metrics_data["counters"]["messages_processed"] = await redis_client.get_counter("messages_processed")
             metrics_data["counters"]["leads_created"] = await redis_client.get_counter("leads_created")
             metrics_data["counters"]["meetings_scheduled"] = await redis_client.get_counter("meetings_scheduled")
+            metrics_data["counters"]["webhook_duplicates"] = await redis_client.get_counter("webhook_duplicates")
+            metrics_data["counters"]["admission_rejected"] = await redis_client.get_counter("admission_rejected")
+            metrics_data["counters"]["admission_acks"] = await redis_client.get_counter("admission_acks")
+            
+            # Buffer e latência de flush dos eventos de analytics
+            from app.services.analytics_sink import analytics_sink
+            metrics_data["analytics"] = analytics_sink.get_stats()
+            
+            # Pressão atual e limites do controle de admissão
+            from app.services.admission import admission_controller
+            metrics_data["admission"] = await admission_controller.get_stats()
+            
+            # Taxa de acerto do cache de respostas do LLM
+            from app.services.response_cache import response_cache
+            metrics_data["response_cache"] = response_cache.get_stats()
             
             # Gauges (valores atuais)
             connection_status = await redis_client.get("whatsapp:connection_status")
@@ -96,8 +111,10 @@ async def metrics(request: Request):
         if hasattr(request.app.state, 'supabase'):
             try:
                 stats = await request.app.state.supabase.get_daily_stats()
-                metrics_data["gauges"]["leads_today"] = stats.get("leads_today", 0)
-                metrics_data["gauges"]["conversations_active"] = stats.get("conversations_active", 0)
+                metrics_data["gauges"]["leads_today"] = stats.get("total_leads", 0)
+                metrics_data["gauges"]["qualified_leads_today"] = stats.get("qualified_leads", 0)
+                metrics_data["gauges"]["conversations_active"] = stats.get("active_conversations", 0)
+                metrics_data["gauges"]["meetings_today"] = stats.get("meetings_scheduled", 0)
             except:
                 pass
         
@@ -2,9 +2,11 @@
 Webhooks API - Recebe eventos da Evolution API
 """
 from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+import asyncio
 import base64
 import json
+import time
 from datetime import datetime
 from loguru import logger
 from app.utils.logger import emoji_logger
@@ -12,6 +14,20 @@ from app.integrations.supabase_client import supabase_client
 from app.integrations.redis_client import redis_client
 from app.integrations.evolution import evolution_client
 from app.agents.agentic_sdr import get_agentic_sdr  # Importa o AGENTIC SDR
+from app.agents.turn_context import TurnContext
+from app.services.message_queue import (
+    inbound_queue,
+    conversation_turn,
+    extract_phone,
+    group_messages_by_phone,
+    split_by_phone
+)
+from app.services.admission import admission_controller, NORMAL, ELEVATED, CRITICAL
+from app.services.message_coalescer import message_coalescer
+from app.services.outbound_scheduler import outbound_scheduler
+from app.services.write_behind import write_behind
+from app.services.event_aggregator import event_aggregator
+from app.utils.webhook_parser import peek_event, parse_event
 from app.config import settings
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
@@ -36,8 +52,16 @@ async def evolution_webhook(
     Recebe todos os eventos do WhatsApp
     """
     try:
-        # Recebe dados do webhook
-        data = await request.json()
+        # Identifica o evento antes do parse completo
+        body = await request.body()
+        event = peek_event(body)
+        
+        # Eventos sem handler são confirmados sem parse
+        if event is not None and event != "MESSAGES_UPSERT" and event not in EVENT_HANDLERS:
+            return {"status": "ignored", "event": event}
+        
+        # Blobs de mídia só são materializados para MESSAGES_UPSERT
+        data = parse_event(body, keep_media=event in (None, "MESSAGES_UPSERT"))
         
         # Log do evento recebido
         event = data.get("event")
@@ -47,59 +71,152 @@ async def evolution_webhook(
         
         # Processa eventos específicos
         if event == "MESSAGES_UPSERT":
-            # Nova mensagem recebida
-            background_tasks.add_task(
-                process_new_message,
-                data.get("data", {})
-            )
-            
-        elif event == "CONNECTION_UPDATE":
-            # Status da conexão mudou
-            await process_connection_update(data.get("data", {}))
+            # Controle de admissão antes da deduplicação: uma mensagem
+            # rejeitada com 429 precisa ser aceita quando a Evolution reenviar
+            pressure = NORMAL
+            if settings.admission_control_enabled:
+                pressure = await admission_controller.pressure()
+                
+                if pressure == CRITICAL:
+                    await redis_client.increment_counter("admission_rejected")
+                    emoji_logger.system_warning("Sobrecarga: MESSAGES_UPSERT rejeitado com 429")
+                    raise HTTPException(
+                        status_code=429,
+                        detail="Sistema sobrecarregado, tente novamente",
+                        headers={"Retry-After": str(settings.admission_retry_after)}
+                    )
             
-        elif event == "QRCODE_UPDATED":
-            # QR Code atualizado
-            await process_qrcode_update(data.get("data", {}))
+            # Descarta retries/duplicatas antes de qualquer processamento
+            message_data = await drop_duplicate_messages(data.get("data", {}))
+            if message_data is None:
+                return {"status": "duplicate", "event": event}
+            data["data"] = message_data
             
-        elif event == "MESSAGES_UPDATE":
-            # Status de mensagem atualizado (entregue, lida, etc)
-            await process_message_update(data.get("data", {}))
+            # Nova mensagem recebida - um job por telefone na fila durável
+            for phone_data in split_by_phone(message_data):
+                queued = False
+                if settings.inbound_queue_enabled:
+                    queued = await inbound_queue.publish(phone_data)
+                
+                # Fallback se a fila estiver desabilitada ou o Redis indisponível
+                if not queued:
+                    background_tasks.add_task(
+                        process_new_message,
+                        phone_data
+                    )
+                
+                # Sob pressão: confirmação rápida enquanto a resposta aguarda na fila
+                if pressure == ELEVATED and any(
+                    not message.get("key", {}).get("fromMe", False)
+                    and "@g.us" not in message.get("key", {}).get("remoteJid", "")
+                    for message in phone_data.get("messages", [])
+                ):
+                    background_tasks.add_task(
+                        admission_controller.send_quick_ack,
+                        extract_phone(phone_data)
+                    )
             
-        elif event == "PRESENCE_UPDATE":
-            # Status de presença (online, digitando, etc)
-            await process_presence_update(data.get("data", {}))
+        elif event in EVENT_HANDLERS:
+            await EVENT_HANDLERS[event](data.get("data", {}))
             
         return {"status": "ok", "event": event}
         
+    except HTTPException:
+        raise
     except Exception as e:
         emoji_logger.system_error("Webhook Evolution", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_new_message(data: Dict[str, Any]):
+async def drop_duplicate_messages(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Remove do payload mensagens cujo key.id já foi recebido
+    
+    Args:
+        data: Dados do MESSAGES_UPSERT
+        
+    Returns:
+        Payload apenas com mensagens novas ou None se todas eram duplicadas
+    """
+    if not settings.webhook_dedup_enabled:
+        return data
+    
+    messages = data.get("messages", [])
+    new_messages = []
+    
+    for message in messages:
+        message_id = message.get("key", {}).get("id")
+        
+        # Sem id não há como deduplicar
+        if not message_id or await redis_client.mark_seen(
+            "wa_message", message_id, ttl=settings.webhook_dedup_ttl
+        ):
+            new_messages.append(message)
+        else:
+            await redis_client.increment_counter("webhook_duplicates")
+            logger.debug(f"Mensagem duplicada descartada: {message_id}")
+    
+    if messages and not new_messages:
+        return None
+    
+    return {**data, "messages": new_messages}
+
+async def process_new_message(data: Dict[str, Any], raise_errors: bool = False):
     """
-    Processa nova mensagem recebida
+    Processa lote de mensagens recebidas (MESSAGES_UPSERT)
+    
+    O lote pode conter várias mensagens e vários telefones (ex.: sincronização
+    de histórico após reconexão). Cada telefone é processado uma única vez.
     
     Args:
-        data: Dados da mensagem
+        data: Dados das mensagens
+        raise_errors: Propaga falhas em vez de apenas registrá-las
     """
     try:
-        # Extrai informações da mensagem
         messages = data.get("messages", [])
         if not messages:
             return
         
-        message = messages[0]  # Pega primeira mensagem
-        
-        # Informações básicas
-        key = message.get("key", {})
-        remote_jid = key.get("remoteJid", "")
-        from_me = key.get("fromMe", False)
-        message_id = key.get("id", "")
+        groups = group_messages_by_phone(messages)
         
-        # Ignora mensagens enviadas por nós
-        if from_me:
-            return
+        async with admission_controller.track():
+            await asyncio.gather(*[
+                process_phone_messages(remote_jid, phone_messages, raise_errors=raise_errors)
+                for remote_jid, phone_messages in groups.items()
+            ])
         
+    except Exception as e:
+        emoji_logger.system_error("Webhook Message Processing", str(e))
+        if raise_errors:
+            raise
+        # Não lança exceção para não travar o webhook
+
+async def process_queued_message(data: Dict[str, Any]):
+    """
+    Handler da fila de entrada: falhas voltam ao worker para nack/retry
+    
+    Args:
+        data: Dados das mensagens de um telefone
+    """
+    await process_new_message(data, raise_errors=True)
+
+async def process_phone_messages(
+    remote_jid: str,
+    messages: List[Dict[str, Any]],
+    raise_errors: bool = False
+):
+    """
+    Processa as mensagens de um único telefone em uma passada
+    
+    Todas as mensagens do lead são salvas em um único insert e o agente
+    é acionado uma vez para o turno pendente mais recente (mensagens do
+    lead após nossa última resposta).
+    
+    Args:
+        remote_jid: JID do remetente
+        messages: Mensagens do telefone em ordem cronológica
+        raise_errors: Propaga falhas em vez de apenas registrá-las
+    """
+    try:
         # Extrai número do telefone
         phone = remote_jid.split("@")[0] if "@" in remote_jid else remote_jid
         
@@ -110,21 +227,69 @@ async def process_new_message(data: Dict[str, Any]):
             emoji_logger.webhook_process(f"Mensagem de grupo ignorada: {remote_jid}")
             return
         
-        # Extrai conteúdo da mensagem
-        message_content = extract_message_content(message)
+        # Mensagens do lead com conteúdo; as nossas marcam turnos já respondidos
+        entries = []
+        for message in messages:
+            if message.get("key", {}).get("fromMe", False):
+                entries.append((message, True, None))
+                continue
+            
+            # Extrai conteúdo da mensagem
+            message_content = extract_message_content(message)
+            
+            if not message_content:
+                emoji_logger.system_warning(f"Mensagem sem conteúdo de {phone}")
+                continue
+            
+            entries.append((message, False, message_content))
+        
+        user_entries = [(message, content) for message, from_me, content in entries if not from_me]
         
-        if not message_content:
-            emoji_logger.system_warning(f"Mensagem sem conteúdo de {phone}")
+        # Ignora lotes só com mensagens enviadas por nós
+        if not user_entries:
             return
         
-        emoji_logger.evolution_receive(phone, "text", preview=message_content[:100])
+        # Turno pendente: mensagens do lead após nossa última resposta
+        pending = []
+        for message, from_me, content in reversed(entries):
+            if from_me:
+                break
+            pending.append((message, content))
+        pending.reverse()
+        
+        for message, content in user_entries:
+            emoji_logger.evolution_receive(phone, "text", preview=content[:100])
+        
+        # Rate limit, resolução de lead/conversa e mensagens já salvas são independentes
+        within_limit, (lead, conversation), stored_ids = await asyncio.gather(
+            redis_client.check_rate_limit(
+                f"message:{phone}",
+                max_requests=10,
+                window_seconds=60
+            ),
+            supabase_client.resolve_lead_and_conversation(
+                phone,
+                first_message=user_entries[0][1]
+            ),
+            supabase_client.get_stored_message_ids([
+                message.get("key", {}).get("id", "") for message, _ in user_entries
+            ])
+        )
         
-        # Verifica rate limit
-        if not await redis_client.check_rate_limit(
-            f"message:{phone}",
-            max_requests=10,
-            window_seconds=60
-        ):
+        # Job reentregue pela fila: mensagens já salvas não são reinseridas
+        new_entries = [
+            (message, content) for message, content in user_entries
+            if message.get("key", {}).get("id", "") not in stored_ids
+        ]
+        
+        # Tudo já salvo e turno já respondido: reentrega após sucesso
+        # (ack perdido ou lease expirado), não repete turno nem resposta
+        turn_key = f"turn_done:{pending[-1][0].get('key', {}).get('id', '')}" if pending else None
+        if not new_entries and (not turn_key or await redis_client.exists(turn_key)):
+            emoji_logger.system_warning(f"Mensagens de {phone} já processadas, turno ignorado")
+            return
+        
+        if not within_limit:
             emoji_logger.system_warning(f"Rate limit excedido para {phone}")
             await evolution_client.send_text_message(
                 phone,
@@ -133,99 +298,151 @@ async def process_new_message(data: Dict[str, Any]):
             )
             return
         
-        # Busca ou cria lead no banco
-        lead = await supabase_client.get_lead_by_phone(phone)
-        
-        if not lead:
-            # Cria novo lead
-            lead = await supabase_client.create_lead({
-                "phone": phone,
-                "first_message": message_content,
-                "source": "whatsapp",
-                "status": "new",
-                "created_at": datetime.now().isoformat()
-            })
-            
-            emoji_logger.supabase_insert("leads", 1, phone=phone)
-        
-        # Busca ou cria conversa
-        conversation = await supabase_client.get_conversation_by_phone(phone)
-        if not conversation:
-            conversation = await supabase_client.create_conversation(phone, lead["id"])
-        
-        # Salva mensagem no banco
-        await supabase_client.save_message({
-            "conversation_id": conversation["id"],
-            "content": message_content,
-            "sender": "user",
-            "metadata": {
-                "message_id": message_id,
-                "raw_data": message
-            }
-        })
-        
-        # Cache da conversa
-        await redis_client.cache_conversation(
-            phone,
+        # Salva todas as mensagens do lead em um único insert,
+        # em paralelo com a janela de agrupamento
+        save_task = asyncio.create_task(supabase_client.save_messages([
             {
-                "lead_id": lead["id"],
                 "conversation_id": conversation["id"],
-                "last_message": message_content,
-                "timestamp": datetime.now().isoformat()
+                "content": content,
+                "sender": "user",
+                "whatsapp_message_id": message.get("key", {}).get("id") or None,
+                "metadata": {
+                    "message_id": message.get("key", {}).get("id", ""),
+                    "raw_data": message
+                }
             }
-        )
+            for message, content in new_entries
+        ]))
         
-        # Processa com o AGENTIC SDR
-        agentic = await get_agentic_agent()
-        
-        # Simular tempo de leitura da mensagem recebida
-        if settings.simulate_reading_time:
-            reading_time = evolution_client.calculate_reading_time(message_content)
-            if reading_time > 0:
-                await asyncio.sleep(reading_time)
-                emoji_logger.webhook_process(f"Tempo de leitura simulado: {round(reading_time, 2)}s")
+        # Lote termina com resposta nossa: nada pendente para o agente
+        if not pending:
+            await save_task
+            return
         
-        # Preparar mídia se houver
-        media_data = None
-        if message.get("message", {}).get("imageMessage"):
-            img_msg = message["message"]["imageMessage"]
-            media_data = {
-                "type": "image",
-                "mimetype": img_msg.get("mimetype", "image/jpeg"),
-                "caption": img_msg.get("caption", ""),
-                "data": img_msg.get("jpegThumbnail", "")  # Base64 da imagem
-            }
-        elif message.get("message", {}).get("documentMessage"):
-            doc_msg = message["message"]["documentMessage"]
-            media_data = {
-                "type": "document",
-                "mimetype": doc_msg.get("mimetype", "application/pdf"),
-                "fileName": doc_msg.get("fileName", "documento"),
-                "data": ""  # Seria necessário baixar o documento
-            }
-        elif message.get("message", {}).get("audioMessage"):
-            audio_msg = message["message"]["audioMessage"]
-            media_data = {
-                "type": "audio",
-                "mimetype": audio_msg.get("mimetype", "audio/ogg"),
-                "ptt": audio_msg.get("ptt", False),
-                "data": ""  # Seria necessário baixar o áudio
-            }
+        message = pending[-1][0]
+        message_content = "\n".join(content for _, content in pending)
         
-        # Processa mensagem com análise contextual inteligente
-        response = await agentic.process_message(
-            phone=phone,
-            message=message_content,
-            lead_data=lead,
-            conversation_id=conversation["id"],
-            media=media_data
+        # Agrupa mensagens fragmentadas antes de acionar o agente (mídia segue direto)
+        has_media = any(
+            media_type in message.get("message", {})
+            for media_type in ("imageMessage", "documentMessage", "audioMessage")
         )
+        if settings.message_coalescing_enabled and not has_media:
+            merged_content = await message_coalescer.submit(phone, message_content)
+            if merged_content is None:
+                # Fragmento absorvido por mensagem posterior do mesmo lead
+                await save_task
+                await redis_client.set(turn_key, 1, ttl=86400)
+                return
+            message_content = merged_content
+        
+        # O agente lê o histórico: as mensagens do lead precisam estar salvas
+        await save_task
+        
+        # Turno do agente serializado por telefone (respostas em ordem)
+        async with conversation_turn(phone):
+            # Lead, conversa e janela de mensagens carregados uma vez para o turno
+            turn = await TurnContext.load(
+                phone,
+                message_content,
+                lead=lead,
+                conversation=conversation
+            )
+            await run_agent_turn(turn, message)
+        
+        # Marca o turno como respondido (reentrega do mesmo job é ignorada)
+        await redis_client.set(turn_key, 1, ttl=86400)
         
-        # Envia resposta
-        if response:
+    except Exception as e:
+        emoji_logger.system_error("Webhook Message Processing", f"{remote_jid}: {e}")
+        if raise_errors:
+            raise
+        # Não lança exceção para não travar o webhook
+
+async def run_agent_turn(turn: TurnContext, message: Dict[str, Any]):
+    """
+    Executa o turno do AGENTIC SDR e envia a resposta
+    
+    Args:
+        turn: Contexto do turno (lead, conversa, janela de mensagens)
+        message: Mensagem bruta do webhook (para mídia)
+    """
+    phone = turn.phone
+    message_content = turn.message
+    
+    # Processa com o AGENTIC SDR
+    agentic = await get_agentic_agent()
+    
+    # Tempo de leitura simulado conta a partir do início do turno
+    # (o tempo gasto pelo agente é descontado dele)
+    turn_started_at = time.time()
+    reading_time = 0.0
+    if settings.simulate_reading_time:
+        reading_time = evolution_client.calculate_reading_time(message_content)
+    
+    # Preparar mídia se houver
+    media_data = None
+    if message.get("message", {}).get("imageMessage"):
+        img_msg = message["message"]["imageMessage"]
+        media_data = {
+            "type": "image",
+            "mimetype": img_msg.get("mimetype", "image/jpeg"),
+            "caption": img_msg.get("caption", ""),
+            "data": img_msg.get("jpegThumbnail", "")  # Base64 da imagem
+        }
+    elif message.get("message", {}).get("documentMessage"):
+        doc_msg = message["message"]["documentMessage"]
+        media_data = {
+            "type": "document",
+            "mimetype": doc_msg.get("mimetype", "application/pdf"),
+            "fileName": doc_msg.get("fileName", "documento"),
+            "data": ""  # Seria necessário baixar o documento
+        }
+    elif message.get("message", {}).get("audioMessage"):
+        audio_msg = message["message"]["audioMessage"]
+        media_data = {
+            "type": "audio",
+            "mimetype": audio_msg.get("mimetype", "audio/ogg"),
+            "ptt": audio_msg.get("ptt", False),
+            "data": ""  # Seria necessário baixar o áudio
+        }
+    
+    turn.media = media_data
+    
+    # Processa mensagem com análise contextual inteligente
+    response = await agentic.process_message(
+        phone=phone,
+        message=message_content,
+        lead_data=turn.lead,
+        conversation_id=turn.conversation_id,
+        media=media_data,
+        turn=turn
+    )
+    
+    # Envia resposta
+    if response:
+        delay_before = settings.delay_before_media if media_data else 0
+        delay_after = settings.delay_after_media if media_data else 0
+        
+        if settings.outbound_scheduler_enabled:
+            # Agenda digitação e envio; o turno termina sem aguardar
+            await outbound_scheduler.schedule_reply(
+                phone,
+                response,
+                not_before=turn_started_at + reading_time,
+                extra_delay=delay_before,
+                hold_after=delay_after
+            )
+        else:
+            # Aguarda o restante do tempo de leitura
+            remaining_reading = turn_started_at + reading_time - time.time()
+            if remaining_reading > 0:
+                await asyncio.sleep(remaining_reading)
+                emoji_logger.webhook_process(f"Tempo de leitura simulado: {round(reading_time, 2)}s")
+            
             # Delay antes de enviar mídia se houver
-            if media_data and settings.delay_before_media > 0:
-                await asyncio.sleep(settings.delay_before_media)
+            if delay_before > 0:
+                await asyncio.sleep(delay_before)
             
             # Enviar resposta com timing humanizado
             await evolution_client.send_text_message(
@@ -236,28 +453,25 @@ async def process_new_message(data: Dict[str, Any]):
             )
             
             # Delay após mídia se houver
-            if media_data and settings.delay_after_media > 0:
-                await asyncio.sleep(settings.delay_after_media)
-            
-            # Salva resposta no banco
-            await supabase_client.save_message({
-                "conversation_id": conversation["id"],
-                "content": response,
-                "sender": "assistant",
-                "metadata": {
-                    "agent": "agentic_sdr",
-                    "context_analyzed": True,
-                    "messages_analyzed": 100
-                }
-            })
-            
-            # Atualiza analytics
-            await redis_client.increment_counter("messages_processed")
-            await redis_client.increment_counter(f"messages:{phone}")
-        
-    except Exception as e:
-        emoji_logger.system_error("Webhook Message Processing", str(e))
-        # Não lança exceção para não travar o webhook
+            if delay_after > 0:
+                await asyncio.sleep(delay_after)
+        
+        # Persistência da resposta e analytics ficam fora do caminho da resposta
+        write_behind.submit(supabase_client.save_message({
+            "conversation_id": turn.conversation_id,
+            "content": response,
+            "sender": "assistant",
+            "metadata": {
+                "agent": "agentic_sdr",
+                "context_analyzed": True,
+                "messages_analyzed": len(turn.messages),
+                "sdr_team_used": turn.sdr_team_used
+            }
+        }), name="assistant_message")
+        write_behind.submit(asyncio.gather(
+            redis_client.increment_counter("messages_processed"),
+            redis_client.increment_counter(f"messages:{phone}")
+        ), name="analytics")
 
 def extract_message_content(message: Dict[str, Any]) -> Optional[str]:
     """
@@ -431,9 +645,9 @@ async def process_message_update(data: Dict[str, Any]):
             elif status == 3:
                 logger.debug(f"Mensagem {message_id} lida por {remote_jid}")
                 
-                # Atualiza analytics
+                # Atualiza analytics (gravado em lote pelo agregador)
                 phone = remote_jid.split("@")[0]
-                await redis_client.increment_counter(f"messages_read:{phone}")
+                event_aggregator.record_read(phone)
                 
     except Exception as e:
         logger.error(f"Erro ao processar message update: {e}")
@@ -452,20 +666,25 @@ async def process_presence_update(data: Dict[str, Any]):
             phone = jid.split("@")[0] if "@" in jid else jid
             last_seen = presence_data.get("lastSeen")
             
-            # Salva última visualização no cache
+            # Lead digitando: estende a janela de agrupamento de mensagens
+            if presence_data.get("lastKnownPresence") == "composing":
+                await message_coalescer.notify_typing(phone)
+            
+            # Salva última visualização no cache (gravado em lote pelo agregador)
             if last_seen:
-                await redis_client.set(
-                    f"presence:{phone}",
-                    {
-                        "last_seen": last_seen,
-                        "timestamp": datetime.now().isoformat()
-                    },
-                    ttl=300  # 5 minutos
-                )
+                event_aggregator.record_presence(phone, last_seen)
                 
     except Exception as e:
         logger.error(f"Erro ao processar presence update: {e}")
 
+# Handlers dos demais eventos da Evolution API
+EVENT_HANDLERS = {
+    "CONNECTION_UPDATE": process_connection_update,  # Status da conexão mudou
+    "QRCODE_UPDATED": process_qrcode_update,  # QR Code atualizado
+    "MESSAGES_UPDATE": process_message_update,  # Status de mensagem (entregue, lida, etc)
+    "PRESENCE_UPDATE": process_presence_update  # Presença (online, digitando, etc)
+}
+
 @router.get("/health")
 async def webhook_health():
     """Health check do webhook"""
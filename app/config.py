@@ -30,6 +30,15 @@ class Settings(BaseSettings):
     supabase_anon_key: str = Field(default="", env="SUPABASE_ANON_KEY")
     supabase_service_key: str = Field(default="", env="SUPABASE_SERVICE_KEY")
     supabase_db_url: str = Field(default="", env="SUPABASE_DB_URL")  # URL PostgreSQL direta
+    supabase_max_workers: int = Field(default=20, env="SUPABASE_MAX_WORKERS")  # Queries simultâneas ao PostgREST
+    
+    # Backend das queries do caminho quente: "rest" (PostgREST) ou "asyncpg" (SUPABASE_DB_URL)
+    database_backend: str = Field(default="rest", env="DATABASE_BACKEND")
+    postgres_pool_min_size: int = Field(default=2, env="POSTGRES_POOL_MIN_SIZE")
+    postgres_pool_max_size: int = Field(default=20, env="POSTGRES_POOL_MAX_SIZE")
+    postgres_statement_cache_size: int = Field(default=100, env="POSTGRES_STATEMENT_CACHE_SIZE")
+    daily_stats_cache_ttl: int = Field(default=60, env="DAILY_STATS_CACHE_TTL")  # Cache das estatísticas do /metrics
+    supabase_page_size: int = Field(default=1000, env="SUPABASE_PAGE_SIZE")  # Linhas por página nas varreduras paginadas
     
     # Redis
     redis_url: str = Field(default="redis://localhost:6379/0", env="REDIS_URL")
@@ -37,6 +46,8 @@ class Settings(BaseSettings):
     redis_port: int = Field(default=6379, env="REDIS_PORT")
     redis_password: Optional[str] = Field(default=None, env="REDIS_PASSWORD")
     redis_username: str = Field(default="default", env="REDIS_USERNAME")
+    conversation_window_size: int = Field(default=100, env="CONVERSATION_WINDOW_SIZE")  # Mensagens na janela de contexto em Redis
+    conversation_window_ttl: int = Field(default=86400, env="CONVERSATION_WINDOW_TTL")  # Janela expira sem novas mensagens
     
     # Google Calendar
     google_use_service_account: bool = Field(default=True, env="GOOGLE_USE_SERVICE_ACCOUNT")
@@ -180,6 +191,90 @@ class Settings(BaseSettings):
     enable_parallel_agent_processing: bool = Field(default=True, env="ENABLE_PARALLEL_AGENT_PROCESSING")
     max_reasoning_depth: int = Field(default=3, env="MAX_REASONING_DEPTH")
     
+    # ============= FILA DE MENSAGENS =============
+    # Fila durável de entrada (Redis) drenada por um pool de workers
+    inbound_queue_enabled: bool = Field(default=True, env="INBOUND_QUEUE_ENABLED")
+    inbound_queue_name: str = Field(default="inbound_messages", env="INBOUND_QUEUE_NAME")
+    inbound_queue_workers: int = Field(default=10, env="INBOUND_QUEUE_WORKERS")
+    inbound_queue_lanes: int = Field(default=64, env="INBOUND_QUEUE_LANES")
+    inbound_queue_idle_interval: float = Field(default=0.5, env="INBOUND_QUEUE_IDLE_INTERVAL")
+    inbound_queue_visibility_timeout: int = Field(default=300, env="INBOUND_QUEUE_VISIBILITY_TIMEOUT")
+    inbound_queue_max_attempts: int = Field(default=3, env="INBOUND_QUEUE_MAX_ATTEMPTS")
+    inbound_queue_reaper_interval: int = Field(default=30, env="INBOUND_QUEUE_REAPER_INTERVAL")
+    
+    # Deduplicação de MESSAGES_UPSERT por key.id (retries da Evolution API)
+    webhook_dedup_enabled: bool = Field(default=True, env="WEBHOOK_DEDUP_ENABLED")
+    webhook_dedup_ttl: int = Field(default=21600, env="WEBHOOK_DEDUP_TTL")
+    
+    # ============= AGRUPAMENTO DE MENSAGENS =============
+    # Junta mensagens fragmentadas do lead antes de acionar o agente
+    message_coalescing_enabled: bool = Field(default=True, env="MESSAGE_COALESCING_ENABLED")
+    message_coalescing_window: float = Field(default=3.0, env="MESSAGE_COALESCING_WINDOW")
+    message_coalescing_max_wait: float = Field(default=12.0, env="MESSAGE_COALESCING_MAX_WAIT")
+    
+    # ============= ENVIO AGENDADO =============
+    # Delays de humanização agendados no Redis em vez de asyncio.sleep
+    outbound_scheduler_enabled: bool = Field(default=True, env="OUTBOUND_SCHEDULER_ENABLED")
+    outbound_scheduler_tick: float = Field(default=0.2, env="OUTBOUND_SCHEDULER_TICK")
+    outbound_scheduler_max_concurrency: int = Field(default=100, env="OUTBOUND_SCHEDULER_MAX_CONCURRENCY")
+    outbound_scheduler_lease: int = Field(default=60, env="OUTBOUND_SCHEDULER_LEASE")
+    outbound_scheduler_max_attempts: int = Field(default=3, env="OUTBOUND_SCHEDULER_MAX_ATTEMPTS")
+    
+    # ============= BUFFER DE MENSAGENS =============
+    # Mensagens gravadas em inserts multi-linha em segundo plano
+    message_buffer_enabled: bool = Field(default=True, env="MESSAGE_BUFFER_ENABLED")
+    message_buffer_max_size: int = Field(default=100, env="MESSAGE_BUFFER_MAX_SIZE")
+    message_buffer_flush_interval: float = Field(default=0.5, env="MESSAGE_BUFFER_FLUSH_INTERVAL")
+    message_buffer_max_attempts: int = Field(default=5, env="MESSAGE_BUFFER_MAX_ATTEMPTS")
+    message_buffer_max_backoff: float = Field(default=30.0, env="MESSAGE_BUFFER_MAX_BACKOFF")
+    
+    # ============= ANALYTICS =============
+    # Eventos de analytics gravados em lote (spill em disco se o banco estiver lento)
+    analytics_buffer_size: int = Field(default=10000, env="ANALYTICS_BUFFER_SIZE")
+    analytics_batch_size: int = Field(default=500, env="ANALYTICS_BATCH_SIZE")
+    analytics_flush_interval: float = Field(default=2.0, env="ANALYTICS_FLUSH_INTERVAL")
+    analytics_flush_timeout: float = Field(default=5.0, env="ANALYTICS_FLUSH_TIMEOUT")
+    analytics_spill_path: str = Field(default="logs/analytics_spill.jsonl", env="ANALYTICS_SPILL_PATH")
+    
+    # ============= AGREGAÇÃO DE EVENTOS =============
+    # Presença e confirmações de leitura gravadas em lote no Redis
+    event_aggregator_flush_interval: float = Field(default=1.0, env="EVENT_AGGREGATOR_FLUSH_INTERVAL")
+    event_aggregator_max_pending: int = Field(default=5000, env="EVENT_AGGREGATOR_MAX_PENDING")
+    
+    # ============= CONTROLE DE ADMISSÃO =============
+    # Limites de pressão antes de degradar o atendimento
+    admission_control_enabled: bool = Field(default=True, env="ADMISSION_CONTROL_ENABLED")
+    admission_max_in_flight: int = Field(default=200, env="ADMISSION_MAX_IN_FLIGHT")
+    admission_queue_soft_limit: int = Field(default=500, env="ADMISSION_QUEUE_SOFT_LIMIT")
+    admission_queue_hard_limit: int = Field(default=2000, env="ADMISSION_QUEUE_HARD_LIMIT")
+    admission_age_soft_limit: float = Field(default=30.0, env="ADMISSION_AGE_SOFT_LIMIT")
+    admission_age_hard_limit: float = Field(default=120.0, env="ADMISSION_AGE_HARD_LIMIT")
+    admission_sample_interval: float = Field(default=1.0, env="ADMISSION_SAMPLE_INTERVAL")
+    admission_retry_after: int = Field(default=30, env="ADMISSION_RETRY_AFTER")
+    admission_ack_cooldown: int = Field(default=600, env="ADMISSION_ACK_COOLDOWN")
+    admission_ack_message: str = Field(
+        default="Oi! Recebi sua mensagem e já te respondo em instantes 😊",
+        env="ADMISSION_ACK_MESSAGE"
+    )
+    
+    # ============= ESTADO POR LEAD =============
+    # Estado emocional do agente por lead (hash Redis + LRU em memória)
+    lead_state_cache_size: int = Field(default=10000, env="LEAD_STATE_CACHE_SIZE")
+    lead_state_local_ttl: float = Field(default=5.0, env="LEAD_STATE_LOCAL_TTL")
+    lead_state_ttl: int = Field(default=604800, env="LEAD_STATE_TTL")
+    
+    # ============= CACHE DE RESPOSTAS =============
+    # Respostas do LLM reaproveitadas para perguntas repetidas
+    response_cache_enabled: bool = Field(default=False, env="RESPONSE_CACHE_ENABLED")
+    response_cache_max_entries: int = Field(default=5000, env="RESPONSE_CACHE_MAX_ENTRIES")
+    response_cache_ttl: int = Field(default=3600, env="RESPONSE_CACHE_TTL")
+    response_cache_max_message_length: int = Field(default=120, env="RESPONSE_CACHE_MAX_MESSAGE_LENGTH")
+    response_cache_min_question_tokens: int = Field(default=3, env="RESPONSE_CACHE_MIN_QUESTION_TOKENS")
+    response_cache_excluded_contexts: str = Field(
+        default="scheduling_ready,objection_handling,complex_negotiation,document_analysis",
+        env="RESPONSE_CACHE_EXCLUDED_CONTEXTS"
+    )
+    
     @validator('google_private_key')
     def process_private_key(cls, v):
         """Processa a chave privada do Google para formato correto"""
@@ -137,6 +137,60 @@ class EvolutionAPIClient:
         # Limitar entre 0.5 e 5 segundos
         return max(0.5, min(reading_time, 5.0))
     
+    def calculate_response_delay(self, message: str) -> float:
+        """
+        Calcula delay humanizado antes de responder
+        
+        Args:
+            message: Texto da resposta
+            
+        Returns:
+            Delay em segundos
+        """
+        # Verificar complexidade da mensagem
+        is_complex = len(message) > 300 or "?" in message
+        
+        if is_complex:
+            return settings.response_delay_thinking
+        
+        # Delay aleatório entre min e max
+        return random.uniform(
+            settings.response_delay_min,
+            settings.response_delay_max
+        )
+    
+    def calculate_typing_duration(self, message_length: int) -> float:
+        """
+        Calcula duração da digitação baseada no tamanho da mensagem
+        
+        Args:
+            message_length: Tamanho da mensagem
+            
+        Returns:
+            Duração em segundos (entre 1 e 15)
+        """
+        # Determinar duração base
+        if message_length < 50:
+            duration = settings.typing_duration_short
+        elif message_length < 200:
+            duration = settings.typing_duration_medium
+        else:
+            duration = settings.typing_duration_long
+        
+        # Adicionar tempo baseado na velocidade de digitação
+        if settings.typing_speed_chars_per_second > 0:
+            typing_time = message_length / settings.typing_speed_chars_per_second
+            # Usar o maior entre duração configurada e tempo calculado
+            duration = max(duration, typing_time)
+        
+        # Adicionar variação humana se habilitado
+        if settings.response_time_variation > 0:
+            variation = duration * settings.response_time_variation
+            duration += random.uniform(-variation, variation)
+        
+        # Limitar duração
+        return max(1.0, min(duration, 15.0))  # Entre 1 e 15 segundos
+    
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10)
@@ -163,17 +217,7 @@ class EvolutionAPIClient:
             
             # Calcular delay apropriado
             if delay is None:
-                # Verificar complexidade da mensagem
-                is_complex = len(message) > 300 or "?" in message
-                
-                if is_complex:
-                    delay = settings.response_delay_thinking
-                else:
-                    # Delay aleatório entre min e max
-                    delay = random.uniform(
-                        settings.response_delay_min,
-                        settings.response_delay_max
-                    )
+                delay = self.calculate_response_delay(message)
             
             # Aguardar delay inicial
             if delay > 0:
@@ -219,46 +263,20 @@ class EvolutionAPIClient:
             if custom_duration:
                 duration = custom_duration
             else:
-                # Determinar duração base
-                if message_length < 50:
-                    duration = settings.typing_duration_short
-                elif message_length < 200:
-                    duration = settings.typing_duration_medium
-                else:
-                    duration = settings.typing_duration_long
-                
-                # Adicionar tempo baseado na velocidade de digitação
-                if settings.typing_speed_chars_per_second > 0:
-                    typing_time = message_length / settings.typing_speed_chars_per_second
-                    # Usar o maior entre duração configurada e tempo calculado
-                    duration = max(duration, typing_time)
-                
-                # Adicionar variação humana se habilitado
-                if settings.response_time_variation > 0:
-                    variation = duration * settings.response_time_variation
-                    duration += random.uniform(-variation, variation)
-                
-                # Limitar duração
-                duration = max(1.0, min(duration, 15.0))  # Entre 1 e 15 segundos
+                duration = self.calculate_typing_duration(message_length)
             
             # Inicia digitação
-            payload = {
-                "number": phone,
-                "delay": int(duration * 1000),
-                "state": "composing"
-            }
-            
-            response = await self.client.post(
-                f"/chat/updatePresence/{self.instance_name}",
-                json=payload
-            )
-            response.raise_for_status()
+            await self.start_typing(phone, duration)
             
             # Aguarda duração
             await asyncio.sleep(duration)
             
             # Para digitação
-            payload["state"] = "paused"
+            payload = {
+                "number": phone,
+                "delay": int(duration * 1000),
+                "state": "paused"
+            }
             await self.client.post(
                 f"/chat/updatePresence/{self.instance_name}",
                 json=payload
@@ -269,6 +287,28 @@ class EvolutionAPIClient:
         except Exception as e:
             emoji_logger.evolution_error(f"Erro ao simular digitação: {e}")
     
+    async def start_typing(self, phone: str, duration: float):
+        """
+        Exibe "digitando..." sem aguardar (a Evolution mantém o estado por duration)
+        
+        Args:
+            phone: Número do WhatsApp
+            duration: Duração da digitação em segundos
+        """
+        phone = self._format_phone(phone)
+        
+        payload = {
+            "number": phone,
+            "delay": int(duration * 1000),
+            "state": "composing"
+        }
+        
+        response = await self.client.post(
+            f"/chat/updatePresence/{self.instance_name}",
+            json=payload
+        )
+        response.raise_for_status()
+    
     async def send_reaction(self, phone: str, message_id: str, emoji: str):
         """
         Envia reação a uma mensagem
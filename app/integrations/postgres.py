@@ -0,0 +1,222 @@
+"""
+Backend PostgreSQL direto (asyncpg) para as queries do caminho quente
+Evita o overhead HTTP/JSON do PostgREST usando pool de conexões e prepared statements
+"""
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+import asyncpg
+from loguru import logger
+from app.utils.logger import emoji_logger
+
+from app.config import settings
+
+# Colunas aceitas em seleções dinâmicas
+_COLUMN_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+# Colunas gravadas em messages (tipo do array e default quando ausente)
+_MESSAGE_COLUMNS = (
+    ("id", "uuid", "gen_random_uuid()"),
+    ("conversation_id", "uuid", None),
+    ("whatsapp_message_id", "text", None),
+    ("sender", "text", None),
+    ("content", "text", None),
+    ("message_type", "text", "'text'"),
+    ("metadata", "jsonb", None),
+    ("created_at", "timestamptz", "now()"),
+)
+
+# Forma fixa: um único prepared statement para qualquer tamanho de lote
+_INSERT_MESSAGES_SQL = (
+    f"INSERT INTO messages ({', '.join(name for name, _, _ in _MESSAGE_COLUMNS)}) "
+    "SELECT "
+    + ", ".join(
+        f"COALESCE({name}, {default})" if default else name
+        for name, _, default in _MESSAGE_COLUMNS
+    )
+    + " FROM unnest("
+    + ", ".join(f"${index}::{type_name}[]" for index, (_, type_name, _) in enumerate(_MESSAGE_COLUMNS, 1))
+    + f") AS m({', '.join(name for name, _, _ in _MESSAGE_COLUMNS)}) "
+    # Reentrega da mesma mensagem do WhatsApp não duplica a linha
+    "ON CONFLICT (whatsapp_message_id) DO NOTHING "
+    "RETURNING *"
+)
+
+
+def _to_python(value: Any) -> Any:
+    """Converte tipos do asyncpg para o formato retornado pelo PostgREST"""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _record_to_dict(record: Optional[asyncpg.Record]) -> Optional[Dict[str, Any]]:
+    """Converte Record em dict serializável (mesmo formato do REST)"""
+    if record is None:
+        return None
+    return {key: _to_python(value) for key, value in record.items()}
+
+
+async def _init_connection(connection: asyncpg.Connection):
+    """Configura codecs JSON em cada conexão do pool"""
+    for type_name in ("json", "jsonb"):
+        await connection.set_type_codec(
+            type_name,
+            encoder=json.dumps,
+            decoder=json.loads,
+            schema="pg_catalog"
+        )
+
+
+class PostgresBackend:
+    """
+    Pool asyncpg para as queries mais frequentes do webhook
+
+    Cobre lead e conversa por telefone, últimas N mensagens, insert de
+    mensagens e incremento de contadores. O asyncpg prepara e cacheia
+    cada statement por conexão (statement_cache_size); com o pooler do
+    Supabase em modo transação use POSTGRES_STATEMENT_CACHE_SIZE=0.
+    Os métodos lançam exceção em caso de erro: o SupabaseClient decide
+    o fallback para o REST.
+    """
+
+    def __init__(self):
+        """Inicializa o backend (o pool é criado em connect)"""
+        self.pool: Optional[asyncpg.Pool] = None
+
+    @property
+    def available(self) -> bool:
+        """Indica se o pool está conectado"""
+        return self.pool is not None
+
+    async def connect(self):
+        """Cria o pool de conexões"""
+        if self.pool is not None:
+            return
+
+        try:
+            self.pool = await asyncpg.create_pool(
+                dsn=settings.get_postgres_url(),
+                min_size=settings.postgres_pool_min_size,
+                max_size=settings.postgres_pool_max_size,
+                statement_cache_size=settings.postgres_statement_cache_size,
+                init=_init_connection
+            )
+            emoji_logger.supabase_connect("Pool asyncpg conectado")
+
+        except Exception as e:
+            self.pool = None
+            emoji_logger.supabase_error(f"Erro ao conectar pool asyncpg, usando REST: {e}")
+
+    async def disconnect(self):
+        """Fecha o pool de conexões"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Pool asyncpg desconectado")
+
+    # ============= LEITURAS =============
+
+    async def get_lead_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """Busca lead por telefone"""
+        record = await self.pool.fetchrow(
+            "SELECT * FROM leads WHERE phone_number = $1 LIMIT 1",
+            phone
+        )
+        return _record_to_dict(record)
+
+    async def get_conversation_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """Busca conversa por telefone"""
+        record = await self.pool.fetchrow(
+            "SELECT * FROM conversations WHERE phone_number = $1 LIMIT 1",
+            phone
+        )
+        return _record_to_dict(record)
+
+    async def get_last_messages(
+        self,
+        conversation_id: str,
+        limit: int = 100,
+        columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        """Retorna as últimas N mensagens da conversa em ordem cronológica"""
+        if columns != "*":
+            for column in columns.split(","):
+                if not _COLUMN_RE.match(column):
+                    raise ValueError(f"Coluna inválida: {column}")
+        
+        records = await self.pool.fetch(
+            "SELECT * FROM ("
+            f"  SELECT {columns} FROM messages WHERE conversation_id = $1"
+            "  ORDER BY created_at DESC LIMIT $2"
+            ") recent ORDER BY created_at ASC",
+            conversation_id,
+            limit
+        )
+        return [_record_to_dict(record) for record in records]
+
+    # ============= ESCRITAS =============
+
+    async def insert_messages(self, messages_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insere mensagens em um único statement
+
+        Cada coluna vai como um array (unnest), então o SQL é o mesmo para
+        qualquer tamanho de lote e o prepared statement é reaproveitado.
+        Linhas com colunas fora de _MESSAGE_COLUMNS lançam ValueError
+        (o SupabaseClient segue pelo REST). Mensagens com whatsapp_message_id
+        já gravado são ignoradas e não aparecem no retorno.
+        """
+        if not messages_data:
+            return []
+
+        known = {name for name, _, _ in _MESSAGE_COLUMNS}
+        for message_data in messages_data:
+            unknown = set(message_data) - known
+            if unknown:
+                raise ValueError(f"Colunas não suportadas: {', '.join(sorted(unknown))}")
+
+        arrays = []
+        for name, _, _ in _MESSAGE_COLUMNS:
+            values = [message_data.get(name) for message_data in messages_data]
+            if name == "created_at":
+                values = [
+                    datetime.fromisoformat(value) if isinstance(value, str) else value
+                    for value in values
+                ]
+            arrays.append(values)
+
+        records = await self.pool.fetch(_INSERT_MESSAGES_SQL, *arrays)
+        return [_record_to_dict(record) for record in records]
+
+    async def get_stored_message_ids(self, whatsapp_ids: List[str]) -> List[str]:
+        """Retorna os ids do WhatsApp já gravados em messages"""
+        records = await self.pool.fetch(
+            "SELECT whatsapp_message_id FROM messages WHERE whatsapp_message_id = ANY($1::text[])",
+            whatsapp_ids
+        )
+        return [record["whatsapp_message_id"] for record in records]
+
+    async def insert_message(self, message_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Insere uma mensagem"""
+        return (await self.insert_messages([message_data]))[0]
+
+    async def increment_message_count(self, conversation_id: str, amount: int = 1):
+        """Incrementa o contador de mensagens da conversa de forma atômica"""
+        await self.pool.execute(
+            "SELECT increment_message_count($1, $2)",
+            conversation_id,
+            amount
+        )
+
+
+# Singleton global
+postgres_backend = PostgresBackend()
@@ -1,10 +1,13 @@
 """
 Redis Client - Cache e Filas
 """
+import asyncio
 import redis.asyncio as redis
 import json
 import pickle
-from typing import Optional, Any, List, Dict
+import time
+import uuid
+from typing import Optional, Any, List, Dict, Tuple
 from datetime import datetime, timedelta
 from loguru import logger
 from app.config import settings
@@ -235,6 +238,245 @@ class RedisClient:
         key = f"lead:{phone}"
         return await self.get(key)
     
+    # ==================== JANELA DE CONVERSA ====================
+    
+    # Janela existente recebe as mensagens; sem janela elas ficam em
+    # window:{id}:pending até a semeadura (que as incorpora)
+    _APPEND_WINDOW_SCRIPT = (
+        "local key = KEYS[1] "
+        "if redis.call('exists', KEYS[1]) == 0 then key = KEYS[2] end "
+        "redis.call('rpush', key, unpack(ARGV, 3)) "
+        "redis.call('ltrim', key, -tonumber(ARGV[1]), -1) "
+        "redis.call('expire', key, ARGV[2]) "
+        "return 1"
+    )
+    
+    # Semeia a janela com as mensagens do banco e mantém o que foi anexado
+    # depois da leitura (na janela ou em pending) e não está na semente
+    _SEED_WINDOW_SCRIPT = (
+        "local seeded = {} "
+        "for i = 3, #ARGV do seeded[cjson.decode(ARGV[i])['id'] or ''] = true end "
+        "local extra = {} "
+        "for _, key in ipairs(KEYS) do "
+        "  for _, value in ipairs(redis.call('lrange', key, 0, -1)) do "
+        "    local id = cjson.decode(value)['id'] "
+        "    if id == nil or not seeded[id] then "
+        "      if id ~= nil then seeded[id] = true end "
+        "      table.insert(extra, value) "
+        "    end "
+        "  end "
+        "end "
+        "redis.call('del', KEYS[1], KEYS[2]) "
+        "if #ARGV > 2 then redis.call('rpush', KEYS[1], unpack(ARGV, 3)) end "
+        "for i = 1, #extra, 1000 do "
+        "  redis.call('rpush', KEYS[1], unpack(extra, i, math.min(i + 999, #extra))) "
+        "end "
+        "if #ARGV > 2 or #extra > 0 then "
+        "  redis.call('ltrim', KEYS[1], -tonumber(ARGV[1]), -1) "
+        "  redis.call('expire', KEYS[1], ARGV[2]) "
+        "end "
+        "return #extra"
+    )
+    
+    async def append_to_window(
+        self,
+        conversation_id: str,
+        records: List[Dict[str, Any]],
+        max_len: int = 100,
+        ttl: int = 86400
+    ) -> bool:
+        """
+        Anexa mensagens à janela da conversa mantendo as últimas max_len
+        
+        Janela inexistente não é criada aqui (seria parcial): as mensagens
+        ficam em window:{id}:pending e set_window as incorpora ao semear,
+        então nada salvo entre a leitura do banco e a semeadura se perde.
+        
+        Args:
+            conversation_id: ID da conversa
+            records: Mensagens compactas em ordem cronológica
+            max_len: Tamanho máximo da janela
+            ttl: Tempo de vida
+            
+        Returns:
+            True se sucesso
+        """
+        if not records:
+            return True
+        
+        try:
+            key = f"window:{conversation_id}"
+            await self.redis_client.eval(
+                self._APPEND_WINDOW_SCRIPT,
+                2,
+                key,
+                f"{key}:pending",
+                max_len,
+                ttl,
+                *[json.dumps(record) for record in records]
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao anexar à janela {conversation_id}: {e}")
+            return False
+    
+    async def set_window(
+        self,
+        conversation_id: str,
+        records: List[Dict[str, Any]],
+        max_len: int = 100,
+        ttl: int = 86400
+    ) -> bool:
+        """
+        Semeia a janela da conversa a partir do banco
+        
+        Atômico (Lua): mensagens anexadas depois da leitura do banco, na
+        janela ou em pending, e ausentes de records (por id) são mantidas
+        no fim da janela.
+        
+        Args:
+            conversation_id: ID da conversa
+            records: Mensagens compactas em ordem cronológica
+            max_len: Tamanho máximo da janela
+            ttl: Tempo de vida
+            
+        Returns:
+            True se sucesso
+        """
+        try:
+            key = f"window:{conversation_id}"
+            await self.redis_client.eval(
+                self._SEED_WINDOW_SCRIPT,
+                2,
+                key,
+                f"{key}:pending",
+                max_len,
+                ttl,
+                *[json.dumps(record) for record in records[-max_len:]]
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao semear janela {conversation_id}: {e}")
+            return False
+    
+    async def get_window(self, conversation_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Obtém a janela da conversa
+        
+        Args:
+            conversation_id: ID da conversa
+            
+        Returns:
+            Mensagens em ordem cronológica ou None se a janela não existe
+        """
+        try:
+            values = await self.redis_client.lrange(f"window:{conversation_id}", 0, -1)
+            if not values:
+                return None
+            return [json.loads(value) for value in values]
+            
+        except Exception as e:
+            logger.error(f"Erro ao ler janela {conversation_id}: {e}")
+            return None
+    
+    # ==================== HASHES ====================
+    
+    async def get_hash(self, key: str) -> Dict[str, str]:
+        """
+        Obtém todos os campos de um hash
+        
+        Args:
+            key: Chave do hash
+            
+        Returns:
+            Campos do hash (vazio se não existe)
+        """
+        try:
+            return await self.redis_client.hgetall(key)
+            
+        except Exception as e:
+            logger.error(f"Erro ao ler hash {key}: {e}")
+            return {}
+    
+    async def set_hash(
+        self,
+        key: str,
+        mapping: Dict[str, Any],
+        ttl: Optional[int] = None
+    ) -> bool:
+        """
+        Grava campos de um hash
+        
+        Args:
+            key: Chave do hash
+            mapping: Campos a gravar
+            ttl: Tempo de vida em segundos
+            
+        Returns:
+            True se sucesso
+        """
+        if not mapping:
+            return True
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.hset(key, mapping=mapping)
+            if ttl:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao gravar hash {key}: {e}")
+            return False
+    
+    # ==================== DEDUPLICAÇÃO ====================
+    
+    # Conjuntos rotativos por janela: verifica janela atual e anterior e marca na atual
+    _MARK_SEEN_SCRIPT = (
+        "if redis.call('sismember', KEYS[1], ARGV[1]) == 1 "
+        "or redis.call('sismember', KEYS[2], ARGV[1]) == 1 then return 0 end "
+        "redis.call('sadd', KEYS[1], ARGV[1]) "
+        "redis.call('expire', KEYS[1], ARGV[2]) "
+        "return 1"
+    )
+    
+    async def mark_seen(
+        self,
+        namespace: str,
+        member: str,
+        ttl: int = 21600
+    ) -> bool:
+        """
+        Marca item como visto, retornando se é a primeira ocorrência
+        
+        Usa um SET por janela de ttl segundos; cada item é lembrado por
+        entre ttl e 2*ttl segundos, com uma única chave ativa por janela.
+        
+        Args:
+            namespace: Namespace dos itens (ex.: "wa_message")
+            member: Identificador do item
+            ttl: Janela mínima de memória em segundos
+            
+        Returns:
+            True se o item é novo, False se é duplicado
+        """
+        try:
+            window = int(time.time() // ttl)
+            current_key = f"seen:{namespace}:{window}"
+            previous_key = f"seen:{namespace}:{window - 1}"
+            
+            result = await self.redis_client.eval(
+                self._MARK_SEEN_SCRIPT, 2, current_key, previous_key, member, ttl * 2
+            )
+            return result == 1
+            
+        except Exception as e:
+            logger.error(f"Erro ao verificar duplicidade {namespace}:{member}: {e}")
+            return True  # Processa em caso de erro
+    
     # ==================== FILAS ====================
     
     async def enqueue(
@@ -257,6 +499,7 @@ class RedisClient:
         try:
             # Cria payload com timestamp
             payload = {
+                "id": str(uuid.uuid4()),
                 "data": data,
                 "timestamp": datetime.now().isoformat(),
                 "priority": priority
@@ -345,6 +588,499 @@ class RedisClient:
             logger.error(f"Erro ao obter tamanho da fila {queue_name}: {e}")
             return 0
     
+    async def queue_sizes(self, queue_names: List[str]) -> List[int]:
+        """
+        Obtém o tamanho de várias filas em um único round trip
+        
+        Args:
+            queue_names: Nomes das filas
+            
+        Returns:
+            Número de itens de cada fila, na mesma ordem
+        """
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for queue_name in queue_names:
+                pipe.llen(f"queue:priority:{queue_name}")
+                pipe.llen(f"queue:{queue_name}")
+            sizes = await pipe.execute()
+            
+            return [priority + normal for priority, normal in zip(sizes[::2], sizes[1::2])]
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter tamanho de {len(queue_names)} filas: {e}")
+            return [0] * len(queue_names)
+    
+    async def queue_heads(self, queue_names: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Obtém o próximo item de várias filas (sem remover) em um único round trip
+        
+        Args:
+            queue_names: Nomes das filas
+            
+        Returns:
+            Próximo item de cada fila (prioridade primeiro) ou None, na mesma ordem
+        """
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for queue_name in queue_names:
+                pipe.lindex(f"queue:priority:{queue_name}", 0)
+                pipe.lindex(f"queue:{queue_name}", 0)
+            values = await pipe.execute()
+            
+            return [
+                json.loads(priority or normal) if (priority or normal) else None
+                for priority, normal in zip(values[::2], values[1::2])
+            ]
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter início de {len(queue_names)} filas: {e}")
+            return [None] * len(queue_names)
+    
+    # ==================== FILAS CONFIÁVEIS ====================
+    
+    # Cada entrega recebe um token único: o item fica em queue:inflight
+    # (token -> payload) com lease em queue:inflight_leases (token -> prazo).
+    # Ack/nack agem só sobre a própria entrega, nunca sobre uma cópia reentregue.
+    
+    # Move atomicamente o próximo item (prioridade primeiro) para a entrega
+    _DEQUEUE_RELIABLE_SCRIPT = (
+        "local value = redis.call('lpop', KEYS[1]) "
+        "if not value then value = redis.call('lpop', KEYS[2]) end "
+        "if not value then return false end "
+        "redis.call('hset', KEYS[3], ARGV[1], value) "
+        "redis.call('zadd', KEYS[4], ARGV[2], ARGV[1]) "
+        "return value"
+    )
+    
+    # Encerra a entrega e devolve o item à fila ou ao dead-letter
+    _NACK_SCRIPT = (
+        "if redis.call('hdel', KEYS[1], ARGV[1]) == 0 then return -1 end "
+        "redis.call('zrem', KEYS[2], ARGV[1]) "
+        "local attempts = redis.call('hincrby', KEYS[3], ARGV[2], 1) "
+        "if attempts >= tonumber(ARGV[5]) then "
+        "redis.call('hdel', KEYS[3], ARGV[2]) "
+        "redis.call('rpush', KEYS[5], ARGV[3]) "
+        "else "
+        "redis.call('lpush', KEYS[4], ARGV[4]) "
+        "end "
+        "return attempts"
+    )
+    
+    @staticmethod
+    def _reliable_keys(queue_name: str) -> Tuple[str, str, str, str]:
+        return (
+            f"queue:inflight:{queue_name}",
+            f"queue:inflight_leases:{queue_name}",
+            f"queue:attempts:{queue_name}",
+            f"queue:dead:{queue_name}"
+        )
+    
+    async def dequeue_reliable(
+        self,
+        queue_name: str,
+        timeout: int = 0,
+        visibility_timeout: int = 300
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Remove item da fila registrando-o atomicamente como entrega em andamento
+        
+        O item só sai definitivamente da fila após ack(). Se o worker morrer
+        antes disso, requeue_stuck() devolve o item à fila quando a lease expirar.
+        
+        Args:
+            queue_name: Nome da fila
+            timeout: Segundos aguardando um item (0 = não bloqueia)
+            visibility_timeout: Segundos até o item ser considerado travado
+            
+        Returns:
+            Tupla (token da entrega, item) ou None
+        """
+        try:
+            inflight_key, leases_key, _, _ = self._reliable_keys(queue_name)
+            deadline = time.monotonic() + timeout
+            
+            while True:
+                token = uuid.uuid4().hex
+                value = await self.redis_client.eval(
+                    self._DEQUEUE_RELIABLE_SCRIPT, 4,
+                    f"queue:priority:{queue_name}", f"queue:{queue_name}",
+                    inflight_key, leases_key,
+                    token, time.time() + visibility_timeout
+                )
+                
+                if value:
+                    return token, json.loads(value)
+                
+                if time.monotonic() >= deadline:
+                    return None
+                
+                await asyncio.sleep(0.1)
+            
+        except Exception as e:
+            logger.error(f"Erro ao desenfileirar (confiável) de {queue_name}: {e}")
+            return None
+    
+    async def ack(self, queue_name: str, token: str) -> bool:
+        """
+        Confirma processamento de uma entrega obtida com dequeue_reliable()
+        
+        Args:
+            queue_name: Nome da fila
+            token: Token da entrega retornado pelo dequeue
+            
+        Returns:
+            True se a entrega ainda estava em andamento (não foi reentregue)
+        """
+        try:
+            inflight_key, leases_key, attempts_key, _ = self._reliable_keys(queue_name)
+            raw_item = await self.redis_client.hget(inflight_key, token)
+            if raw_item is None:
+                return False
+            
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.hdel(inflight_key, token)
+            pipe.zrem(leases_key, token)
+            # Tentativas anteriores (nack/reaper) não valem mais para o item
+            pipe.hdel(attempts_key, json.loads(raw_item).get("id", raw_item))
+            removed, _, _ = await pipe.execute()
+            return removed > 0
+            
+        except Exception as e:
+            logger.error(f"Erro ao confirmar item da fila {queue_name}: {e}")
+            return False
+    
+    async def nack(
+        self,
+        queue_name: str,
+        token: str,
+        max_attempts: int = 3
+    ) -> bool:
+        """
+        Devolve item à fila após falha no processamento
+        
+        Itens que excederem max_attempts vão para a fila de dead-letter.
+        
+        Args:
+            queue_name: Nome da fila
+            token: Token da entrega retornado pelo dequeue
+            max_attempts: Máximo de tentativas antes do dead-letter
+            
+        Returns:
+            True se o item voltou para a fila
+        """
+        try:
+            inflight_key, leases_key, attempts_key, dead_key = self._reliable_keys(queue_name)
+            raw_item = await self.redis_client.hget(inflight_key, token)
+            if raw_item is None:
+                return False
+            
+            # A espera da nova tentativa conta a partir de agora
+            item = json.loads(raw_item)
+            item["available_at"] = datetime.now().isoformat()
+            
+            attempts = await self.redis_client.eval(
+                self._NACK_SCRIPT, 5,
+                inflight_key, leases_key, attempts_key, f"queue:{queue_name}", dead_key,
+                token, item.get("id", raw_item), raw_item, json.dumps(item), max_attempts
+            )
+            
+            if attempts < 0:
+                return False
+            
+            if attempts >= max_attempts:
+                logger.warning(f"Item movido para dead-letter em {queue_name} após {attempts} tentativas")
+                return False
+            
+            # Volta para o início da fila para preservar a ordem de chegada
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao devolver item à fila {queue_name}: {e}")
+            return False
+    
+    async def extend_lease(self, queue_name: str, token: str, visibility_timeout: int = 300) -> bool:
+        """
+        Renova a lease de uma entrega em andamento (heartbeat)
+        
+        Args:
+            queue_name: Nome da fila
+            token: Token da entrega
+            visibility_timeout: Segundos a partir de agora
+            
+        Returns:
+            False se a entrega já não existe (ack, nack ou reentregue)
+        """
+        try:
+            changed = await self.redis_client.zadd(
+                f"queue:inflight_leases:{queue_name}",
+                {token: time.time() + visibility_timeout},
+                xx=True,
+                ch=True
+            )
+            return changed > 0
+            
+        except Exception as e:
+            logger.error(f"Erro ao renovar lease em {queue_name}: {e}")
+            return False
+    
+    async def requeue_stuck(
+        self,
+        queue_name: str,
+        visibility_timeout: int = 300,
+        max_attempts: int = 3
+    ) -> int:
+        """
+        Devolve à fila itens cuja lease expirou (worker morreu ou travou)
+        
+        Args:
+            queue_name: Nome da fila
+            visibility_timeout: Mantido por compatibilidade (a lease é gravada no dequeue)
+            max_attempts: Máximo de tentativas antes do dead-letter
+            
+        Returns:
+            Número de itens devolvidos à fila
+        """
+        try:
+            requeued = 0
+            
+            # Itens em processamento no formato anterior (lista sem token) voltam à fila
+            while await self.redis_client.lmove(
+                f"queue:processing:{queue_name}", f"queue:{queue_name}", "RIGHT", "LEFT"
+            ):
+                requeued += 1
+            if requeued:
+                await self.redis_client.delete(f"queue:leases:{queue_name}")
+            
+            expired = await self.redis_client.zrangebyscore(
+                f"queue:inflight_leases:{queue_name}", 0, time.time()
+            )
+            
+            # Mais recentes primeiro: nack() devolve ao início da fila
+            for token in reversed(expired):
+                if await self.nack(queue_name, token, max_attempts):
+                    requeued += 1
+            
+            if expired:
+                logger.warning(f"{len(expired)} itens travados recuperados em {queue_name}")
+            
+            return requeued
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar itens travados de {queue_name}: {e}")
+            return 0
+    
+    async def processing_size(self, queue_name: str) -> int:
+        """
+        Obtém número de itens em processamento (ainda sem ack)
+        
+        Args:
+            queue_name: Nome da fila
+            
+        Returns:
+            Número de itens em processamento
+        """
+        try:
+            return await self.redis_client.hlen(f"queue:inflight:{queue_name}")
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter itens em processamento de {queue_name}: {e}")
+            return 0
+    
+    async def processing_sizes(self, queue_names: List[str]) -> List[int]:
+        """
+        Obtém itens em processamento de várias filas em um único round trip
+        
+        Args:
+            queue_names: Nomes das filas
+            
+        Returns:
+            Número de itens em processamento de cada fila, na mesma ordem
+        """
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for queue_name in queue_names:
+                pipe.hlen(f"queue:inflight:{queue_name}")
+            return list(await pipe.execute())
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter itens em processamento de {len(queue_names)} filas: {e}")
+            return [0] * len(queue_names)
+    
+    # ==================== AGENDAMENTO ====================
+    
+    # Move atomicamente itens vencidos para o sorted set de processamento,
+    # com score = fim da lease (seguro entre vários hosts)
+    _CLAIM_DUE_SCRIPT = (
+        "local items = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2]) "
+        "for _, item in ipairs(items) do "
+        "redis.call('zrem', KEYS[1], item) "
+        "redis.call('zadd', KEYS[2], ARGV[3], item) "
+        "end "
+        "return items"
+    )
+    
+    # Devolve à agenda itens com lease expirada; dead-letter após max_attempts
+    _REQUEUE_EXPIRED_SCRIPT = (
+        "local items = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1]) "
+        "local requeued = 0 "
+        "for _, item in ipairs(items) do "
+        "redis.call('zrem', KEYS[1], item) "
+        "if redis.call('hincrby', KEYS[3], item, 1) >= tonumber(ARGV[2]) then "
+        "redis.call('hdel', KEYS[3], item) "
+        "redis.call('rpush', KEYS[4], item) "
+        "else "
+        "redis.call('zadd', KEYS[2], ARGV[1], item) "
+        "requeued = requeued + 1 "
+        "end "
+        "end "
+        "return {#items, requeued}"
+    )
+    
+    async def schedule(self, key: str, data: Any, run_at: float) -> bool:
+        """
+        Agenda item para execução futura (sorted set por timestamp)
+        
+        Args:
+            key: Chave da agenda
+            data: Dados do item (devem ser únicos)
+            run_at: Timestamp UNIX de execução
+            
+        Returns:
+            True se sucesso
+        """
+        try:
+            await self.redis_client.zadd(f"schedule:{key}", {json.dumps(data): run_at})
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao agendar item em {key}: {e}")
+            return False
+    
+    async def claim_due(
+        self,
+        key: str,
+        limit: int = 100,
+        lease: int = 60
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Reivindica itens cujo horário já chegou
+        
+        Os itens saem da agenda para o sorted set de processamento e só
+        são removidos de vez com complete_scheduled(). Se o processo
+        morrer antes disso, requeue_expired_scheduled() devolve o item
+        à agenda quando a lease expirar.
+        
+        Args:
+            key: Chave da agenda
+            limit: Máximo de itens retornados
+            lease: Segundos até o item ser considerado travado
+            
+        Returns:
+            Lista de tuplas (payload bruto, item) em ordem de horário
+        """
+        try:
+            now = time.time()
+            items = await self.redis_client.eval(
+                self._CLAIM_DUE_SCRIPT, 2,
+                f"schedule:{key}", f"schedule:processing:{key}",
+                now, limit, now + lease
+            )
+            return [(item, json.loads(item)) for item in items]
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter itens vencidos de {key}: {e}")
+            return []
+    
+    async def complete_scheduled(self, key: str, raw_item: str) -> bool:
+        """
+        Confirma execução de item obtido com claim_due()
+        
+        Args:
+            key: Chave da agenda
+            raw_item: Payload bruto retornado por claim_due
+            
+        Returns:
+            True se o item foi removido do processamento
+        """
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.zrem(f"schedule:processing:{key}", raw_item)
+            pipe.hdel(f"schedule:attempts:{key}", raw_item)
+            removed, _ = await pipe.execute()
+            return removed > 0
+            
+        except Exception as e:
+            logger.error(f"Erro ao confirmar item agendado de {key}: {e}")
+            return False
+    
+    async def requeue_expired_scheduled(self, key: str, max_attempts: int = 3) -> int:
+        """
+        Devolve à agenda itens cuja lease expirou (para execução imediata)
+        
+        Itens que excederem max_attempts vão para a lista de dead-letter.
+        
+        Args:
+            key: Chave da agenda
+            max_attempts: Máximo de tentativas antes do dead-letter
+            
+        Returns:
+            Número de itens devolvidos à agenda
+        """
+        try:
+            expired, requeued = await self.redis_client.eval(
+                self._REQUEUE_EXPIRED_SCRIPT, 4,
+                f"schedule:processing:{key}", f"schedule:{key}",
+                f"schedule:attempts:{key}", f"schedule:dead:{key}",
+                time.time(), max_attempts
+            )
+            
+            if expired:
+                logger.warning(
+                    f"{expired} itens agendados travados em {key} "
+                    f"({requeued} devolvidos, {expired - requeued} em dead-letter)"
+                )
+            
+            return requeued
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar itens agendados de {key}: {e}")
+            return 0
+    
+    async def schedule_size(self, key: str) -> int:
+        """
+        Obtém número de itens agendados
+        
+        Args:
+            key: Chave da agenda
+            
+        Returns:
+            Número de itens pendentes
+        """
+        try:
+            return await self.redis_client.zcard(f"schedule:{key}")
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter tamanho da agenda {key}: {e}")
+            return 0
+    
+    async def scheduled_processing_size(self, key: str) -> int:
+        """
+        Obtém número de itens agendados em execução (ainda sem confirmação)
+        
+        Args:
+            key: Chave da agenda
+            
+        Returns:
+            Número de itens em processamento
+        """
+        try:
+            return await self.redis_client.zcard(f"schedule:processing:{key}")
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter itens em processamento da agenda {key}: {e}")
+            return 0
+    
     # ==================== FILAS ESPECÍFICAS ====================
     
     async def enqueue_follow_up(
@@ -461,10 +1197,21 @@ class RedisClient:
     
     # ==================== LOCKS ====================
     
+    # Só remove/renova o lock se ele ainda pertencer ao dono informado
+    _RELEASE_LOCK_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) else return 0 end"
+    )
+    _RENEW_LOCK_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('expire', KEYS[1], ARGV[2]) else return 0 end"
+    )
+    
     async def acquire_lock(
         self,
         key: str,
-        ttl: int = 10
+        ttl: int = 10,
+        owner: str = "1"
     ) -> bool:
         """
         Adquire lock distribuído
@@ -472,6 +1219,7 @@ class RedisClient:
         Args:
             key: Chave do lock
             ttl: Tempo de vida do lock
+            owner: Identificador do dono do lock
             
         Returns:
             True se adquiriu lock
@@ -482,7 +1230,7 @@ class RedisClient:
             # Tenta definir com NX (only if not exists)
             result = await self.redis_client.set(
                 lock_key,
-                "1",
+                owner,
                 nx=True,
                 ex=ttl
             )
@@ -493,24 +1241,106 @@ class RedisClient:
             logger.error(f"Erro ao adquirir lock {key}: {e}")
             return False
     
-    async def release_lock(self, key: str) -> bool:
+    async def renew_lock(self, key: str, owner: str, ttl: int = 10) -> bool:
+        """
+        Renova TTL de um lock mantido pelo dono informado
+        
+        Args:
+            key: Chave do lock
+            owner: Identificador do dono do lock
+            ttl: Novo tempo de vida
+            
+        Returns:
+            True se o lock ainda pertence ao dono e foi renovado
+        """
+        try:
+            lock_key = f"lock:{key}"
+            result = await self.redis_client.eval(self._RENEW_LOCK_SCRIPT, 1, lock_key, owner, ttl)
+            return result == 1
+            
+        except Exception as e:
+            logger.error(f"Erro ao renovar lock {key}: {e}")
+            return False
+    
+    async def release_lock(self, key: str, owner: Optional[str] = None) -> bool:
         """
         Libera lock
         
         Args:
             key: Chave do lock
+            owner: Se informado, só libera se o lock pertencer a este dono
             
         Returns:
             True se liberou
         """
         try:
             lock_key = f"lock:{key}"
+            
+            if owner is not None:
+                result = await self.redis_client.eval(self._RELEASE_LOCK_SCRIPT, 1, lock_key, owner)
+                return result == 1
+            
             return await self.delete(lock_key)
             
         except Exception as e:
             logger.error(f"Erro ao liberar lock {key}: {e}")
             return False
     
+    # ==================== CONJUNTOS ====================
+    
+    async def add_to_set(self, key: str, *members: Any) -> int:
+        """
+        Adiciona membros a um conjunto
+        
+        Args:
+            key: Chave do conjunto
+            members: Membros a adicionar
+            
+        Returns:
+            Número de membros novos
+        """
+        try:
+            return await self.redis_client.sadd(key, *members)
+            
+        except Exception as e:
+            logger.error(f"Erro ao adicionar ao conjunto {key}: {e}")
+            return 0
+    
+    async def remove_from_set(self, key: str, *members: Any) -> int:
+        """
+        Remove membros de um conjunto
+        
+        Args:
+            key: Chave do conjunto
+            members: Membros a remover
+            
+        Returns:
+            Número de membros removidos
+        """
+        try:
+            return await self.redis_client.srem(key, *members)
+            
+        except Exception as e:
+            logger.error(f"Erro ao remover do conjunto {key}: {e}")
+            return 0
+    
+    async def get_set_members(self, key: str) -> List[str]:
+        """
+        Obtém membros de um conjunto
+        
+        Args:
+            key: Chave do conjunto
+            
+        Returns:
+            Lista de membros
+        """
+        try:
+            return list(await self.redis_client.smembers(key))
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter conjunto {key}: {e}")
+            return []
+    
     # ==================== PUBSUB ====================
     
     async def publish(self, channel: str, message: Any):
@@ -605,6 +1435,42 @@ class RedisClient:
         key = f"counter:{counter_name}"
         await self.delete(key)
     
+    async def write_batch(
+        self,
+        values: Dict[str, Tuple[Any, int]],
+        counters: Dict[str, int]
+    ) -> bool:
+        """
+        Grava valores com TTL e incrementa contadores em um único pipeline
+        
+        Args:
+            values: Chave -> (valor, ttl em segundos)
+            counters: Nome do contador -> quantidade a incrementar
+            
+        Returns:
+            True se sucesso
+        """
+        if not values and not counters:
+            return True
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            
+            for key, (value, ttl) in values.items():
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value)
+                pipe.setex(key, ttl, value)
+            
+            for counter_name, amount in counters.items():
+                pipe.incrby(f"counter:{counter_name}", amount)
+            
+            await pipe.execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao gravar lote ({len(values)} valores, {len(counters)} contadores): {e}")
+            return False
+    
     # ==================== SESSIONS ====================
     
     async def save_session(
@@ -3,15 +3,41 @@ Cliente Supabase para o SDR IA SolarPrime
 Gerencia todas as operações com o banco de dados
 """
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 from uuid import UUID, uuid4
 
 from supabase import create_client, Client
 from loguru import logger
 from app.utils.logger import emoji_logger
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 from app.config import settings
+from app.integrations.redis_client import redis_client
+from app.integrations.postgres import postgres_backend
+from app.services.message_buffer import message_buffer
+from app.services.analytics_sink import analytics_sink
+
+# Sinaliza que a operação deve seguir pelo REST
+FALLBACK = object()
+
+# Campos da mensagem mantidos na janela de contexto em Redis
+WINDOW_COLUMNS = "id,sender,content,created_at"
+
+
+def _message_datetime(message_data: Dict[str, Any]) -> Optional[datetime]:
+    """Horário da mensagem no WhatsApp (messageTimestamp do payload bruto)"""
+    raw_data = (message_data.get('metadata') or {}).get('raw_data') or {}
+    try:
+        timestamp = int(raw_data.get('messageTimestamp') or 0)
+    except (TypeError, ValueError):
+        return None
+    return datetime.fromtimestamp(timestamp) if timestamp > 0 else None
+
+
+def _compact_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduz a mensagem aos campos da janela de contexto"""
+    return {column: message.get(column) for column in WINDOW_COLUMNS.split(",")}
 
 
 class SupabaseClient:
@@ -23,13 +49,129 @@ class SupabaseClient:
             supabase_url=settings.supabase_url,
             supabase_key=settings.supabase_service_key
         )
+        
+        # O cliente PostgREST é síncrono: as queries rodam em um pool limitado
+        # de threads (reutilizando a sessão HTTP do cliente) sem travar o event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.supabase_max_workers,
+            thread_name_prefix="supabase"
+        )
+        
+        # Escritas de sessão por session_id (em andamento e próxima, coalescida)
+        self._pending_sessions: Dict[str, Dict[str, Any]] = {}
         emoji_logger.supabase_connect("Cliente inicializado com sucesso")
     
+    async def execute(self, query: Any) -> Any:
+        """
+        Executa uma query do cliente Supabase fora do event loop
+        
+        Args:
+            query: Query montada com self.client (table, rpc, etc)
+            
+        Returns:
+            Resposta do PostgREST
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, query.execute)
+    
+    async def iter_rows(
+        self,
+        table: str,
+        filters: Optional[Callable[[Any], Any]] = None,
+        columns: str = "*",
+        page_size: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Percorre uma tabela em páginas por keyset (created_at, id)
+        
+        Cada página é uma query com limite e cursor na última linha lida,
+        sem OFFSET: o custo por página é constante e o resultado inteiro
+        nunca fica em memória. Linhas com created_at nulo não cabem no
+        cursor e são lidas no fim, em páginas por id.
+        
+        Args:
+            table: Nome da tabela
+            filters: Função que aplica filtros à query (ex.: lambda q: q.eq(...))
+            columns: Colunas a selecionar (created_at e id são incluídas)
+            page_size: Linhas por página (padrão SUPABASE_PAGE_SIZE)
+            
+        Yields:
+            Linhas em ordem de created_at, id (nulos por último)
+        """
+        page_size = page_size or settings.supabase_page_size
+        if columns != "*":
+            columns = ",".join(dict.fromkeys(columns.split(",") + ["created_at", "id"]))
+        
+        def base_query():
+            query = self.client.table(table).select(columns)
+            return filters(query) if filters else query
+        
+        cursor: Optional[Tuple[str, str]] = None
+        while True:
+            query = base_query().not_.is_('created_at', 'null')
+            
+            if cursor:
+                created_at, row_id = cursor
+                query = query.or_(
+                    f'created_at.gt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.gt.{row_id})'
+                )
+            
+            result = await self.execute(
+                query.order('created_at').order('id').limit(page_size)
+            )
+            rows = result.data or []
+            
+            for row in rows:
+                yield row
+            
+            if len(rows) < page_size:
+                break
+            
+            cursor = (rows[-1]['created_at'], rows[-1]['id'])
+        
+        last_id: Optional[str] = None
+        while True:
+            query = base_query().is_('created_at', 'null')
+            if last_id:
+                query = query.gt('id', last_id)
+            
+            result = await self.execute(query.order('id').limit(page_size))
+            rows = result.data or []
+            
+            for row in rows:
+                yield row
+            
+            if len(rows) < page_size:
+                return
+            
+            last_id = rows[-1]['id']
+    
+    async def _via_postgres(self, operation: str, *args) -> Any:
+        """
+        Executa operação no backend asyncpg quando configurado
+        
+        Args:
+            operation: Nome do método de PostgresBackend
+            *args: Argumentos do método
+            
+        Returns:
+            Resultado da operação ou FALLBACK para seguir pelo REST
+        """
+        if settings.database_backend != "asyncpg" or not postgres_backend.available:
+            return FALLBACK
+        
+        try:
+            return await getattr(postgres_backend, operation)(*args)
+        except Exception as e:
+            logger.warning(f"asyncpg falhou em {operation}, usando REST: {e}")
+            return FALLBACK
+    
     async def test_connection(self) -> bool:
         """Testa conexão com o Supabase"""
         try:
             # Tenta fazer uma query simples
-            result = self.client.table('leads').select("id").limit(1).execute()
+            result = await self.execute(self.client.table('leads').select("id").limit(1))
             emoji_logger.supabase_success("Conexão estabelecida")
             return True
         except Exception as e:
@@ -45,10 +187,11 @@ class SupabaseClient:
             lead_data['created_at'] = datetime.now().isoformat()
             lead_data['updated_at'] = datetime.now().isoformat()
             
-            result = self.client.table('leads').insert(lead_data).execute()
+            result = await self.execute(self.client.table('leads').insert(lead_data))
             
             if result.data:
                 emoji_logger.supabase_insert("leads", 1, lead_id=result.data[0]['id'])
+                await self._cache_lead(result.data[0])
                 return result.data[0]
             
             raise Exception("Erro ao criar lead")
@@ -58,14 +201,21 @@ class SupabaseClient:
             raise
     
     async def get_lead_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
-        """Busca lead por telefone"""
+        """Busca lead por telefone (read-through no cache Redis)"""
         try:
-            result = self.client.table('leads').select("*").eq('phone_number', phone).execute()
+            cached = await redis_client.get_lead_info(phone)
+            if cached:
+                return cached
             
-            if result.data:
-                return result.data[0]
+            lead = await self._via_postgres("get_lead_by_phone", phone)
+            if lead is FALLBACK:
+                result = await self.execute(self.client.table('leads').select("*").eq('phone_number', phone))
+                lead = result.data[0] if result.data else None
             
-            return None
+            if lead:
+                await self._cache_lead(lead, phone)
+            
+            return lead
             
         except Exception as e:
             emoji_logger.supabase_error(f"Erro ao buscar lead: {str(e)}", table="leads")
@@ -76,10 +226,12 @@ class SupabaseClient:
         try:
             update_data['updated_at'] = datetime.now().isoformat()
             
-            result = self.client.table('leads').update(update_data).eq('id', lead_id).execute()
+            result = await self.execute(self.client.table('leads').update(update_data).eq('id', lead_id))
             
             if result.data:
                 emoji_logger.supabase_update("leads", 1, lead_id=lead_id)
+                # Write-through: mantém o cache de resolução coerente
+                await self._cache_lead(result.data[0])
                 return result.data[0]
             
             raise Exception("Erro ao atualizar lead")
@@ -88,14 +240,60 @@ class SupabaseClient:
             emoji_logger.supabase_error(f"Erro ao atualizar lead: {str(e)}", table="leads")
             raise
     
+    async def _cache_lead(self, lead: Dict[str, Any], phone: Optional[str] = None):
+        """Grava lead no cache de resolução por telefone"""
+        phone = phone or lead.get('phone_number') or lead.get('phone')
+        if phone:
+            await redis_client.cache_lead_info(phone, lead)
+    
+    async def resolve_lead_and_conversation(
+        self,
+        phone: str,
+        first_message: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Resolve (ou cria) lead e conversa do telefone
+        
+        Para um lead recorrente, ambos vêm do cache Redis sem leitura no banco.
+        
+        Args:
+            phone: Número do telefone
+            first_message: Primeira mensagem, usada se o lead for criado
+            
+        Returns:
+            Tupla (lead, conversa)
+        """
+        lead = await self.get_lead_by_phone(phone)
+        
+        if not lead:
+            # Cria novo lead
+            lead = await self.create_lead({
+                "phone": phone,
+                "first_message": first_message,
+                "source": "whatsapp",
+                "status": "new",
+                "created_at": datetime.now().isoformat()
+            })
+            await self._cache_lead(lead, phone)
+        
+        conversation = await self.get_conversation_by_phone(phone)
+        if not conversation:
+            conversation = await self.create_conversation(phone, lead["id"])
+        
+        return lead, conversation
+    
+    def iter_qualified_leads(self, page_size: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Percorre leads qualificados em páginas"""
+        return self.iter_rows(
+            'leads',
+            filters=lambda query: query.eq('qualification_status', 'QUALIFIED'),
+            page_size=page_size
+        )
+    
     async def get_qualified_leads(self) -> List[Dict[str, Any]]:
         """Retorna leads qualificados"""
         try:
-            result = self.client.table('leads').select("*").eq(
-                'qualification_status', 'QUALIFIED'
-            ).execute()
-            
-            return result.data or []
+            return [lead async for lead in self.iter_qualified_leads()]
             
         except Exception as e:
             emoji_logger.supabase_error(f"Erro ao buscar leads qualificados: {str(e)}", table="leads")
@@ -131,10 +329,11 @@ class SupabaseClient:
                 'updated_at': datetime.now().isoformat()
             }
             
-            result = self.client.table('conversations').insert(conversation_data).execute()
+            result = await self.execute(self.client.table('conversations').insert(conversation_data))
             
             if result.data:
                 emoji_logger.supabase_insert("conversations", 1, conversation_id=result.data[0]['id'])
+                await redis_client.cache_conversation(phone, result.data[0])
                 return result.data[0]
             
             raise Exception("Erro ao criar conversa")
@@ -144,16 +343,23 @@ class SupabaseClient:
             raise
     
     async def get_conversation_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
-        """Busca conversa por telefone"""
+        """Busca conversa por telefone (read-through no cache Redis)"""
         try:
-            result = self.client.table('conversations').select("*").eq(
-                'phone_number', phone
-            ).execute()
+            cached = await redis_client.get_conversation(phone)
+            if cached and cached.get('id'):
+                return cached
             
-            if result.data:
-                return result.data[0]
+            conversation = await self._via_postgres("get_conversation_by_phone", phone)
+            if conversation is FALLBACK:
+                result = await self.execute(self.client.table('conversations').select("*").eq(
+                    'phone_number', phone
+                ))
+                conversation = result.data[0] if result.data else None
             
-            return None
+            if conversation:
+                await redis_client.cache_conversation(phone, conversation)
+            
+            return conversation
             
         except Exception as e:
             emoji_logger.supabase_error(f"Erro ao buscar conversa: {str(e)}", table="conversations")
@@ -165,11 +371,13 @@ class SupabaseClient:
             update_data['updated_at'] = datetime.now().isoformat()
             update_data['last_message_at'] = datetime.now().isoformat()
             
-            result = self.client.table('conversations').update(update_data).eq(
+            result = await self.execute(self.client.table('conversations').update(update_data).eq(
                 'id', conversation_id
-            ).execute()
+            ))
             
             if result.data:
+                if result.data[0].get('phone_number'):
+                    await redis_client.cache_conversation(result.data[0]['phone_number'], result.data[0])
                 return result.data[0]
             
             raise Exception("Erro ao atualizar conversa")
@@ -182,24 +390,123 @@ class SupabaseClient:
     
     async def save_message(self, message_data: Dict[str, Any]) -> Dict[str, Any]:
         """Salva mensagem no banco"""
+        saved = await self.save_messages([message_data])
+        return saved[0] if saved else message_data
+    
+    async def save_messages(self, messages_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Salva várias mensagens
+        
+        Com o buffer de mensagens ativo as linhas são gravadas em lote em
+        segundo plano e retornadas na hora (com id e created_at). O insert
+        é idempotente em whatsapp_message_id (índice único): mensagens do
+        WhatsApp já gravadas são ignoradas.
+        """
+        if not messages_data:
+            return []
+        
+        # Mesmas colunas em todas as linhas do lote (insert em massa)
+        for message_data in messages_data:
+            message_data.setdefault('whatsapp_message_id', None)
+        
+        # created_at pelo horário do WhatsApp, estritamente crescente no lote
+        # (mensagens no mesmo segundo mantêm a ordem de chegada)
+        now = datetime.now()
+        previous = None
+        for message_data in messages_data:
+            created_at = _message_datetime(message_data) or now
+            if previous is not None and created_at <= previous:
+                created_at = previous + timedelta(microseconds=1)
+            message_data['created_at'] = created_at.isoformat()
+            previous = created_at
+        
+        if message_buffer.running:
+            saved = message_buffer.add(messages_data)
+        else:
+            saved = await self.insert_messages(messages_data)
+        
+        await self._append_to_windows(saved)
+        return saved
+    
+    async def _append_to_windows(self, messages: List[Dict[str, Any]]):
+        """Anexa mensagens salvas à janela de contexto de cada conversa"""
+        by_conversation: Dict[str, List[Dict[str, Any]]] = {}
+        for message in messages or []:
+            if message and message.get('conversation_id'):
+                by_conversation.setdefault(message['conversation_id'], []).append(
+                    _compact_message(message)
+                )
+        
+        for conversation_id, records in by_conversation.items():
+            await redis_client.append_to_window(
+                conversation_id,
+                records,
+                max_len=settings.conversation_window_size,
+                ttl=settings.conversation_window_ttl
+            )
+    
+    async def insert_messages(self, messages_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Grava mensagens em um único insert e atualiza os contadores"""
         try:
-            message_data['created_at'] = datetime.now().isoformat()
-            
-            result = self.client.table('messages').insert(message_data).execute()
-            
-            if result.data:
-                # Incrementa contador de mensagens na conversa
-                if message_data.get('conversation_id'):
-                    await self._increment_message_count(message_data['conversation_id'])
+            saved = await self._via_postgres("insert_messages", messages_data)
+            if saved is FALLBACK:
+                result = await self.execute(self.client.table('messages').upsert(
+                    messages_data,
+                    on_conflict='whatsapp_message_id',
+                    ignore_duplicates=True
+                ))
+                saved = result.data or []
+            
+            if saved:
+                # Incrementa contador de cada conversa uma única vez
+                # (só linhas realmente inseridas; duplicatas não contam)
+                counts: Dict[str, int] = {}
+                for message_data in saved:
+                    if message_data.get('conversation_id'):
+                        conversation_id = message_data['conversation_id']
+                        counts[conversation_id] = counts.get(conversation_id, 0) + 1
                 
-                return result.data[0]
+                await asyncio.gather(*[
+                    self._increment_message_count(conversation_id, amount)
+                    for conversation_id, amount in counts.items()
+                ])
+                
+                emoji_logger.supabase_insert("messages", len(saved))
             
-            raise Exception("Erro ao salvar mensagem")
+            # Lote só de mensagens já gravadas não retorna linhas
+            return saved
             
         except Exception as e:
-            emoji_logger.supabase_error(f"Erro ao salvar mensagem: {str(e)}", table="messages")
+            emoji_logger.supabase_error(f"Erro ao salvar mensagens: {str(e)}", table="messages")
             raise
     
+    async def get_stored_message_ids(self, whatsapp_ids: List[str]) -> Set[str]:
+        """
+        Retorna os ids do WhatsApp já salvos (gravados ou no buffer)
+        
+        Args:
+            whatsapp_ids: IDs de mensagem do WhatsApp (key.id)
+            
+        Returns:
+            Conjunto dos ids já salvos
+        """
+        whatsapp_ids = [whatsapp_id for whatsapp_id in whatsapp_ids if whatsapp_id]
+        if not whatsapp_ids:
+            return set()
+        
+        stored = set(message_buffer.pending_whatsapp_ids(whatsapp_ids))
+        
+        rows = await self._via_postgres("get_stored_message_ids", whatsapp_ids)
+        if rows is FALLBACK:
+            result = await self.execute(
+                self.client.table('messages').select('whatsapp_message_id').in_(
+                    'whatsapp_message_id', whatsapp_ids
+                )
+            )
+            rows = [row['whatsapp_message_id'] for row in result.data or []]
+        
+        return stored | set(rows)
+    
     async def get_conversation_messages(
         self,
         conversation_id: str,
@@ -207,9 +514,9 @@ class SupabaseClient:
     ) -> List[Dict[str, Any]]:
         """Retorna mensagens de uma conversa"""
         try:
-            result = self.client.table('messages').select("*").eq(
+            result = await self.execute(self.client.table('messages').select("*").eq(
                 'conversation_id', conversation_id
-            ).order('created_at', desc=False).limit(limit).execute()
+            ).order('created_at', desc=False).limit(limit))
             
             return result.data or []
             
@@ -217,22 +524,78 @@ class SupabaseClient:
             logger.error(f"Erro ao buscar mensagens: {str(e)}")
             return []
     
-    async def _increment_message_count(self, conversation_id: str):
-        """Incrementa contador de mensagens na conversa"""
+    async def get_conversation_window(
+        self,
+        conversation_id: str,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retorna a janela de contexto da conversa (id, sender, content, created_at)
+        
+        Lida da lista em Redis mantida por save_messages; na primeira
+        leitura (ou após expirar) busca só essas colunas no banco e semeia
+        a janela.
+        """
+        limit = limit or settings.conversation_window_size
+        
+        window = await redis_client.get_window(conversation_id)
+        if window is not None:
+            return window[-limit:]
+        
+        messages = await self.get_last_messages(
+            conversation_id,
+            limit=settings.conversation_window_size,
+            columns=WINDOW_COLUMNS
+        )
+        records = [_compact_message(message) for message in messages]
+        
+        await redis_client.set_window(
+            conversation_id,
+            records,
+            max_len=settings.conversation_window_size,
+            ttl=settings.conversation_window_ttl
+        )
+        return records[-limit:]
+    
+    async def get_last_messages(
+        self,
+        conversation_id: str,
+        limit: int = 100,
+        columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        """Retorna as últimas N mensagens da conversa em ordem cronológica"""
         try:
-            # Busca conversa atual
-            conv = self.client.table('conversations').select("total_messages").eq(
-                'id', conversation_id
-            ).execute()
+            messages = await self._via_postgres("get_last_messages", conversation_id, limit, columns)
+            if messages is FALLBACK:
+                result = await self.execute(self.client.table('messages').select(columns).eq(
+                    'conversation_id', conversation_id
+                ).order('created_at', desc=True).limit(limit))
+                messages = list(reversed(result.data or []))
+            
+            # Read-your-writes: inclui mensagens ainda no buffer
+            pending = message_buffer.pending_for(conversation_id)
+            if pending:
+                stored_ids = {message.get('id') for message in messages}
+                messages = messages + [message for message in pending if message['id'] not in stored_ids]
+                messages = messages[-limit:]
+            
+            return messages
             
-            if conv.data:
-                current_count = conv.data[0].get('total_messages', 0)
-                
-                # Atualiza contador
-                self.client.table('conversations').update({
-                    'total_messages': current_count + 1,
-                    'last_message_at': datetime.now().isoformat()
-                }).eq('id', conversation_id).execute()
+        except Exception as e:
+            logger.error(f"Erro ao buscar últimas mensagens: {str(e)}")
+            return []
+    
+    async def _increment_message_count(self, conversation_id: str, amount: int = 1):
+        """Incrementa contador de mensagens na conversa"""
+        try:
+            if await self._via_postgres("increment_message_count", conversation_id, amount) is not FALLBACK:
+                return
+            
+            # Incremento atômico no servidor (sqls/funcao-increment_message_count.sql)
+            await self.execute(self.client.rpc('increment_message_count', {
+                'p_conversation_id': conversation_id,
+                'p_amount': amount
+            }))
                 
         except Exception as e:
             logger.error(f"Erro ao incrementar contador: {str(e)}")
@@ -245,7 +608,7 @@ class SupabaseClient:
             follow_up_data['created_at'] = datetime.now().isoformat()
             follow_up_data['updated_at'] = datetime.now().isoformat()
             
-            result = self.client.table('follow_ups').insert(follow_up_data).execute()
+            result = await self.execute(self.client.table('follow_ups').insert(follow_up_data))
             
             if result.data:
                 logger.info(f"Follow-up criado: {result.data[0]['id']}")
@@ -262,9 +625,9 @@ class SupabaseClient:
         try:
             now = datetime.now().isoformat()
             
-            result = self.client.table('follow_ups').select("*").eq(
+            result = await self.execute(self.client.table('follow_ups').select("*").eq(
                 'status', 'PENDING'
-            ).lte('scheduled_at', now).order('priority', desc=True).execute()
+            ).lte('scheduled_at', now).order('priority', desc=True))
             
             return result.data or []
             
@@ -288,9 +651,9 @@ class SupabaseClient:
             if executed_at:
                 update_data['executed_at'] = executed_at.isoformat()
             
-            result = self.client.table('follow_ups').update(update_data).eq(
+            result = await self.execute(self.client.table('follow_ups').update(update_data).eq(
                 'id', follow_up_id
-            ).execute()
+            ))
             
             if result.data:
                 return result.data[0]
@@ -307,10 +670,10 @@ class SupabaseClient:
         """Busca na base de conhecimento"""
         try:
             # Busca full-text em português
-            result = self.client.rpc('search_knowledge', {
+            result = await self.execute(self.client.rpc('search_knowledge', {
                 'search_query': query,
                 'result_limit': limit
-            }).execute()
+            }))
             
             return result.data or []
             
@@ -318,9 +681,9 @@ class SupabaseClient:
             logger.error(f"Erro ao buscar conhecimento: {str(e)}")
             # Fallback para busca simples
             try:
-                result = self.client.table('knowledge_base').select("*").ilike(
+                result = await self.execute(self.client.table('knowledge_base').select("*").ilike(
                     'content', f'%{query}%'
-                ).limit(limit).execute()
+                ).limit(limit))
                 
                 return result.data or []
             except:
@@ -332,7 +695,7 @@ class SupabaseClient:
             knowledge_data['created_at'] = datetime.now().isoformat()
             knowledge_data['updated_at'] = datetime.now().isoformat()
             
-            result = self.client.table('knowledge_base').insert(knowledge_data).execute()
+            result = await self.execute(self.client.table('knowledge_base').insert(knowledge_data))
             
             if result.data:
                 logger.info(f"Conhecimento adicionado: {result.data[0]['id']}")
@@ -347,59 +710,81 @@ class SupabaseClient:
     # ============= ANALYTICS =============
     
     async def log_event(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Registra evento de analytics"""
+        """
+        Registra evento de analytics (fire-and-forget)
+        
+        O evento entra no buffer do sink de analytics e é gravado em lote;
+        sem o sink rodando, é inserido diretamente.
+        """
+        if analytics_sink.running:
+            analytics_sink.log_event(event_data)
+            return event_data
+        
+        event_data.setdefault('id', str(uuid4()))
+        event_data['timestamp'] = datetime.now().isoformat()
+        event_data['created_at'] = datetime.now().isoformat()
+        rows = await self.insert_events([event_data])
+        return rows[0] if rows else event_data
+    
+    async def insert_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Grava eventos de analytics em um único upsert
+        
+        Eventos com id já gravado são ignorados, então reenviar um lote
+        (spill, timeout) não duplica linhas.
+        """
         try:
-            event_data['timestamp'] = datetime.now().isoformat()
-            event_data['created_at'] = datetime.now().isoformat()
-            
-            result = self.client.table('analytics').insert(event_data).execute()
+            result = await self.execute(self.client.table('analytics').upsert(
+                events,
+                on_conflict='id',
+                ignore_duplicates=True
+            ))
             
-            if result.data:
-                return result.data[0]
-            
-            raise Exception("Erro ao registrar evento")
+            # Lote só de eventos já gravados não retorna linhas
+            return result.data or []
             
         except Exception as e:
-            logger.error(f"Erro ao registrar evento: {str(e)}")
+            logger.error(f"Erro ao registrar {len(events)} eventos: {str(e)}")
             raise
     
     async def get_daily_stats(self) -> Dict[str, Any]:
-        """Retorna estatísticas do dia"""
+        """
+        Retorna estatísticas do dia
+        
+        Calculadas por uma única RPC (sqls/funcao-get_daily_stats.sql) e
+        cacheadas no Redis por alguns segundos: scrapes do /metrics não
+        chegam ao banco.
+        """
+        today = datetime.now().date().isoformat()
+        cache_key = f"stats:daily:{today}"
+        
+        cached = await redis_client.get(cache_key)
+        if cached:
+            return cached
+        
         try:
-            today_start = datetime.now().replace(hour=0, minute=0, second=0).isoformat()
-            
-            # Total de leads do dia
-            leads = self.client.table('leads').select("id", count='exact').gte(
-                'created_at', today_start
-            ).execute()
-            
-            # Leads qualificados do dia
-            qualified = self.client.table('leads').select("id", count='exact').gte(
-                'created_at', today_start
-            ).eq('qualification_status', 'QUALIFIED').execute()
-            
-            # Conversas ativas
-            active_convs = self.client.table('conversations').select("id", count='exact').eq(
-                'status', 'ACTIVE'
-            ).execute()
-            
-            # Reuniões agendadas hoje
-            meetings = self.client.table('leads').select("id", count='exact').gte(
-                'meeting_scheduled_at', today_start
-            ).execute()
-            
-            return {
-                'date': datetime.now().date().isoformat(),
-                'total_leads': leads.count if leads else 0,
-                'qualified_leads': qualified.count if qualified else 0,
-                'active_conversations': active_convs.count if active_convs else 0,
-                'meetings_scheduled': meetings.count if meetings else 0
+            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+            
+            result = await self.execute(self.client.rpc('get_daily_stats', {
+                'p_day_start': today_start
+            }))
+            counts = result.data or {}
+            
+            stats = {
+                'date': today,
+                'total_leads': counts.get('total_leads', 0),
+                'qualified_leads': counts.get('qualified_leads', 0),
+                'active_conversations': counts.get('active_conversations', 0),
+                'meetings_scheduled': counts.get('meetings_scheduled', 0)
             }
             
+            await redis_client.set(cache_key, stats, ttl=settings.daily_stats_cache_ttl)
+            return stats
+            
         except Exception as e:
             logger.error(f"Erro ao obter estatísticas: {str(e)}")
             return {
-                'date': datetime.now().date().isoformat(),
+                'date': today,
                 'total_leads': 0,
                 'qualified_leads': 0,
                 'active_conversations': 0,
@@ -411,9 +796,9 @@ class SupabaseClient:
     async def get_agent_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Busca sessão do agente"""
         try:
-            result = self.client.table('agent_sessions').select("*").eq(
+            result = await self.execute(self.client.table('agent_sessions').select("*").eq(
                 'session_id', session_id
-            ).execute()
+            ))
             
             if result.data:
                 return result.data[0]
@@ -425,25 +810,50 @@ class SupabaseClient:
             return None
     
     async def save_agent_session(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Salva sessão do agente"""
+        """
+        Salva sessão do agente
+        
+        Sem upsert da sessão em andamento a gravação começa na hora. Saves
+        que chegam durante um upsert esperam por ele e viram uma única
+        escrita seguinte (os campos mais recentes prevalecem); cada
+        chamador recebe a linha da escrita que incluiu seus campos.
+        """
+        session_id = session_data['session_id']
+        
+        state = self._pending_sessions.setdefault(session_id, {'data': None, 'task': None})
+        if state['data'] is None:
+            # Próxima escrita da sessão (começa após a que está em andamento)
+            state['data'] = {}
+            state['task'] = asyncio.create_task(
+                self._flush_agent_session(session_id, state['task'])
+            )
+        
+        state['data'].update(session_data)
+        return await asyncio.shield(state['task'])
+    
+    async def _flush_agent_session(
+        self,
+        session_id: str,
+        previous: Optional[asyncio.Task]
+    ) -> Dict[str, Any]:
+        """Grava a sessão coalescida com um único upsert"""
+        # Um upsert por sessão por vez: a ordem das escritas é preservada
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        
+        state = self._pending_sessions[session_id]
+        session_data, state['data'] = state['data'], None
+        
         try:
-            existing = await self.get_agent_session(session_data['session_id'])
+            now = datetime.now().isoformat()
+            session_data['updated_at'] = now
+            session_data['last_interaction'] = now
             
-            if existing:
-                # Atualiza sessão existente
-                session_data['updated_at'] = datetime.now().isoformat()
-                session_data['last_interaction'] = datetime.now().isoformat()
-                
-                result = self.client.table('agent_sessions').update(session_data).eq(
-                    'session_id', session_data['session_id']
-                ).execute()
-            else:
-                # Cria nova sessão
-                session_data['created_at'] = datetime.now().isoformat()
-                session_data['updated_at'] = datetime.now().isoformat()
-                session_data['last_interaction'] = datetime.now().isoformat()
-                
-                result = self.client.table('agent_sessions').insert(session_data).execute()
+            # Upsert nativo: created_at fica com o default na criação
+            result = await self.execute(self.client.table('agent_sessions').upsert(
+                session_data,
+                on_conflict='session_id'
+            ))
             
             if result.data:
                 return result.data[0]
@@ -453,31 +863,51 @@ class SupabaseClient:
         except Exception as e:
             logger.error(f"Erro ao salvar sessão: {str(e)}")
             raise
+        
+        finally:
+            # Nenhuma escrita seguinte agendada: libera a sessão
+            if state['task'] is asyncio.current_task():
+                del self._pending_sessions[session_id]
     
     async def cleanup_old_sessions(self, days: int = 30):
         """Limpa sessões antigas"""
         try:
             cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
             
-            result = self.client.table('agent_sessions').delete().lt(
-                'last_interaction', cutoff_date
-            ).execute()
-            
-            logger.info(f"Sessões antigas limpas: {len(result.data) if result.data else 0}")
+            # Remove página a página (um DELETE por página de ids)
+            deleted = 0
+            page: List[str] = []
+            async for session in self.iter_rows(
+                'agent_sessions',
+                filters=lambda query: query.lt('last_interaction', cutoff_date),
+                columns="id"
+            ):
+                page.append(session['id'])
+                if len(page) >= settings.supabase_page_size:
+                    await self.execute(self.client.table('agent_sessions').delete().in_('id', page))
+                    deleted += len(page)
+                    page = []
+            
+            if page:
+                await self.execute(self.client.table('agent_sessions').delete().in_('id', page))
+                deleted += len(page)
+            
+            logger.info(f"Sessões antigas limpas: {deleted}")
             
         except Exception as e:
             logger.error(f"Erro ao limpar sessões: {str(e)}")
     
     async def close(self):
         """Fecha conexão com Supabase"""
-        # Supabase client não precisa de close explícito
+        # Aguarda as queries em andamento e encerra o pool de threads
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
         logger.info("Cliente Supabase encerrado")
     
     async def test_connection(self) -> bool:
         """Testa a conexão com o Supabase"""
         try:
             # Faz uma query simples para testar
-            response = self.client.table("leads").select("id").limit(1).execute()
+            response = await self.execute(self.client.table("leads").select("id").limit(1))
             return True
         except Exception as e:
             logger.error(f"Erro ao testar conexão com Supabase: {e}")
@@ -486,7 +916,7 @@ class SupabaseClient:
     async def save_qualification(self, qualification_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Salva resultado de qualificação"""
         try:
-            response = self.client.table("leads_qualifications").insert(qualification_data).execute()
+            response = await self.execute(self.client.table("leads_qualifications").insert(qualification_data))
             
             if response.data:
                 return response.data[0]
@@ -499,12 +929,13 @@ class SupabaseClient:
     async def get_latest_qualification(self, lead_id: str) -> Optional[Dict[str, Any]]:
         """Obtém última qualificação do lead"""
         try:
-            response = self.client.table("leads_qualifications")\
-                .select("*")\
-                .eq("lead_id", lead_id)\
-                .order("created_at", desc=True)\
-                .limit(1)\
-                .execute()
+            response = await self.execute(
+                self.client.table("leads_qualifications")
+                .select("*")
+                .eq("lead_id", lead_id)
+                .order("created_at", desc=True)
+                .limit(1)
+            )
             
             if response.data:
                 return response.data[0]
@@ -517,7 +948,7 @@ class SupabaseClient:
     async def get_lead_by_id(self, lead_id: str) -> Optional[Dict[str, Any]]:
         """Busca lead por ID"""
         try:
-            response = self.client.table("leads").select("*").eq("id", lead_id).execute()
+            response = await self.execute(self.client.table("leads").select("*").eq("id", lead_id))
             
             if response.data:
                 return response.data[0]
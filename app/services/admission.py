@@ -0,0 +1,139 @@
+"""
+Admission Control - Backpressure do webhook de mensagens
+Limita trabalho em andamento e degrada o atendimento sob carga
+"""
+
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.integrations.redis_client import redis_client
+from app.integrations.evolution import evolution_client
+from app.services.message_queue import inbound_queue
+
+# Níveis de pressão
+NORMAL = "normal"
+ELEVATED = "elevated"
+CRITICAL = "critical"
+
+
+class AdmissionController:
+    """
+    Controle de admissão na frente de process_new_message
+
+    A pressão é medida por três sinais: processamentos em andamento neste
+    processo, profundidade da fila durável e tempo de espera do job mais
+    antigo ainda pendente. Acima dos limites "soft" o lead recebe uma confirmação rápida
+    (uma vez por cooldown) e a mensagem segue para a fila; acima dos limites
+    "hard" o webhook responde 429 e a Evolution API reenvia mais tarde.
+    """
+
+    def __init__(self):
+        """Inicializa o controlador com as configurações do .env"""
+        self.max_in_flight = settings.admission_max_in_flight
+        self.queue_soft_limit = settings.admission_queue_soft_limit
+        self.queue_hard_limit = settings.admission_queue_hard_limit
+        self.age_soft_limit = settings.admission_age_soft_limit
+        self.age_hard_limit = settings.admission_age_hard_limit
+        self.sample_interval = settings.admission_sample_interval
+
+        self.in_flight = 0
+        self._queue_depth = 0
+        self._queue_age = 0.0
+        self._sampled_at = 0.0
+
+    @asynccontextmanager
+    async def track(self):
+        """Contabiliza um processamento em andamento"""
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def _sample_queue(self) -> Tuple[int, float]:
+        """Profundidade e idade da fila, amostradas no máximo uma vez por intervalo"""
+        if not settings.inbound_queue_enabled:
+            return 0, 0.0
+
+        now = time.monotonic()
+        if now - self._sampled_at >= self.sample_interval:
+            self._sampled_at = now
+            try:
+                self._queue_depth = await inbound_queue.pending_size()
+                self._queue_age = await inbound_queue.oldest_pending_age() if self._queue_depth else 0.0
+            except Exception as e:
+                logger.error(f"Erro ao medir a fila: {e}")
+
+        return self._queue_depth, self._queue_age
+
+    async def pressure(self) -> str:
+        """
+        Calcula o nível de pressão atual
+
+        Returns:
+            NORMAL, ELEVATED ou CRITICAL
+        """
+        depth, queue_age = await self._sample_queue()
+
+        if (
+            self.in_flight >= self.max_in_flight
+            or depth >= self.queue_hard_limit
+            or queue_age >= self.age_hard_limit
+        ):
+            return CRITICAL
+
+        if depth >= self.queue_soft_limit or queue_age >= self.age_soft_limit:
+            return ELEVATED
+
+        return NORMAL
+
+    async def send_quick_ack(self, phone: str):
+        """
+        Envia confirmação rápida ao lead (no máximo uma por cooldown)
+
+        Args:
+            phone: Número do telefone
+        """
+        try:
+            if not await redis_client.acquire_lock(
+                f"admission:ack:{phone}",
+                ttl=settings.admission_ack_cooldown
+            ):
+                return
+
+            await evolution_client.send_text_message(
+                phone,
+                settings.admission_ack_message,
+                delay=0,
+                simulate_typing=False
+            )
+            await redis_client.increment_counter("admission_acks")
+
+        except Exception as e:
+            logger.error(f"Erro ao enviar confirmação rápida para {phone}: {e}")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Retorna pressão atual e limites configurados"""
+        depth, queue_age = await self._sample_queue()
+        return {
+            "enabled": settings.admission_control_enabled,
+            "pressure": await self.pressure(),
+            "in_flight": self.in_flight,
+            "queue_depth": depth,
+            "queue_age": round(queue_age, 2),
+            "thresholds": {
+                "max_in_flight": self.max_in_flight,
+                "queue_soft_limit": self.queue_soft_limit,
+                "queue_hard_limit": self.queue_hard_limit,
+                "age_soft_limit": self.age_soft_limit,
+                "age_hard_limit": self.age_hard_limit
+            }
+        }
+
+
+# Singleton global
+admission_controller = AdmissionController()
@@ -0,0 +1,263 @@
+"""
+Analytics Sink - Eventos de analytics gravados em lote
+log_event O(1) em memória; flush em inserts em massa com spill para disco
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from loguru import logger
+from app.utils.logger import emoji_logger
+
+from app.config import settings
+
+EventWriter = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+
+def is_data_error(error: Exception) -> bool:
+    """
+    Indica se o erro vem dos dados do lote (não adianta repetir)
+
+    SQLSTATE classe 22 (dado inválido) ou 23 (constraint violada), vindo
+    do PostgREST (code) ou do asyncpg (sqlstate). Timeouts e falhas de
+    conexão são transitórios.
+    """
+    code = getattr(error, "code", None) or getattr(error, "sqlstate", None)
+    return isinstance(code, str) and code[:2] in ("22", "23")
+
+
+class AnalyticsSink:
+    """
+    Buffer circular de eventos de analytics
+
+    log_event() apenas anexa o evento ao deque (O(1)); quando o buffer
+    está cheio o evento mais antigo é descartado. O loop de flush grava
+    lotes na tabela analytics com timeout: se o banco estiver lento ou
+    fora, o lote vai para um arquivo JSONL local e é reenviado quando
+    um flush voltar a ter sucesso.
+
+    Cada evento recebe um id no cliente e o writer faz upsert por id,
+    então reenviar um lote que já foi gravado (ex.: timeout com a
+    escrita concluída depois) não duplica eventos. Lotes rejeitados por
+    erro de dados são divididos ao meio até isolar as linhas inválidas,
+    que são descartadas.
+    """
+
+    def __init__(self):
+        """Inicializa o sink com as configurações do .env"""
+        self.batch_size = settings.analytics_batch_size
+        self.flush_interval = settings.analytics_flush_interval
+        self.flush_timeout = settings.analytics_flush_timeout
+        self.spill_path = settings.analytics_spill_path
+
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=settings.analytics_buffer_size)
+        self._writer: Optional[EventWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self.running = False
+
+        # Métricas
+        self.flushed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.rejected = 0
+        self.last_flush_latency = 0.0
+
+    def log_event(self, event_data: Dict[str, Any]):
+        """
+        Registra evento sem aguardar o banco
+
+        Args:
+            event_data: Linha da tabela analytics (event_type obrigatório)
+        """
+        now = datetime.now().isoformat()
+        event_data.setdefault('id', str(uuid.uuid4()))
+        event_data.setdefault('timestamp', now)
+        event_data.setdefault('created_at', now)
+
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event_data)
+
+    async def start(self, writer: EventWriter):
+        """
+        Inicia o loop de flush
+
+        Args:
+            writer: Corrotina que grava um lote de eventos no banco
+        """
+        if self.running:
+            logger.warning("Sink de analytics já está rodando")
+            return
+
+        self.running = True
+        self._writer = writer
+        self._task = asyncio.create_task(self._flush_loop())
+        emoji_logger.system_ready("Sink de analytics", flush_interval=self.flush_interval)
+
+    async def stop(self):
+        """Para o loop gravando (ou enviando para disco) os eventos pendentes"""
+        if not self.running:
+            return
+
+        self.running = False
+
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        while self._events:
+            if not await self.flush():
+                break
+
+        # Sem banco no shutdown: preserva o restante em disco
+        if self._events:
+            await self._spill(list(self._events))
+            self._events.clear()
+
+    async def flush(self) -> bool:
+        """
+        Grava um lote de eventos
+
+        Returns:
+            True se o lote foi gravado no banco
+        """
+        if not self._events:
+            return True
+
+        batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+
+        started = time.perf_counter()
+        try:
+            return await self._write(batch)
+        finally:
+            self.last_flush_latency = time.perf_counter() - started
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        """
+        Grava o lote; em erro de dados divide ao meio até isolar as linhas inválidas
+
+        Returns:
+            False se o banco falhou e o lote (ou parte dele) foi para o disco
+        """
+        try:
+            await asyncio.wait_for(self._writer(batch), timeout=self.flush_timeout)
+            self.flushed += len(batch)
+            return True
+
+        except Exception as e:
+            if not is_data_error(e):
+                logger.warning(f"Flush de analytics falhou ({len(batch)} eventos vão para disco): {e!r}")
+                await self._spill(batch)
+                return False
+
+            if len(batch) == 1:
+                self.rejected += 1
+                logger.error(
+                    f"Evento de analytics descartado "
+                    f"({batch[0].get('event_type')}, id={batch[0].get('id')}): {e!r}"
+                )
+                return True
+
+        middle = len(batch) // 2
+        if not await self._write(batch[:middle]):
+            await self._spill(batch[middle:])
+            return False
+        return await self._write(batch[middle:])
+
+    async def _spill(self, batch: List[Dict[str, Any]]):
+        """Anexa o lote ao arquivo de spill"""
+        try:
+            await asyncio.to_thread(self._append_lines, batch)
+            self.spilled += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"Erro ao gravar spill de analytics: {e}")
+
+    def _append_lines(self, batch: List[Dict[str, Any]]):
+        """Escrita bloqueante do spill (executada em thread)"""
+        directory = os.path.dirname(self.spill_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+            for event in batch:
+                spill_file.write(json.dumps(event, default=str) + "\n")
+
+    def _take_spill(self) -> List[Dict[str, Any]]:
+        """Lê e remove o arquivo de spill (executada em thread)"""
+        if not os.path.exists(self.spill_path):
+            return []
+
+        replay_path = f"{self.spill_path}.replay"
+        os.replace(self.spill_path, replay_path)
+
+        with open(replay_path, encoding="utf-8") as replay_file:
+            events = [json.loads(line) for line in replay_file if line.strip()]
+
+        os.remove(replay_path)
+        return events
+
+    async def _replay_spill(self):
+        """Devolve ao buffer os eventos enviados para disco"""
+        try:
+            events = await asyncio.to_thread(self._take_spill)
+        except Exception as e:
+            logger.error(f"Erro ao ler spill de analytics: {e}")
+            return
+
+        if events:
+            # Eventos gravados antes dos ids no cliente
+            for event in events:
+                event.setdefault('id', str(uuid.uuid4()))
+
+            # Cabe no espaço livre do buffer; o excedente volta para o disco
+            free = self._events.maxlen - len(self._events)
+            self._events.extend(events[:free])
+            if events[free:]:
+                await asyncio.to_thread(self._append_lines, events[free:])
+            logger.info(f"{len(events[:free])} eventos de analytics reenviados do disco")
+
+    async def _flush_loop(self):
+        """Loop de flush periódico"""
+        await self._replay_spill()
+
+        while self.running:
+            try:
+                await asyncio.sleep(self.flush_interval)
+
+                flushed_ok = True
+                while self._events and flushed_ok:
+                    flushed_ok = await self.flush()
+
+                # Banco respondendo: tenta reenviar o que ficou em disco
+                if flushed_ok and os.path.exists(self.spill_path):
+                    await self._replay_spill()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no flush de analytics: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna profundidade do buffer e latência de flush"""
+        return {
+            "running": self.running,
+            "buffer_depth": len(self._events),
+            "buffer_capacity": self._events.maxlen,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "rejected": self.rejected,
+            "last_flush_latency_ms": round(self.last_flush_latency * 1000, 1)
+        }
+
+
+# Singleton global
+analytics_sink = AnalyticsSink()
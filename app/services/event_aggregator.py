@@ -0,0 +1,176 @@
+"""
+Event Aggregator - Escrita em lote de presença e confirmações de leitura
+Acumula eventos em memória e grava no Redis em um único pipeline
+"""
+
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+from app.utils.logger import emoji_logger
+
+from app.config import settings
+from app.integrations.redis_client import redis_client
+
+
+class EventAggregator:
+    """
+    Agregador write-behind de PRESENCE_UPDATE e MESSAGES_UPDATE
+
+    O webhook apenas registra o evento em memória. A cada intervalo
+    (ou quando o buffer enche) as presenças, deduplicadas por telefone,
+    e as leituras, somadas por telefone, são gravadas em um pipeline.
+    Rajadas de milhares de confirmações de leitura de um follow-up em
+    massa viram poucas dezenas de comandos INCRBY.
+    """
+
+    def __init__(self):
+        """Inicializa o agregador com as configurações do .env"""
+        self.flush_interval = settings.event_aggregator_flush_interval
+        self.max_pending = settings.event_aggregator_max_pending
+        self.presence_ttl = 300  # 5 minutos
+
+        self._presences: Dict[str, Tuple[Dict[str, Any], int]] = {}
+        self._reads: Counter = Counter()
+        self._events = 0
+        self._full = asyncio.Event()
+
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self.flushed_batches = 0
+        self.dropped_keys = 0
+
+    def record_presence(self, phone: str, last_seen: Any):
+        """
+        Registra última visualização do telefone (a mais recente prevalece)
+
+        Args:
+            phone: Número do telefone
+            last_seen: Valor lastSeen do evento
+        """
+        self._presences[f"presence:{phone}"] = (
+            {
+                "last_seen": last_seen,
+                "timestamp": datetime.now().isoformat()
+            },
+            self.presence_ttl
+        )
+        self._mark_event()
+
+    def record_read(self, phone: str):
+        """
+        Registra confirmação de leitura de uma mensagem
+
+        Args:
+            phone: Número do telefone
+        """
+        self._reads[f"messages_read:{phone}"] += 1
+        self._mark_event()
+
+    def _mark_event(self):
+        """Contabiliza evento e antecipa o flush com o buffer cheio"""
+        self._events += 1
+        if self._events >= self.max_pending:
+            self._full.set()
+
+    async def flush(self):
+        """Grava os eventos acumulados em um único pipeline"""
+        if not self._presences and not self._reads:
+            return
+
+        presences, self._presences = self._presences, {}
+        reads, self._reads = self._reads, Counter()
+        events, self._events = self._events, 0
+        self._full.clear()
+
+        if await redis_client.write_batch(presences, dict(reads)):
+            self.flushed_batches += 1
+            logger.debug(f"Lote de eventos gravado: {events} eventos, {len(presences) + len(reads)} chaves")
+            return
+
+        self._restore(presences, reads)
+
+    def _restore(self, presences: Dict[str, Tuple[Dict[str, Any], int]], reads: Counter):
+        """
+        Devolve aos mapas pendentes um lote que não foi gravado
+
+        Presenças registradas depois da troca prevalecem; leituras são
+        somadas. Chaves novas só entram até max_pending chaves pendentes,
+        para o buffer não crescer sem limite com o Redis fora do ar.
+        """
+        dropped = 0
+
+        for key, value in presences.items():
+            if key in self._presences:
+                continue
+            if len(self._presences) + len(self._reads) >= self.max_pending:
+                dropped += 1
+                continue
+            self._presences[key] = value
+
+        for key, amount in reads.items():
+            if key not in self._reads and len(self._presences) + len(self._reads) >= self.max_pending:
+                dropped += 1
+                continue
+            self._reads[key] += amount
+
+        if dropped:
+            self.dropped_keys += dropped
+            logger.warning(f"Agregador de eventos cheio: {dropped} chaves descartadas")
+
+    async def start(self):
+        """Inicia o loop de flush"""
+        if self.running:
+            logger.warning("Agregador de eventos já está rodando")
+            return
+
+        self.running = True
+        self._task = asyncio.create_task(self._flush_loop())
+        emoji_logger.system_ready("Agregador de eventos", flush_interval=self.flush_interval)
+
+    async def stop(self):
+        """Para o loop gravando os eventos pendentes"""
+        if not self.running:
+            return
+
+        self.running = False
+
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        await self.flush()
+
+    async def _flush_loop(self):
+        """Loop de flush periódico"""
+        while self.running:
+            try:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                await self.flush()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no flush do agregador de eventos: {e}")
+                await asyncio.sleep(1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do agregador"""
+        return {
+            "running": self.running,
+            "pending_events": self._events,
+            "pending_keys": len(self._presences) + len(self._reads),
+            "flushed_batches": self.flushed_batches,
+            "dropped_keys": self.dropped_keys
+        }
+
+
+# Singleton global
+event_aggregator = EventAggregator()
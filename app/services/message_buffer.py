@@ -0,0 +1,308 @@
+"""
+Message Buffer - Persistência write-behind de mensagens
+Acumula mensagens de todas as conversas e grava em inserts multi-linha
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from loguru import logger
+from app.utils.logger import emoji_logger
+
+from app.config import settings
+from app.services.analytics_sink import is_data_error
+
+MessageWriter = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+
+class MessageBuffer:
+    """
+    Buffer de mensagens com flush por tamanho, tempo e no shutdown
+
+    save_message/save_messages do SupabaseClient apenas adicionam as
+    linhas aqui (com id e created_at gerados no cliente) e retornam na
+    hora. Um loop grava o lote de todas as conversas em um único insert.
+    Linhas ainda não gravadas continuam visíveis em pending_for(), para
+    que leituras como as últimas 100 mensagens enxerguem o que acabou
+    de ser salvo.
+
+    Um lote rejeitado por erro de dados (SQLSTATE 22/23) max_attempts
+    vezes é dividido ao meio até isolar as linhas inválidas; só essas
+    são descartadas. Em falhas de conexão ou timeout as linhas ficam no
+    buffer e o flush é repetido com backoff exponencial.
+    """
+
+    def __init__(self):
+        """Inicializa o buffer com as configurações do .env"""
+        self.max_size = settings.message_buffer_max_size
+        self.flush_interval = settings.message_buffer_flush_interval
+        self.max_attempts = settings.message_buffer_max_attempts
+        self.max_backoff = settings.message_buffer_max_backoff
+
+        self._rows: List[Dict[str, Any]] = []
+        self._by_conversation: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._attempts = 0
+        self._retry_at = 0.0
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        self.running = False
+        self._writer: Optional[MessageWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+
+    def add(self, messages_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Adiciona mensagens ao buffer
+
+        Args:
+            messages_data: Linhas da tabela messages
+
+        Returns:
+            Linhas com id e created_at, como seriam retornadas pelo insert
+        """
+        rows = []
+        for message_data in messages_data:
+            row = {
+                "id": str(uuid4()),
+                "created_at": datetime.now().isoformat(),
+                **message_data
+            }
+            rows.append(row)
+            self._rows.append(row)
+
+            if row.get("conversation_id"):
+                self._by_conversation[row["conversation_id"]].append(row)
+
+        if len(self._rows) >= self.max_size:
+            self._full.set()
+
+        return rows
+
+    def pending_whatsapp_ids(self, whatsapp_ids: List[str]) -> List[str]:
+        """
+        Retorna os ids do WhatsApp que já estão no buffer aguardando gravação
+
+        Args:
+            whatsapp_ids: IDs de mensagem do WhatsApp (key.id)
+
+        Returns:
+            IDs presentes em linhas pendentes
+        """
+        wanted = set(whatsapp_ids)
+        return [
+            row["whatsapp_message_id"]
+            for row in self._rows
+            if row.get("whatsapp_message_id") in wanted
+        ]
+
+    def pending_for(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """
+        Retorna mensagens da conversa ainda não gravadas (read-your-writes)
+
+        Args:
+            conversation_id: ID da conversa
+
+        Returns:
+            Linhas pendentes em ordem de inserção
+        """
+        return list(self._by_conversation.get(conversation_id, ()))
+
+    async def flush(self, force: bool = False) -> bool:
+        """
+        Grava as mensagens pendentes em um único insert
+
+        Args:
+            force: Ignora o backoff (usado no shutdown)
+
+        Returns:
+            False se o banco falhou e as linhas continuam no buffer
+        """
+        async with self._flush_lock:
+            if not self._rows:
+                return True
+
+            if not force and time.monotonic() < self._retry_at:
+                return False
+
+            batch = self._rows[:self.max_size]
+            self._full.clear()
+
+            try:
+                await self._writer(batch)
+                self._attempts = 0
+                self._retry_at = 0.0
+                self.flushed_rows += len(batch)
+                kept: List[Dict[str, Any]] = []
+
+            except Exception as e:
+                self._attempts += 1
+
+                if not is_data_error(e):
+                    # Banco indisponível: nada é descartado, tenta de novo mais tarde
+                    backoff = min(self.flush_interval * 2 ** self._attempts, self.max_backoff)
+                    self._retry_at = time.monotonic() + backoff
+                    logger.warning(
+                        f"Erro ao gravar {len(batch)} mensagens (tentativa {self._attempts}, "
+                        f"nova tentativa em {backoff:.1f}s): {e}"
+                    )
+                    return False
+
+                if self._attempts < self.max_attempts:
+                    logger.warning(f"Erro ao gravar {len(batch)} mensagens (tentativa {self._attempts}): {e}")
+                    return False
+
+                logger.warning(
+                    f"Lote de {len(batch)} mensagens rejeitado {self._attempts} vezes, "
+                    f"isolando linhas inválidas: {e}"
+                )
+                self._attempts = 0
+                kept = await self._write_isolating(batch, e)
+
+            kept_ids = {id(row) for row in kept}
+            self._remove([row for row in batch if id(row) not in kept_ids])
+
+            # Ainda há um lote cheio: o loop grava em seguida
+            if len(self._rows) >= self.max_size:
+                self._full.set()
+
+            return not kept
+
+    async def _write_isolating(
+        self,
+        batch: List[Dict[str, Any]],
+        error: Exception
+    ) -> List[Dict[str, Any]]:
+        """
+        Divide um lote rejeitado até restarem apenas as linhas inválidas
+
+        Args:
+            batch: Linhas cujo insert falhou por erro de dados
+            error: Erro do insert
+
+        Returns:
+            Linhas que continuam no buffer (falha de conexão durante a divisão)
+        """
+        if len(batch) == 1:
+            row = batch[0]
+            self.dropped_rows += 1
+            emoji_logger.supabase_error(
+                f"Mensagem {row.get('id')} da conversa {row.get('conversation_id')} descartada: {error}",
+                table="messages"
+            )
+            return []
+
+        kept: List[Dict[str, Any]] = []
+        middle = len(batch) // 2
+        for half in (batch[:middle], batch[middle:]):
+            if kept:
+                kept.extend(half)
+                continue
+            try:
+                await self._writer(half)
+                self.flushed_rows += len(half)
+            except Exception as e:
+                if is_data_error(e):
+                    kept.extend(await self._write_isolating(half, e))
+                else:
+                    kept.extend(half)
+
+        return kept
+
+    def _remove(self, batch: List[Dict[str, Any]]):
+        """Remove do buffer as linhas gravadas (ou descartadas)"""
+        done = {id(row) for row in batch}
+        self._rows = [row for row in self._rows if id(row) not in done]
+
+        for row in batch:
+            conversation_id = row.get("conversation_id")
+            if not conversation_id or conversation_id not in self._by_conversation:
+                continue
+
+            remaining = [pending for pending in self._by_conversation[conversation_id] if id(pending) not in done]
+            if remaining:
+                self._by_conversation[conversation_id] = remaining
+            else:
+                del self._by_conversation[conversation_id]
+
+    async def start(self, writer: MessageWriter):
+        """
+        Inicia o loop de flush
+
+        Args:
+            writer: Corrotina que grava um lote de mensagens no banco
+        """
+        if self.running:
+            logger.warning("Buffer de mensagens já está rodando")
+            return
+
+        self.running = True
+        self._writer = writer
+        self._task = asyncio.create_task(self._flush_loop())
+        emoji_logger.system_ready("Buffer de mensagens", flush_interval=self.flush_interval)
+
+    async def stop(self):
+        """Para o loop gravando as mensagens pendentes"""
+        if not self.running:
+            return
+
+        self.running = False
+
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        # Esvazia o buffer enquanto o banco responder
+        for _ in range(self.max_attempts):
+            while self._rows and await self.flush(force=True):
+                pass
+            if not self._rows:
+                return
+            await asyncio.sleep(min(self.flush_interval * 2 ** self._attempts, self.max_backoff))
+
+        # Sem banco no shutdown: as mensagens não gravadas são perdidas
+        self.dropped_rows += len(self._rows)
+        for row in self._rows:
+            emoji_logger.supabase_error(
+                f"Mensagem {row.get('id')} da conversa {row.get('conversation_id')} não gravada no shutdown",
+                table="messages"
+            )
+        self._rows = []
+        self._by_conversation.clear()
+
+    async def _flush_loop(self):
+        """Loop de flush por tempo ou tamanho"""
+        while self.running:
+            try:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                await self.flush()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no flush do buffer de mensagens: {e}")
+                await asyncio.sleep(1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do buffer"""
+        return {
+            "running": self.running,
+            "pending": len(self._rows),
+            "conversations": len(self._by_conversation),
+            "flushed_rows": self.flushed_rows,
+            "dropped_rows": self.dropped_rows
+        }
+
+
+# Singleton global
+message_buffer = MessageBuffer()
@@ -0,0 +1,157 @@
+"""
+Message Coalescer - Agrupamento de mensagens fragmentadas por lead
+Aguarda o lead parar de digitar antes de acionar o agente uma única vez
+"""
+
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.utils.logger import emoji_logger
+from app.config import settings
+from app.integrations.redis_client import redis_client
+from app.services.message_queue import parked
+
+
+@dataclass
+class _PendingBatch:
+    """Fragmentos pendentes de um telefone"""
+    fragments: List[str] = field(default_factory=list)
+    first_at: float = field(default_factory=time.monotonic)
+    last_activity_at: float = field(default_factory=time.monotonic)
+    generation: int = 0
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class MessageCoalescer:
+    """
+    Debounce de mensagens por telefone
+
+    Cada fragmento chama submit(). Apenas o chamador do fragmento mais
+    recente fica aguardando; os anteriores retornam None imediatamente,
+    liberando o worker. Quando o lead fica em silêncio pela janela
+    configurada (ou o tempo máximo é atingido), o último chamador recebe
+    o texto combinado e aciona o agente.
+
+    Eventos "composing" do PRESENCE_UPDATE estendem a janela, sempre
+    limitada por max_wait a partir do primeiro fragmento. O webhook de
+    presença pode chegar a outro worker: além de acordar o lote local,
+    notify_typing() grava typing:{phone} no Redis, e o lote consulta
+    essa chave antes de fechar.
+    """
+
+    def __init__(self):
+        """Inicializa o coalescer com as configurações do .env"""
+        self.window = settings.message_coalescing_window
+        self.max_wait = settings.message_coalescing_max_wait
+        self.separator = "\n"
+        self._pending: Dict[str, _PendingBatch] = {}
+
+    async def submit(self, phone: str, fragment: str) -> Optional[str]:
+        """
+        Adiciona fragmento ao lote do telefone e aguarda o fechamento
+
+        Args:
+            phone: Número do telefone
+            fragment: Conteúdo da mensagem recebida
+
+        Returns:
+            Texto combinado se este chamador deve acionar o agente,
+            None se o fragmento foi absorvido por uma mensagem posterior
+        """
+        batch = self._pending.get(phone)
+        if batch is None:
+            batch = _PendingBatch()
+            self._pending[phone] = batch
+        else:
+            # Acorda o chamador anterior para que ele desista
+            batch.wakeup.set()
+            batch.wakeup = asyncio.Event()
+
+        batch.fragments.append(fragment)
+        batch.last_activity_at = time.monotonic()
+        batch.generation += 1
+        my_generation = batch.generation
+
+        # Estacionado: a lane pode entregar os próximos fragmentos do lead
+        with parked():
+            while True:
+                now = time.monotonic()
+                deadline = min(batch.last_activity_at + self.window, batch.first_at + self.max_wait)
+                remaining = deadline - now
+
+                if remaining <= 0:
+                    # Teto de max_wait atingido: agrupa sem consultar o Redis
+                    if now >= batch.first_at + self.max_wait:
+                        break
+                    # Lead digitando em evento recebido por outro worker
+                    if await self._extend_from_shared_typing(phone, batch):
+                        continue
+                    break
+
+                wakeup = batch.wakeup
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    continue
+
+                if batch.generation != my_generation:
+                    return None
+                # Acordado por presença "composing": recalcula o prazo
+
+        del self._pending[phone]
+
+        if len(batch.fragments) > 1:
+            emoji_logger.webhook_process(
+                f"{len(batch.fragments)} mensagens agrupadas de {phone}",
+                processing_time=time.monotonic() - batch.first_at
+            )
+
+        return self.separator.join(batch.fragments)
+
+    async def _extend_from_shared_typing(self, phone: str, batch: _PendingBatch) -> bool:
+        """
+        Estende a janela com o último "composing" registrado no Redis
+
+        Returns:
+            True se a atividade compartilhada é mais recente que a local
+        """
+        typing_at = await redis_client.get(f"typing:{phone}")
+        if not isinstance(typing_at, (int, float)):
+            return False
+
+        # Converte o horário de parede para o relógio monotônico do lote
+        activity_at = time.monotonic() - max(0.0, time.time() - typing_at)
+        if activity_at <= batch.last_activity_at:
+            return False
+
+        batch.last_activity_at = activity_at
+        return True
+
+    async def notify_typing(self, phone: str):
+        """
+        Estende a janela de um lote pendente quando o lead está digitando
+
+        Args:
+            phone: Número do telefone
+        """
+        # Visível para o worker que tiver o lote do telefone
+        await redis_client.set(f"typing:{phone}", time.time(), ttl=math.ceil(self.window) + 1)
+
+        batch = self._pending.get(phone)
+        if batch is None:
+            return
+
+        batch.last_activity_at = time.monotonic()
+        batch.wakeup.set()
+        batch.wakeup = asyncio.Event()
+
+    def pending_count(self) -> int:
+        """Retorna número de telefones com lote pendente"""
+        return len(self._pending)
+
+
+# Singleton global
+message_coalescer = MessageCoalescer()
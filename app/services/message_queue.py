@@ -0,0 +1,516 @@
+"""
+Message Queue Service - Fila durável de mensagens recebidas
+Webhook apenas enfileira; pool de workers drena a fila com concorrência controlada
+"""
+
+import asyncio
+import os
+import random
+import socket
+import uuid
+import weakref
+import time
+import zlib
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+from app.utils.logger import emoji_logger
+
+from app.config import settings
+from app.integrations.redis_client import redis_client
+
+MessageHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class _JobSlot:
+    """Estado de um job em execução dentro de uma lane"""
+
+    def __init__(self):
+        self.parked = asyncio.Event()
+
+
+# Job em execução na task atual (definido pelo worker da lane)
+_current_job: ContextVar[Optional[_JobSlot]] = ContextVar("inbound_job", default=None)
+
+# Locks de turno por telefone (removidos automaticamente quando ociosos)
+_turn_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+@contextmanager
+def parked():
+    """
+    Marca o job atual como estacionado enquanto apenas aguarda
+
+    Enquanto estacionado, o worker da lane pode iniciar o próximo job
+    (ex.: o coalescer esperando novos fragmentos do mesmo lead).
+    """
+    slot = _current_job.get()
+    if slot is not None:
+        slot.parked.set()
+    try:
+        yield
+    finally:
+        if slot is not None:
+            slot.parked.clear()
+
+
+@asynccontextmanager
+async def conversation_turn(phone: str):
+    """
+    Serializa o turno do agente (análise, resposta e persistência) por telefone
+
+    Args:
+        phone: Número do telefone
+    """
+    lock = _turn_locks.get(phone)
+    if lock is None:
+        lock = asyncio.Lock()
+        _turn_locks[phone] = lock
+
+    async with lock:
+        yield
+
+
+def extract_phone(data: Dict[str, Any]) -> str:
+    """
+    Extrai o telefone do payload de MESSAGES_UPSERT
+
+    Args:
+        data: Campo "data" do webhook
+
+    Returns:
+        Número do telefone (ou JID) da primeira mensagem
+    """
+    messages = data.get("messages") or [{}]
+    remote_jid = messages[0].get("key", {}).get("remoteJid", "")
+    return remote_jid.split("@")[0] if "@" in remote_jid else remote_jid
+
+
+def available_since(item: Dict[str, Any]) -> Optional[float]:
+    """
+    Momento em que o job ficou disponível na fila (tentativa atual)
+
+    Jobs devolvidos por nack/reaper têm available_at; os demais usam o
+    timestamp do enqueue.
+    """
+    try:
+        return datetime.fromisoformat(item.get("available_at") or item["timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _message_timestamp(message: Dict[str, Any]) -> int:
+    try:
+        return int(message.get("messageTimestamp") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def group_messages_by_phone(messages: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Agrupa mensagens de um MESSAGES_UPSERT por remetente
+
+    Args:
+        messages: Lista de mensagens do webhook
+
+    Returns:
+        Mapa remoteJid -> mensagens em ordem cronológica
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+
+    # Ordenação estável: mensagens sem timestamp mantêm a ordem do lote
+    ordered = sorted(messages, key=_message_timestamp)
+
+    for message in ordered:
+        remote_jid = message.get("key", {}).get("remoteJid", "")
+        groups.setdefault(remote_jid, []).append(message)
+
+    return groups
+
+
+def split_by_phone(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Divide o payload de MESSAGES_UPSERT em um payload por telefone
+
+    Args:
+        data: Campo "data" do webhook
+
+    Returns:
+        Lista de payloads, cada um com as mensagens de um único telefone
+    """
+    groups = group_messages_by_phone(data.get("messages", []))
+    return [{**data, "messages": messages} for messages in groups.values()]
+
+
+class InboundMessageQueue:
+    """
+    Fila de entrada particionada em lanes por telefone
+
+    - Cada telefone é mapeado de forma estável (crc32) para uma lane,
+      igual em todos os workers/hosts
+    - Cada lane tem no máximo um consumidor por vez (lock distribuído),
+      então as mensagens de um lead são processadas em ordem
+    - Lanes diferentes rodam em paralelo: o número de lanes limita a
+      concorrência global e o número de workers a concorrência por processo
+    - Entrega at-least-once: ack ao concluir, reentrega de jobs travados
+      pelo reaper e dead-letter após falhas repetidas
+    """
+
+    def __init__(self):
+        """Inicializa a fila com as configurações do .env"""
+        self.queue_name = settings.inbound_queue_name
+        self.workers_count = settings.inbound_queue_workers
+        self.lanes_count = settings.inbound_queue_lanes
+        self.visibility_timeout = settings.inbound_queue_visibility_timeout
+        self.max_attempts = settings.inbound_queue_max_attempts
+        self.reaper_interval = settings.inbound_queue_reaper_interval
+        self.idle_interval = settings.inbound_queue_idle_interval
+
+        # Renova lease do job e lock da lane bem antes do visibility timeout
+        self.heartbeat_interval = max(1.0, self.visibility_timeout / 3)
+
+        # Identifica este processo como dono das lanes que consumir
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.running = False
+        self._handler: Optional[MessageHandler] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Set[asyncio.Task] = set()
+        self._in_flight = 0
+        self._active_lanes: Set[int] = set()
+
+        # Tempo de espera na fila do último job iniciado (sinal de pressão)
+        self.last_queue_delay = 0.0
+
+    def lane_for(self, phone: str) -> int:
+        """
+        Retorna a lane do telefone (estável entre processos)
+
+        Args:
+            phone: Número do telefone
+
+        Returns:
+            Índice da lane
+        """
+        return zlib.crc32(phone.encode("utf-8")) % self.lanes_count
+
+    def _lane_queue(self, lane: int) -> str:
+        return f"{self.queue_name}:lane:{lane}"
+
+    def _lane_lock(self, lane: int) -> str:
+        return f"lane:{self.queue_name}:{lane}"
+
+    @property
+    def _ready_key(self) -> str:
+        return f"queue:ready:{self.queue_name}"
+
+    async def publish(self, data: Dict[str, Any], priority: int = 0) -> bool:
+        """
+        Enfileira payload de MESSAGES_UPSERT na lane do telefone
+
+        Args:
+            data: Campo "data" do webhook
+            priority: Prioridade (0 = normal, 1 = alta)
+
+        Returns:
+            True se enfileirado com sucesso
+        """
+        lane = self.lane_for(extract_phone(data))
+
+        if not await redis_client.enqueue(self._lane_queue(lane), data, priority):
+            return False
+
+        await redis_client.add_to_set(self._ready_key, lane)
+        return True
+
+    async def start(self, handler: MessageHandler):
+        """
+        Inicia o pool de workers e o reaper de jobs travados
+
+        Args:
+            handler: Corrotina que processa o payload de um job
+        """
+        if self.running:
+            logger.warning("Fila de mensagens já está rodando")
+            return
+
+        self.running = True
+        self._handler = handler
+
+        # Recupera jobs que ficaram em processamento no último deploy
+        await self._recover_lanes()
+
+        for worker_id in range(self.workers_count):
+            self._tasks.append(asyncio.create_task(self._worker_loop(worker_id)))
+        self._tasks.append(asyncio.create_task(self._reaper_loop()))
+
+        emoji_logger.system_ready(
+            "Fila de mensagens",
+            workers=self.workers_count,
+            lanes=self.lanes_count,
+            queue=self.queue_name
+        )
+
+    async def stop(self, grace_period: float = 10.0):
+        """
+        Para os workers aguardando os jobs em andamento
+
+        Jobs não concluídos dentro do grace period são cancelados antes
+        de a lane ser liberada; continuam sem ack e serão reentregues
+        quando a lease expirar.
+
+        Args:
+            grace_period: Segundos de espera pelos jobs em andamento
+        """
+        if not self.running:
+            return
+
+        self.running = False
+
+        _, pending = await asyncio.wait(self._tasks, timeout=grace_period)
+        for task in pending:
+            task.cancel()
+
+        # Workers cancelados cancelam seus jobs e liberam as lanes antes de retornar
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        # Jobs órfãos (não deveriam existir) não podem rodar após o fechamento do Redis
+        for job in list(self._jobs):
+            job.cancel()
+        await asyncio.gather(*self._jobs, return_exceptions=True)
+
+        self._tasks = []
+        emoji_logger.system_info(f"Fila de mensagens parada ({len(pending)} workers interrompidos)")
+
+    async def _worker_loop(self, worker_id: int):
+        """Loop de um worker: reivindica uma lane pronta e a drena"""
+        while self.running:
+            try:
+                lane = await self._claim_lane()
+
+                if lane is None:
+                    await asyncio.sleep(self.idle_interval)
+                    continue
+
+                await self._drain_lane(worker_id, lane)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no worker {worker_id} da fila {self.queue_name}: {e}")
+                await asyncio.sleep(1)
+
+    async def _claim_lane(self) -> Optional[int]:
+        """Reivindica uma lane com itens pendentes e sem consumidor"""
+        ready_lanes = await redis_client.get_set_members(self._ready_key)
+        random.shuffle(ready_lanes)
+
+        for lane in ready_lanes:
+            acquired = await redis_client.acquire_lock(
+                self._lane_lock(int(lane)),
+                ttl=self.visibility_timeout,
+                owner=self.owner_id
+            )
+            if acquired:
+                await redis_client.remove_from_set(self._ready_key, lane)
+                return int(lane)
+
+        return None
+
+    async def _drain_lane(self, worker_id: int, lane: int):
+        """
+        Processa os jobs da lane em ordem até esvaziá-la
+
+        O próximo job só começa quando os anteriores terminaram ou estão
+        estacionados (ver parked()). A lane só é liberada quando não há
+        mais jobs em execução, para que outro host não processe o mesmo
+        lead em paralelo.
+        """
+        lane_queue = self._lane_queue(lane)
+        lock_key = self._lane_lock(lane)
+        in_flight: Dict[asyncio.Task, _JobSlot] = {}
+        self._active_lanes.add(lane)
+
+        try:
+            while self.running:
+                await self._wait_until_parked(in_flight)
+
+                job = await redis_client.dequeue_reliable(
+                    lane_queue,
+                    timeout=0,
+                    visibility_timeout=self.visibility_timeout
+                )
+
+                if job is None:
+                    if not in_flight:
+                        break
+
+                    # Só restam jobs estacionados: aguarda término ou novos itens
+                    await asyncio.wait(in_flight.keys(), timeout=self.idle_interval)
+                    self._prune(in_flight)
+                else:
+                    token, item = job
+                    slot = _JobSlot()
+                    task = asyncio.create_task(
+                        self._process_job(worker_id, lane, token, item, slot)
+                    )
+                    in_flight[task] = slot
+                    self._jobs.add(task)
+                    task.add_done_callback(self._jobs.discard)
+
+                await redis_client.renew_lock(lock_key, self.owner_id, self.visibility_timeout)
+
+            if in_flight:
+                await asyncio.gather(*in_flight.keys(), return_exceptions=True)
+
+        finally:
+            # Worker cancelado (shutdown): nenhum job da lane pode seguir sem o lock
+            running_jobs = [task for task in in_flight if not task.done()]
+            for task in running_jobs:
+                task.cancel()
+            if running_jobs:
+                await asyncio.gather(*running_jobs, return_exceptions=True)
+
+            self._active_lanes.discard(lane)
+            await redis_client.release_lock(lock_key, owner=self.owner_id)
+
+            # Itens que chegaram após a última leitura voltam a ficar prontos
+            if await redis_client.queue_size(lane_queue) > 0:
+                await redis_client.add_to_set(self._ready_key, lane)
+
+    async def _wait_until_parked(self, in_flight: Dict[asyncio.Task, _JobSlot]):
+        """Aguarda até todos os jobs em execução terminarem ou estacionarem"""
+        self._prune(in_flight)
+
+        for task, slot in list(in_flight.items()):
+            while not task.done() and not slot.parked.is_set():
+                parked_wait = asyncio.create_task(slot.parked.wait())
+                try:
+                    await asyncio.wait([task, parked_wait], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    parked_wait.cancel()
+
+        self._prune(in_flight)
+
+    @staticmethod
+    def _prune(in_flight: Dict[asyncio.Task, _JobSlot]):
+        for task in [t for t in in_flight if t.done()]:
+            del in_flight[task]
+
+    async def _heartbeat(self, lane: int, token: str):
+        """Mantém a lease do job e o lock da lane enquanto o handler roda"""
+        lane_queue = self._lane_queue(lane)
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+
+            if not await redis_client.extend_lease(lane_queue, token, self.visibility_timeout):
+                logger.warning(f"Lease do job perdida em {lane_queue} (será reentregue)")
+            if not await redis_client.renew_lock(self._lane_lock(lane), self.owner_id, self.visibility_timeout):
+                logger.warning(f"Lock da lane {lane} perdido durante um job")
+
+    async def _process_job(
+        self,
+        worker_id: int,
+        lane: int,
+        token: str,
+        item: Dict[str, Any],
+        slot: _JobSlot
+    ):
+        """Executa o handler e confirma (ou devolve) o job"""
+        _current_job.set(slot)
+        self._in_flight += 1
+        lane_queue = self._lane_queue(lane)
+        heartbeat = asyncio.create_task(self._heartbeat(lane, token))
+
+        enqueued_at = available_since(item)
+        if enqueued_at is not None:
+            self.last_queue_delay = max(0.0, time.time() - enqueued_at)
+
+        try:
+            await self._handler(item.get("data", {}))
+            await redis_client.ack(lane_queue, token)
+
+        except Exception as e:
+            emoji_logger.system_error("Fila de mensagens", f"Job {item.get('id')} falhou no worker {worker_id}: {e}")
+            await redis_client.nack(lane_queue, token, self.max_attempts)
+
+        finally:
+            heartbeat.cancel()
+            self._in_flight -= 1
+
+    async def _recover_lanes(self):
+        """Devolve jobs travados às lanes e marca lanes não vazias como prontas"""
+        for lane in range(self.lanes_count):
+            lane_queue = self._lane_queue(lane)
+
+            await redis_client.requeue_stuck(
+                lane_queue,
+                self.visibility_timeout,
+                self.max_attempts
+            )
+
+            if await redis_client.queue_size(lane_queue) > 0:
+                await redis_client.add_to_set(self._ready_key, lane)
+
+    async def _reaper_loop(self):
+        """Loop que devolve à fila jobs com lease expirada"""
+        while self.running:
+            try:
+                await asyncio.sleep(self.reaper_interval)
+                await self._recover_lanes()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no reaper da fila {self.queue_name}: {e}")
+
+    @property
+    def _lane_queues(self) -> List[str]:
+        return [self._lane_queue(lane) for lane in range(self.lanes_count)]
+
+    async def pending_size(self) -> int:
+        """Retorna total de jobs aguardando nas lanes (um round trip)"""
+        return sum(await redis_client.queue_sizes(self._lane_queues))
+
+    async def oldest_pending_age(self) -> float:
+        """
+        Segundos de espera do job mais antigo ainda pendente nas lanes (um round trip)
+
+        Usa o início de cada lane e o momento da tentativa atual, então
+        uma reentrega não aparece como espera desde o primeiro enqueue.
+        """
+        now = time.time()
+        ages = [
+            now - since
+            for since in (
+                available_since(item)
+                for item in await redis_client.queue_heads(self._lane_queues)
+                if item
+            )
+            if since is not None
+        ]
+        return max(0.0, max(ages, default=0.0))
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas da fila"""
+        lane_queues = self._lane_queues
+        pending = sum(await redis_client.queue_sizes(lane_queues))
+        processing = sum(await redis_client.processing_sizes(lane_queues))
+
+        return {
+            "queue": self.queue_name,
+            "running": self.running,
+            "workers": self.workers_count,
+            "lanes": self.lanes_count,
+            "active_lanes": len(self._active_lanes),
+            "in_flight": self._in_flight,
+            "pending": pending,
+            "processing": processing,
+            "last_queue_delay": round(self.last_queue_delay, 2)
+        }
+
+
+# Singleton global
+inbound_queue = InboundMessageQueue()
@@ -0,0 +1,190 @@
+"""
+Outbound Scheduler - Envio humanizado agendado
+Digitação e envio de respostas agendados no Redis, sem segurar o processamento
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, Optional, Set
+
+from loguru import logger
+from app.utils.logger import emoji_logger
+
+from app.config import settings
+from app.integrations.redis_client import redis_client
+from app.integrations.evolution import evolution_client
+
+
+class OutboundScheduler:
+    """
+    Agenda de envios humanizados
+
+    Em vez de aguardar com asyncio.sleep (leitura, delay de resposta,
+    digitação, delays de mídia), o processamento agenda dois eventos:
+    "digitando" em T-d e o envio do texto em T. Um único dispatcher por
+    processo consome os eventos vencidos do sorted set no Redis, então
+    milhares de envios pendentes não ocupam workers nem memória.
+
+    Eventos vencidos vão para um sorted set de processamento com lease
+    e só saem dele após o envio. Se o processo morrer (ou o envio do
+    texto falhar), o evento volta à agenda quando a lease expira, até
+    OUTBOUND_SCHEDULER_MAX_ATTEMPTS tentativas.
+    """
+
+    def __init__(self):
+        """Inicializa o scheduler com as configurações do .env"""
+        self.schedule_key = "outbound"
+        self.tick = settings.outbound_scheduler_tick
+        self.batch_size = 200
+        self.lease = settings.outbound_scheduler_lease
+        self.max_attempts = settings.outbound_scheduler_max_attempts
+        self.reaper_interval = 5.0
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self._sends: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(settings.outbound_scheduler_max_concurrency)
+
+    async def schedule_reply(
+        self,
+        phone: str,
+        text: str,
+        not_before: Optional[float] = None,
+        extra_delay: float = 0.0,
+        hold_after: float = 0.0
+    ) -> float:
+        """
+        Agenda digitação e envio humanizados de uma resposta
+
+        Args:
+            phone: Número do WhatsApp
+            text: Texto da resposta
+            not_before: Timestamp mínimo para começar (ex.: fim do tempo de leitura)
+            extra_delay: Delay adicional antes de digitar (ex.: antes de mídia)
+            hold_after: Intervalo mínimo antes do próximo envio ao mesmo telefone
+
+        Returns:
+            Timestamp UNIX em que o texto será enviado
+        """
+        now = time.time()
+        start_at = max(now, not_before or now)
+        start_at += evolution_client.calculate_response_delay(text) + extra_delay
+
+        # Mantém a ordem dos envios ao mesmo telefone
+        last_send_key = f"outbound:last_send:{phone}"
+        last_send_at = await redis_client.get(last_send_key)
+        if last_send_at:
+            start_at = max(start_at, float(last_send_at) + settings.delay_between_messages)
+
+        typing_duration = evolution_client.calculate_typing_duration(len(text))
+        send_at = start_at + typing_duration
+        job_id = str(uuid.uuid4())
+
+        await redis_client.schedule(
+            self.schedule_key,
+            {"id": job_id, "action": "typing", "phone": phone, "duration": typing_duration},
+            start_at
+        )
+        await redis_client.schedule(
+            self.schedule_key,
+            {"id": job_id, "action": "text", "phone": phone, "text": text},
+            send_at
+        )
+
+        ttl = int(send_at - now + hold_after) + 60
+        await redis_client.set(last_send_key, str(send_at + hold_after), ttl=ttl)
+
+        emoji_logger.webhook_process(
+            f"Resposta agendada para {phone}",
+            processing_time=send_at - now
+        )
+        return send_at
+
+    async def start(self):
+        """Inicia o dispatcher"""
+        if self.running:
+            logger.warning("Scheduler de envios já está rodando")
+            return
+
+        self.running = True
+        self._task = asyncio.create_task(self._dispatch_loop())
+        emoji_logger.system_ready("Scheduler de envios", tick=self.tick)
+
+    async def stop(self):
+        """Para o dispatcher aguardando envios em andamento"""
+        if not self.running:
+            return
+
+        self.running = False
+
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        # Eventos ainda não vencidos permanecem no Redis para o próximo start
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+
+    async def _dispatch_loop(self):
+        """Loop que dispara os eventos vencidos e recupera os travados"""
+        reaped_at = 0.0
+        while self.running:
+            try:
+                if time.monotonic() - reaped_at >= self.reaper_interval:
+                    reaped_at = time.monotonic()
+                    await redis_client.requeue_expired_scheduled(self.schedule_key, self.max_attempts)
+
+                due = await redis_client.claim_due(self.schedule_key, self.batch_size, self.lease)
+
+                for raw_job, job in due:
+                    task = asyncio.create_task(self._execute(raw_job, job))
+                    self._sends.add(task)
+                    task.add_done_callback(self._sends.discard)
+
+                # Lote cheio: provavelmente há mais itens vencidos
+                if len(due) < self.batch_size:
+                    await asyncio.sleep(self.tick)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no dispatcher de envios: {e}")
+                await asyncio.sleep(1)
+
+    async def _execute(self, raw_job: str, job: Dict[str, Any]):
+        """Executa um evento agendado e o confirma"""
+        async with self._semaphore:
+            try:
+                if job["action"] == "typing":
+                    await evolution_client.start_typing(job["phone"], job["duration"])
+                elif job["action"] == "text":
+                    await evolution_client.send_text_message(
+                        job["phone"],
+                        job["text"],
+                        delay=0,
+                        simulate_typing=False
+                    )
+
+            except Exception as e:
+                emoji_logger.evolution_error(f"Erro no envio agendado {job.get('id')} ({job.get('action')}): {e}")
+
+                # Texto não enviado fica em processamento e volta quando a lease expirar;
+                # "digitando" atrasado não tem valor e é descartado
+                if job["action"] == "text":
+                    return
+
+            await redis_client.complete_scheduled(self.schedule_key, raw_job)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do scheduler"""
+        return {
+            "running": self.running,
+            "scheduled": await redis_client.schedule_size(self.schedule_key),
+            "processing": await redis_client.scheduled_processing_size(self.schedule_key),
+            "sending": len(self._sends)
+        }
+
+
+# Singleton global
+outbound_scheduler = OutboundScheduler()
@@ -0,0 +1,236 @@
+"""
+Response Cache - Cache de respostas para perguntas repetidas (FAQ)
+Chave por texto normalizado + contexto
+Desligado por padrão (RESPONSE_CACHE_ENABLED)
+"""
+
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.utils.keyword_matcher import normalize
+
+# Pontuação e espaços extras não mudam a pergunta ("Quanto custa??" == "quanto custa")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+# Campos do lead que, citados na resposta, a tornam pessoal demais para reaproveitar
+_LEAD_TOKEN_FIELDS = ("name",)
+_LEAD_VALUE_FIELDS = ("phone_number", "email", "document", "address")
+_LEAD_NUMBER_FIELDS = ("bill_value", "consumption_kwh")
+
+# Tokens menores que isso (ex.: "da", "de" em nomes) não identificam o lead
+_MIN_NAME_TOKEN_LENGTH = 3
+
+
+def normalize_question(text: str) -> str:
+    """Texto da pergunta em minúsculas, sem acentos, pontuação ou espaços extras"""
+    return _SPACES_RE.sub(" ", _PUNCTUATION_RE.sub(" ", normalize(text))).strip()
+
+
+def mentions_lead(response: str, lead_data: Optional[Dict[str, Any]]) -> bool:
+    """
+    Indica se a resposta cita algum dado do lead
+
+    Compara cada parte do nome como palavra inteira, os campos de
+    contato/endereço como texto e os valores numéricos (conta,
+    consumo) como número.
+
+    Args:
+        response: Resposta gerada
+        lead_data: Dados do lead
+
+    Returns:
+        True se qualquer dado do lead aparece na resposta
+    """
+    if not lead_data:
+        return False
+
+    text = normalize(response)
+    words = set(normalize_question(response).split())
+
+    for field in _LEAD_TOKEN_FIELDS:
+        for token in normalize_question(str(lead_data.get(field) or "")).split():
+            if len(token) >= _MIN_NAME_TOKEN_LENGTH and token in words:
+                return True
+
+    for field in _LEAD_VALUE_FIELDS:
+        value = normalize(str(lead_data.get(field) or "")).strip()
+        if value and value in text:
+            return True
+
+    for field in _LEAD_NUMBER_FIELDS:
+        value = lead_data.get(field)
+        if value in (None, ""):
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            continue
+        # "450", "450.00" e "450,00" são o mesmo valor na resposta
+        candidates = {f"{number:g}", f"{number:.2f}", f"{number:.2f}".replace(".", ",")}
+        if any(re.search(rf"(?<![\d.,]){re.escape(c)}(?![\d])", text) for c in candidates):
+            return True
+
+    return False
+
+
+@dataclass
+class _Entry:
+    """Resposta em cache"""
+    response: str
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Cache LRU com TTL na frente da chamada ao LLM
+
+    A chave combina a pergunta normalizada com as demais entradas do
+    prompt (primary_context, decision_stage, emoção dominante e
+    urgência), para que a mesma pergunta em outro momento da conversa
+    não compartilhe resposta.
+
+    Contextos em RESPONSE_CACHE_EXCLUDED_CONTEXTS e mensagens com menos
+    de RESPONSE_CACHE_MIN_QUESTION_TOKENS palavras nunca usam o cache.
+    """
+
+    def __init__(self):
+        """Inicializa o cache com as configurações do .env"""
+        self.enabled = settings.response_cache_enabled
+        self.max_entries = settings.response_cache_max_entries
+        self.ttl = settings.response_cache_ttl
+        self.max_message_length = settings.response_cache_max_message_length
+        self.min_question_tokens = settings.response_cache_min_question_tokens
+        self.excluded_contexts = {
+            context.strip()
+            for context in settings.response_cache_excluded_contexts.split(",")
+            if context.strip()
+        }
+
+        self._entries: "OrderedDict[Tuple[str, ...], _Entry]" = OrderedDict()
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _context_key(
+        self,
+        context_analysis: Dict[str, Any],
+        emotional_triggers: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, ...]:
+        """Entradas do prompt, além da pergunta, que compõem a chave"""
+        return (
+            str(context_analysis.get("primary_context") or ""),
+            str(context_analysis.get("decision_stage") or ""),
+            str((emotional_triggers or {}).get("dominant_emotion") or ""),
+            str(context_analysis.get("urgency_level") or "")
+        )
+
+    def is_cacheable(self, message: str, context_analysis: Dict[str, Any]) -> bool:
+        """Indica se a mensagem pode usar o cache neste contexto"""
+        return (
+            self.enabled
+            and bool(message)
+            and len(message) <= self.max_message_length
+            and len(normalize_question(message).split()) >= self.min_question_tokens
+            and context_analysis.get("primary_context") not in self.excluded_contexts
+        )
+
+    async def get(
+        self,
+        message: str,
+        context_analysis: Dict[str, Any],
+        emotional_triggers: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """
+        Busca resposta em cache
+
+        Args:
+            message: Mensagem do lead
+            context_analysis: Análise contextual do turno
+            emotional_triggers: Gatilhos emocionais do turno
+
+        Returns:
+            Resposta em cache ou None
+        """
+        if not self.is_cacheable(message, context_analysis):
+            self.bypassed += 1
+            return None
+
+        key = (normalize_question(message), *self._context_key(context_analysis, emotional_triggers))
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.response
+            del self._entries[key]
+
+        self.misses += 1
+        return None
+
+    async def put(
+        self,
+        message: str,
+        context_analysis: Dict[str, Any],
+        response: str,
+        lead_data: Optional[Dict[str, Any]] = None,
+        emotional_triggers: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Guarda resposta gerada pelo LLM
+
+        Respostas que citam qualquer dado do lead (nome, contato, conta)
+        não são reaproveitadas para outros leads.
+
+        Args:
+            message: Mensagem do lead
+            context_analysis: Análise contextual do turno
+            response: Resposta gerada
+            lead_data: Dados do lead
+            emotional_triggers: Gatilhos emocionais do turno
+        """
+        if not response or not self.is_cacheable(message, context_analysis):
+            return
+
+        if mentions_lead(response, lead_data):
+            return
+
+        key = (normalize_question(message), *self._context_key(context_analysis, emotional_triggers))
+        self._entries[key] = _Entry(
+            response=response,
+            expires_at=time.monotonic() + self.ttl
+        )
+        self._entries.move_to_end(key)
+        self.stores += 1
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna ocupação e taxa de acerto do cache"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+# Singleton global
+response_cache = ResponseCache()
@@ -0,0 +1,80 @@
+"""
+Write-Behind - Escritas não críticas fora do caminho da resposta
+Persistência e analytics executados em segundo plano, drenados no shutdown
+"""
+
+import asyncio
+from typing import Any, Awaitable, Dict, Set
+
+from loguru import logger
+
+
+class WriteBehind:
+    """
+    Executor de escritas adiadas
+
+    Contadores de analytics, escritas de cache e a persistência da
+    resposta do assistente não precisam ser aguardados pelo turno do
+    agente. submit() agenda a corrotina e retorna imediatamente; falhas
+    são apenas registradas em log. drain() aguarda as escritas em
+    andamento para que nada se perca no desligamento.
+    """
+
+    def __init__(self):
+        """Inicializa o executor"""
+        self._tasks: Set[asyncio.Task] = set()
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, coro: Awaitable[Any], name: str = "write") -> asyncio.Task:
+        """
+        Agenda uma escrita em segundo plano
+
+        Args:
+            coro: Corrotina da escrita
+            name: Nome usado nos logs de erro
+
+        Returns:
+            Task criada
+        """
+        task = asyncio.create_task(self._run(coro, name))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, coro: Awaitable[Any], name: str):
+        """Executa a escrita registrando falhas"""
+        try:
+            await coro
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Erro na escrita adiada '{name}': {e}")
+
+    async def drain(self, timeout: float = 10.0):
+        """
+        Aguarda as escritas pendentes
+
+        Args:
+            timeout: Tempo máximo de espera em segundos
+        """
+        if not self._tasks:
+            return
+
+        pending = len(self._tasks)
+        done, not_done = await asyncio.wait(set(self._tasks), timeout=timeout)
+
+        if not_done:
+            logger.warning(f"{len(not_done)} de {pending} escritas adiadas não concluídas no shutdown")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Retorna métricas do executor"""
+        return {
+            "pending": len(self._tasks),
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+
+# Singleton global
+write_behind = WriteBehind()
@@ -266,18 +266,19 @@ class FollowUpAgent:
             )
             
             if sent:
-                # Registrar envio
-                await supabase_client.client.table("messages").insert({
-                    "lead_id": lead_id,
+                # Registrar envio (gravado em lote pelo buffer de mensagens)
+                conversation = await supabase_client.get_conversation_by_phone(lead.get("phone"))
+                await supabase_client.save_message({
+                    "conversation_id": conversation["id"] if conversation else None,
                     "sender": "assistant",
                     "content": message,
                     "message_type": "followup",
                     "metadata": {
+                        "lead_id": lead_id,
                         "followup_type": followup_type,
                         "track_response": track_response
-                    },
-                    "created_at": datetime.now().isoformat()
-                }).execute()
+                    }
+                })
                 
                 # Atualizar último contato
                 await supabase_client.update_lead(lead_id, {
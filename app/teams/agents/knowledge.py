@@ -122,28 +122,28 @@ class KnowledgeAgent:
     async def load_knowledge_base(self):
         """Carrega base de conhecimento do Supabase"""
         try:
-            # Buscar documentos do banco
-            documents = await supabase_client.client.table("knowledge_base")\
-                .select("*")\
-                .eq("is_active", True)\
-                .execute()
+            # Buscar documentos do banco em páginas
+            loaded = 0
+            async for doc in supabase_client.iter_rows(
+                "knowledge_base",
+                filters=lambda query: query.eq("is_active", True)
+            ):
+                # Adicionar ao knowledge base
+                await self.knowledge_base.add_document(
+                    content=doc["content"],
+                    metadata={
+                        "id": doc["id"],
+                        "title": doc["title"],
+                        "category": doc["category"],
+                        "source": doc.get("source"),
+                        "created_at": doc["created_at"],
+                        "tags": doc.get("tags", [])
+                    }
+                )
+                loaded += 1
             
-            if documents.data:
-                for doc in documents.data:
-                    # Adicionar ao knowledge base
-                    await self.knowledge_base.add_document(
-                        content=doc["content"],
-                        metadata={
-                            "id": doc["id"],
-                            "title": doc["title"],
-                            "category": doc["category"],
-                            "source": doc.get("source"),
-                            "created_at": doc["created_at"],
-                            "tags": doc.get("tags", [])
-                        }
-                    )
-                
-                logger.info(f"📚 Carregados {len(documents.data)} documentos na base de conhecimento")
+            if loaded:
+                logger.info(f"📚 Carregados {loaded} documentos na base de conhecimento")
             
             # Carregar embeddings se existirem
             await self.embeddings_manager.load_embeddings()
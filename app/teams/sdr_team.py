@@ -393,14 +393,6 @@ class SDRTeam:
             # Atualizar contexto no banco
             await self._update_lead_context(phone, lead_data, response_text)
             
-            # Salvar histórico
-            await self._save_conversation_history(
-                phone=phone,
-                user_message=message,
-                assistant_message=response_text,
-                conversation_id=conversation_id
-            )
-            
             # Log de métricas
             if hasattr(self.team, 'session_metrics'):
                 metrics = self.team.session_metrics
@@ -442,38 +434,6 @@ class SDRTeam:
         except Exception as e:
             emoji_logger.supabase_error(f"Erro ao atualizar contexto: {e}", table="leads")
     
-    async def _save_conversation_history(
-        self,
-        phone: str,
-        user_message: str,
-        assistant_message: str,
-        conversation_id: Optional[str]
-    ):
-        """Salva histórico da conversa"""
-        try:
-            # Salvar mensagem do usuário
-            await supabase_client.save_message(
-                conversation_id=conversation_id,
-                content=user_message,
-                sender="user",
-                metadata={"phone": phone}
-            )
-            
-            # Salvar resposta do assistente
-            await supabase_client.save_message(
-                conversation_id=conversation_id,
-                content=assistant_message,
-                sender="assistant",
-                metadata={
-                    "phone": phone,
-                    "team_used": True,
-                    "agents_activated": self._get_activated_agents()
-                }
-            )
-            
-        except Exception as e:
-            emoji_logger.supabase_error(f"Erro ao salvar histórico: {e}", table="conversations")
-    
     def _get_activated_agents(self) -> List[str]:
         """Retorna lista de agentes que foram ativados na última execução"""
         # TODO: Implementar tracking de agentes ativados
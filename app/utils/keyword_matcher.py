@@ -0,0 +1,117 @@
+"""
+Keyword Matcher - Busca de múltiplas palavras-chave em uma única passada
+Regex em formato de trie compilada uma vez a partir de todas as tabelas
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+# Tabelas: categoria -> rótulo -> palavras-chave
+KeywordTables = Dict[str, Dict[str, List[str]]]
+
+# Resultado: categoria -> rótulo -> quantidade de palavras-chave distintas encontradas
+KeywordHits = Dict[str, Dict[str, int]]
+
+
+def normalize(text: str) -> str:
+    """Minúsculas sem acentos (ç -> c, ã -> a)"""
+    return unicodedata.normalize("NFKD", text.casefold()).encode("ascii", "ignore").decode("ascii")
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """
+    Regex equivalente à alternância das palavras, estruturada como trie
+
+    Cada posição do texto segue um único ramo por caractere em vez de
+    testar todas as palavras; continuações opcionais são gulosas, então
+    a palavra mais longa que casa na posição é a retornada.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+
+        if not branches:
+            return ""
+
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if terminal:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Casamento de todas as tabelas de palavras-chave em uma passada
+
+    Texto e palavras-chave são normalizados (minúsculas, sem acento). A
+    busca mantém a semântica de substring do `kw in content`: casa no
+    meio de palavras e encontra ocorrências sobrepostas. A regex em
+    lookahead testa cada posição uma vez e devolve a palavra mais longa
+    ali; as palavras que são prefixo dela também casaram na posição.
+    """
+
+    def __init__(self, tables: KeywordTables):
+        """
+        Compila o matcher
+
+        Args:
+            tables: Categoria -> rótulo -> palavras-chave
+        """
+        self.tables = tables
+        self._labels: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+
+        for category, labels in tables.items():
+            for label, keywords in labels.items():
+                for keyword in keywords:
+                    self._labels[normalize(keyword)].append((category, label))
+
+        keywords = sorted(self._labels)
+        self._prefixes: Dict[str, List[str]] = {
+            keyword: [other for other in keywords if keyword.startswith(other)]
+            for keyword in keywords
+        }
+        self._pattern = re.compile(f"(?=({_trie_pattern(keywords)}))")
+
+    def find(self, text: str) -> Set[str]:
+        """
+        Palavras-chave (normalizadas) presentes no texto
+
+        Args:
+            text: Texto a analisar
+
+        Returns:
+            Conjunto de palavras-chave encontradas
+        """
+        found: Set[str] = set()
+        for match in self._pattern.finditer(normalize(text)):
+            longest = match.group(1)
+            if longest and longest not in found:
+                found.update(self._prefixes[longest])
+        return found
+
+    def scan(self, text: str) -> KeywordHits:
+        """
+        Rótulos de todas as categorias presentes no texto
+
+        Args:
+            text: Texto a analisar
+
+        Returns:
+            Categoria -> rótulo -> quantidade de palavras-chave distintas
+        """
+        hits: KeywordHits = defaultdict(lambda: defaultdict(int))
+        for keyword in self.find(text):
+            for category, label in self._labels[keyword]:
+                hits[category][label] += 1
+        return hits
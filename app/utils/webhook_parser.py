@@ -0,0 +1,89 @@
+"""
+Webhook Parser - Leitura rápida dos eventos da Evolution API
+Identifica o evento antes do parse completo e descarta blobs de mídia desnecessários
+"""
+
+import re
+from typing import Any, Dict, Optional
+
+import orjson
+
+# Campo "event" procurado apenas no início do corpo
+_EVENT_PEEK_BYTES = 512
+_EVENT_PREFIX = b'{"event":"'
+_EVENT_RE = re.compile(rb'"event"\s*:\s*"([^"]+)"')
+
+# Strings base64 grandes (thumbnails, mídia inline) que só o MESSAGES_UPSERT usa
+_MEDIA_MIN_LENGTH = 256
+_MEDIA_FIELD_RE = re.compile(rb'"(jpegThumbnail|thumbnail|base64)"\s*:\s*"[^"\\]{%d,}"' % _MEDIA_MIN_LENGTH)
+
+
+def _top_level(prefix: bytes) -> bool:
+    """Verifica se o fim do prefixo está no primeiro nível do objeto JSON"""
+    depth = 0
+    in_string = False
+    escaped = False
+
+    for byte in prefix:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif byte == 0x5C:  # \
+                escaped = True
+            elif byte == 0x22:  # "
+                in_string = False
+        elif byte == 0x22:
+            in_string = True
+        elif byte in (0x7B, 0x5B):  # { [
+            depth += 1
+        elif byte in (0x7D, 0x5D):  # } ]
+            depth -= 1
+
+    return depth == 1 and not in_string
+
+
+def peek_event(body: bytes) -> Optional[str]:
+    """
+    Lê o campo "event" sem fazer o parse do payload
+
+    Args:
+        body: Corpo bruto da requisição
+
+    Returns:
+        Nome do evento ou None se não encontrado no início do corpo
+    """
+    # Caso comum: "event" é a primeira chave do objeto
+    if body.startswith(_EVENT_PREFIX):
+        end = body.find(b'"', len(_EVENT_PREFIX))
+        if end != -1:
+            return body[len(_EVENT_PREFIX):end].decode("utf-8", "replace")
+
+    head = body[:_EVENT_PEEK_BYTES]
+
+    for match in _EVENT_RE.finditer(head):
+        if _top_level(head[:match.start()]):
+            return match.group(1).decode("utf-8", "replace")
+
+    return None
+
+
+def parse_event(body: bytes, keep_media: bool = True) -> Dict[str, Any]:
+    """
+    Faz o parse do payload com orjson
+
+    Args:
+        body: Corpo bruto da requisição
+        keep_media: Se False, blobs base64 grandes viram null antes do parse
+
+    Returns:
+        Payload decodificado
+    """
+    # Sem string longa o bastante não há blob a remover
+    if not keep_media and len(body) > _MEDIA_MIN_LENGTH:
+        body = _MEDIA_FIELD_RE.sub(rb'"\1":null', body)
+
+    data = orjson.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Payload do webhook deve ser um objeto JSON")
+
+    return data
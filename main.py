@@ -14,7 +14,14 @@ from app.utils.logger import emoji_logger
 from app.config import settings
 from app.api import health, webhooks, teams
 from app.integrations.supabase_client import supabase_client
+from app.integrations.postgres import postgres_backend
 from app.integrations.redis_client import redis_client
+from app.services.message_queue import inbound_queue
+from app.services.outbound_scheduler import outbound_scheduler
+from app.services.write_behind import write_behind
+from app.services.message_buffer import message_buffer
+from app.services.analytics_sink import analytics_sink
+from app.services.event_aggregator import event_aggregator
 from app.teams import create_sdr_team
 
 # Configuração do logger
@@ -43,6 +50,17 @@ async def lifespan(app: FastAPI):
         await supabase_client.test_connection()
         emoji_logger.system_ready("Supabase")
         
+        # Pool asyncpg para as queries do caminho quente (fallback: REST)
+        if settings.database_backend == "asyncpg":
+            await postgres_backend.connect()
+        
+        # Gravação em lote das mensagens
+        if settings.message_buffer_enabled:
+            await message_buffer.start(supabase_client.insert_messages)
+        
+        # Gravação em lote dos eventos de analytics
+        await analytics_sink.start(supabase_client.insert_events)
+        
         # Inicializa o Team SDR
         team = await create_sdr_team()
         emoji_logger.system_ready("SDR Team", members_count=len(team.team.members))
@@ -52,6 +70,17 @@ async def lifespan(app: FastAPI):
             await team.crm_agent.initialize()
             emoji_logger.system_ready("Kommo CRM")
         
+        # Inicia gravação em lote de presença e leituras
+        await event_aggregator.start()
+        
+        # Inicia dispatcher de envios agendados
+        if settings.outbound_scheduler_enabled:
+            await outbound_scheduler.start()
+        
+        # Inicia workers da fila de mensagens
+        if settings.inbound_queue_enabled:
+            await inbound_queue.start(webhooks.process_queued_message)
+        
         emoji_logger.system_ready("SDR IA Solar Prime", startup_time=3.0)
         
     except Exception as e:
@@ -64,6 +93,20 @@ async def lifespan(app: FastAPI):
     emoji_logger.system_info("Encerrando SDR IA Solar Prime...")
     
     try:
+        # Para workers antes de desconectar do Redis
+        await inbound_queue.stop()
+        await outbound_scheduler.stop()
+        
+        # Conclui escritas adiadas (respostas, analytics, presença e leituras)
+        await write_behind.drain()
+        await event_aggregator.stop()
+        await message_buffer.stop()
+        await analytics_sink.stop()
+        
+        # Encerra os pools de queries do banco
+        await postgres_backend.disconnect()
+        await supabase_client.close()
+        
         # Desconecta do Redis
         await redis_client.disconnect()
         emoji_logger.system_info("Redis desconectado")
@@ -0,0 +1,88 @@
+"""
+Benchmark de travamento do event loop nas queries do Supabase
+Compara .execute() síncrono no loop com SupabaseClient.execute (pool de threads)
+
+Uso:
+    python scripts/benchmark_event_loop_stall.py --concurrency 50 --rounds 5
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.integrations.supabase_client import supabase_client
+
+HEARTBEAT_INTERVAL = 0.01  # 10ms
+
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    """Mede o atraso de um sleep curto: atraso alto = loop travado"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - started - HEARTBEAT_INTERVAL))
+
+
+def build_query():
+    """Query do caminho quente: lead por telefone"""
+    return supabase_client.client.table("leads").select("*").eq("phone_number", "5500000000000").limit(1)
+
+
+async def blocking_query():
+    """Comportamento anterior: execute() síncrono dentro da corrotina"""
+    return build_query().execute()
+
+
+async def offloaded_query():
+    """Comportamento atual: execute() no pool de threads"""
+    return await supabase_client.execute(build_query())
+
+
+async def run(mode: str, query_func, concurrency: int, rounds: int):
+    """Executa rodadas de queries concorrentes medindo o loop"""
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*[query_func() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+
+    total_queries = concurrency * rounds
+    print(
+        f"{mode:<12}"
+        f"{total_queries / elapsed:>10.1f} q/s"
+        f"{sum(lags) * 1000:>12.0f} ms travado"
+        f"{max(lags) * 1000:>10.0f} ms máx"
+        f"{(statistics.quantiles(lags, n=100)[98] if len(lags) > 1 else 0) * 1000:>10.0f} ms p99"
+    )
+
+
+async def main():
+    """Executa o benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    # Aquece conexões HTTP
+    await offloaded_query()
+
+    print(f"{args.concurrency} queries concorrentes x {args.rounds} rodadas")
+    await run("síncrono", blocking_query, args.concurrency, args.rounds)
+    await run("thread pool", offloaded_query, args.concurrency, args.rounds)
+
+    await supabase_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
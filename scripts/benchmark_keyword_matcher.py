@@ -0,0 +1,152 @@
+"""
+Benchmark do custo por turno da análise contextual
+Compara a varredura anterior (substring por palavra-chave em cada mensagem)
+com o keyword_matcher em uma passada e os agregados incrementais
+
+Uso:
+    python scripts/benchmark_keyword_matcher.py --messages 100 --turns 2000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.agents.conversation_features import (
+    ConversationFeatures,
+    EMOTION_KEYWORDS,
+    INTENT_KEYWORDS,
+    OBJECTION_KEYWORDS,
+    SENTIMENT_KEYWORDS,
+    SIGNAL_KEYWORDS,
+    STAGE_KEYWORDS,
+    TOPIC_KEYWORDS,
+    URGENCY_KEYWORDS,
+    keyword_matcher
+)
+
+SAMPLE_PHRASES = [
+    "Oi, tudo bem? Quero saber mais sobre energia solar",
+    "Minha conta de luz vem uns R$ 850 por mês, está muito caro",
+    "Como funciona o desconto? Não entendo bem o contrato",
+    "Talvez depois, preciso pensar com minha esposa",
+    "Ótimo! Podemos agendar uma reunião hoje?",
+    "Já tenho outro fornecedor, mas a garantia de vocês parece melhor",
+    "Sou o responsável pela minha empresa, eu decido",
+    "Qual o prazo de instalação no telhado?",
+    "Adorei a proposta, vamos fazer",
+    "Não sei se vale a pena, tenho dúvida sobre o investimento",
+]
+
+
+def build_messages(count: int) -> list:
+    """Gera histórico sintético em ordem cronológica"""
+    started = datetime(2025, 1, 1, 9, 0)
+    return [
+        {
+            "id": str(index),
+            "sender": "user" if index % 2 == 0 else "assistant",
+            "content": random.choice(SAMPLE_PHRASES),
+            "created_at": (started + timedelta(minutes=7 * index)).isoformat()
+        }
+        for index in range(count)
+    ]
+
+
+def legacy_turn(messages: list, current_message: str):
+    """Varredura anterior: cada heurística percorre o histórico com `kw in content`"""
+    for table in (INTENT_KEYWORDS, TOPIC_KEYWORDS, OBJECTION_KEYWORDS, SIGNAL_KEYWORDS):
+        for msg in messages:
+            content = msg["content"].lower()
+            for keywords in table.values():
+                any(kw in content for kw in keywords)
+
+    for msg in messages[-10:]:
+        content = msg["content"].lower()
+        for keywords in SENTIMENT_KEYWORDS.values():
+            any(kw in content for kw in keywords)
+
+    recent_content = " ".join(m["content"] for m in messages[-10:]).lower()
+    for keywords in STAGE_KEYWORDS.values():
+        any(kw in recent_content for kw in keywords)
+
+    combined_text = current_message.lower() + " " + " ".join(m["content"] for m in messages[-5:])
+    for keywords in URGENCY_KEYWORDS.values():
+        any(kw in combined_text for kw in keywords)
+
+    for msg in messages[-20:]:
+        content = msg["content"].lower()
+        for keywords in EMOTION_KEYWORDS.values():
+            for kw in keywords:
+                if kw in content:
+                    pass
+
+
+def rebuild_turn(messages: list, current_message: str):
+    """Matcher em uma passada, reconstruindo os agregados (cache miss)"""
+    features = ConversationFeatures.from_messages(messages)
+    features.to_analysis(current_message)
+    features.emotional_triggers()
+
+
+def incremental_turn(features: ConversationFeatures, messages: list, current_message: str):
+    """Matcher com agregados em cache: só a mensagem nova é analisada"""
+    features.add(messages[-1])
+    features.to_analysis(current_message)
+    features.emotional_triggers()
+
+
+def measure(name: str, func, turns: int, baseline: float = None) -> float:
+    """Executa func por N turnos e imprime o custo médio"""
+    started = time.perf_counter()
+    for _ in range(turns):
+        func()
+    per_turn = (time.perf_counter() - started) / turns * 1_000_000
+
+    speedup = f"{baseline / per_turn:>8.1f}x" if baseline else ""
+    print(f"  {name:<34}{per_turn:>10.1f} µs/turno{speedup}")
+    return per_turn
+
+
+def main():
+    """Executa o benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    messages = build_messages(args.messages)
+    current_message = messages[-1]["content"]
+    features = ConversationFeatures.from_messages(messages[:-1])
+
+    print(f"Janela de {args.messages} mensagens, {args.turns} turnos")
+    baseline = measure("varredura anterior", lambda: legacy_turn(messages, current_message), args.turns)
+    measure("matcher + reconstrução", lambda: rebuild_turn(messages, current_message), args.turns, baseline)
+    measure(
+        "matcher + agregados incrementais",
+        lambda: incremental_turn(features, messages, current_message),
+        args.turns,
+        baseline
+    )
+
+    print("\nUma mensagem, todas as tabelas")
+    tables = (
+        INTENT_KEYWORDS, TOPIC_KEYWORDS, OBJECTION_KEYWORDS, SIGNAL_KEYWORDS,
+        SENTIMENT_KEYWORDS, STAGE_KEYWORDS, URGENCY_KEYWORDS, EMOTION_KEYWORDS
+    )
+    sample = SAMPLE_PHRASES[1]
+    scan_baseline = measure(
+        "substring por palavra-chave",
+        lambda: [kw in sample.lower() for table in tables for keywords in table.values() for kw in keywords],
+        args.turns * 10
+    )
+    measure("keyword_matcher.scan", lambda: keyword_matcher.scan(sample), args.turns * 10, scan_baseline)
+
+
+if __name__ == "__main__":
+    main()
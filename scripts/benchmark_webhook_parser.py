@@ -0,0 +1,110 @@
+"""
+Microbenchmark do parse de eventos do webhook da Evolution API
+Compara json.loads (stdlib) com o fast path usado em evolution_webhook
+"""
+import base64
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.utils.webhook_parser import peek_event, parse_event
+
+ROUTED_EVENTS = {"MESSAGES_UPSERT", "CONNECTION_UPDATE", "QRCODE_UPDATED", "MESSAGES_UPDATE", "PRESENCE_UPDATE"}
+
+THUMBNAIL = base64.b64encode(os.urandom(30 * 1024)).decode()
+
+
+def build_payloads():
+    """Payloads representativos de cada tipo de evento"""
+    base = {"instance": "sdr-solar", "destination": "https://sdr.example.com/webhooks/evolution"}
+    key = {"remoteJid": "5581999999999@s.whatsapp.net", "fromMe": False, "id": "3EB0C767D26A1D8E4A2F"}
+
+    return {
+        "MESSAGES_UPSERT (texto)": {
+            "event": "MESSAGES_UPSERT", **base,
+            "data": {"messages": [{
+                "key": key,
+                "pushName": "Lead",
+                "messageTimestamp": 1723400000,
+                "message": {"conversation": "Oi, quero saber sobre energia solar para minha empresa"}
+            }]}
+        },
+        "MESSAGES_UPSERT (imagem)": {
+            "event": "MESSAGES_UPSERT", **base,
+            "data": {"messages": [{
+                "key": key,
+                "messageTimestamp": 1723400000,
+                "message": {"imageMessage": {
+                    "mimetype": "image/jpeg",
+                    "caption": "minha conta de luz",
+                    "jpegThumbnail": THUMBNAIL
+                }}
+            }]}
+        },
+        "MESSAGES_UPDATE": {
+            "event": "MESSAGES_UPDATE", **base,
+            "data": {"key": key, "update": {"status": 4}}
+        },
+        "PRESENCE_UPDATE": {
+            "event": "PRESENCE_UPDATE", **base,
+            "data": {"id": key["remoteJid"], "presences": {
+                key["remoteJid"]: {"lastKnownPresence": "composing"}
+            }}
+        },
+        "CONTACTS_UPDATE (thumbnail, sem handler)": {
+            "event": "CONTACTS_UPDATE", **base,
+            "data": [{"remoteJid": key["remoteJid"], "pushName": "Lead", "thumbnail": THUMBNAIL}]
+        },
+        "CHATS_UPDATE (thumbnail, sem handler)": {
+            "event": "CHATS_UPDATE", **base,
+            "data": [{"remoteJid": key["remoteJid"], "unreadMessages": 3, "thumbnail": THUMBNAIL}]
+        }
+    }
+
+
+def stdlib_path(body: bytes):
+    """Comportamento anterior: parse completo com json"""
+    return json.loads(body)
+
+
+def fast_path(body: bytes):
+    """Mesmo roteamento de evolution_webhook"""
+    event = peek_event(body)
+    if event is not None and event not in ROUTED_EVENTS:
+        return None
+    return parse_event(body, keep_media=event in (None, "MESSAGES_UPSERT"))
+
+
+def measure(func, body: bytes, duration: float = 1.0) -> float:
+    """Eventos por segundo processados por func"""
+    iterations = 0
+    started = time.perf_counter()
+    deadline = started + duration
+
+    while True:
+        for _ in range(100):
+            func(body)
+        iterations += 100
+        now = time.perf_counter()
+        if now >= deadline:
+            return iterations / (now - started)
+
+
+def main():
+    """Executa o benchmark"""
+    print(f"{'evento':<42}{'bytes':>8}{'json/s':>14}{'fast/s':>14}{'ganho':>8}")
+
+    for name, payload in build_payloads().items():
+        body = json.dumps(payload).encode()
+        baseline = measure(stdlib_path, body)
+        optimized = measure(fast_path, body)
+        print(f"{name:<42}{len(body):>8}{baseline:>14,.0f}{optimized:>14,.0f}{optimized / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
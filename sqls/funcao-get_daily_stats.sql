@@ -0,0 +1,36 @@
+-- ============================================================
+-- ESTATÍSTICAS DIÁRIAS EM UMA ÚNICA QUERY
+-- SDR IA SolarPrime v0.2
+-- Execute este script no SQL Editor do Supabase
+-- ============================================================
+
+-- Substitui as quatro queries de contagem de get_daily_stats.
+-- Cada contagem usa um índice existente:
+--   idx_leads_created, idx_leads_meeting_scheduled_at e
+--   idx_conversations_active (índice parcial de conversas ativas)
+CREATE OR REPLACE FUNCTION get_daily_stats(p_day_start TIMESTAMPTZ)
+RETURNS JSON
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+  SELECT json_build_object(
+    'total_leads', new_leads.total,
+    'qualified_leads', new_leads.qualified,
+    'active_conversations', (
+      SELECT COUNT(*) FROM conversations WHERE status = 'ACTIVE'
+    ),
+    'meetings_scheduled', (
+      SELECT COUNT(*) FROM leads WHERE meeting_scheduled_at >= p_day_start
+    )
+  )
+  FROM (
+    SELECT
+      COUNT(*) AS total,
+      COUNT(*) FILTER (WHERE qualification_status = 'QUALIFIED') AS qualified
+    FROM leads
+    WHERE created_at >= p_day_start
+  ) new_leads;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_daily_stats(TIMESTAMPTZ) TO service_role;
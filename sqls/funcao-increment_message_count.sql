@@ -0,0 +1,26 @@
+-- ============================================================
+-- CONTADOR ATÔMICO DE MENSAGENS DA CONVERSA
+-- SDR IA SolarPrime v0.2
+-- Execute este script no SQL Editor do Supabase
+-- ============================================================
+
+-- Incrementa total_messages em um único UPDATE (sem SELECT + UPDATE),
+-- sem perder incrementos quando mensagens do lead e do assistente
+-- são salvas ao mesmo tempo. Chamada via RPC pelo SupabaseClient.
+CREATE OR REPLACE FUNCTION increment_message_count(
+  p_conversation_id UUID,
+  p_amount INTEGER DEFAULT 1
+)
+RETURNS INTEGER
+LANGUAGE sql
+SECURITY INVOKER
+AS $$
+  UPDATE conversations
+  SET
+    total_messages = COALESCE(total_messages, 0) + p_amount,
+    last_message_at = NOW()
+  WHERE id = p_conversation_id
+  RETURNING total_messages;
+$$;
+
+GRANT EXECUTE ON FUNCTION increment_message_count(UUID, INTEGER) TO service_role;
@@ -0,0 +1,31 @@
+-- ============================================================
+-- MIGRAÇÃO: RECALCULA total_messages E last_message_at
+-- SDR IA SolarPrime v0.2
+-- Execute este script no SQL Editor do Supabase uma única vez,
+-- após criar a função increment_message_count
+-- ============================================================
+
+-- Corrige contadores que perderam incrementos no read-modify-write antigo
+UPDATE conversations c
+SET
+  total_messages = counts.total,
+  last_message_at = GREATEST(c.last_message_at, counts.last_at)
+FROM (
+  SELECT
+    conversation_id,
+    COUNT(*)::INTEGER AS total,
+    MAX(created_at) AS last_at
+  FROM messages
+  WHERE conversation_id IS NOT NULL
+  GROUP BY conversation_id
+) counts
+WHERE c.id = counts.conversation_id
+  AND c.total_messages IS DISTINCT FROM counts.total;
+
+-- Conversas sem mensagens
+UPDATE conversations c
+SET total_messages = 0
+WHERE COALESCE(c.total_messages, -1) <> 0
+  AND NOT EXISTS (
+    SELECT 1 FROM messages m WHERE m.conversation_id = c.id
+  );
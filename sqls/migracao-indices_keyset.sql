@@ -0,0 +1,21 @@
+-- ============================================================
+-- ÍNDICES PARA LEITURAS PAGINADAS POR KEYSET
+-- SDR IA SolarPrime v0.2
+-- Execute este script no SQL Editor do Supabase
+-- ============================================================
+
+-- SupabaseClient.iter_rows pagina por (created_at, id): cada página
+-- vira um range scan no índice composto, sem ordenar a tabela inteira.
+-- Linhas com created_at nulo são lidas por id (chave primária).
+
+-- Leads qualificados (get_qualified_leads)
+CREATE INDEX IF NOT EXISTS idx_leads_created_at_id
+ON leads (created_at, id);
+
+-- Limpeza de sessões antigas (cleanup_old_sessions)
+CREATE INDEX IF NOT EXISTS idx_agent_sessions_created_at_id
+ON agent_sessions (created_at, id);
+
+-- Carga da base de conhecimento (KnowledgeAgent.load_knowledge_base)
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_created_at_id
+ON knowledge_base (created_at, id);
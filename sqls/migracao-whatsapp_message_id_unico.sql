@@ -0,0 +1,41 @@
+-- ============================================================
+-- MIGRAÇÃO: whatsapp_message_id ÚNICO EM messages
+-- SDR IA SolarPrime v0.2
+-- Execute este script no SQL Editor do Supabase uma única vez
+-- ============================================================
+
+-- A fila de entrada reentrega jobs (nack, lease expirado): o insert de
+-- mensagens usa ON CONFLICT (whatsapp_message_id) DO NOTHING para não
+-- duplicar linhas. O índice precisa ser único e sem WHERE para que o
+-- ON CONFLICT (e o on_conflict do PostgREST) o encontre; NULLs não
+-- conflitam entre si (mensagens do agente não têm id do WhatsApp).
+
+-- Linhas antigas guardavam o id apenas em metadata.message_id
+DO $$
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_name = 'messages' AND column_name = 'metadata'
+  ) THEN
+    UPDATE messages
+    SET whatsapp_message_id = metadata->>'message_id'
+    WHERE whatsapp_message_id IS NULL
+      AND COALESCE(metadata->>'message_id', '') <> '';
+  END IF;
+END $$;
+
+-- Remove duplicatas já gravadas, mantendo a mais antiga
+DELETE FROM messages m
+USING messages older
+WHERE m.whatsapp_message_id = older.whatsapp_message_id
+  AND (COALESCE(older.created_at, '-infinity'), older.id)
+    < (COALESCE(m.created_at, '-infinity'), m.id);
+
+-- Contadores voltam a bater após remover duplicatas
+-- (rode migracao-backfill_total_messages.sql em seguida)
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_whatsapp_message_id
+ON messages (whatsapp_message_id);
+
+-- O índice único substitui o índice simples
+DROP INDEX IF EXISTS idx_messages_whatsapp_id;
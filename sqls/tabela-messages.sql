@@ -47,4 +47,4 @@ create index IF not exists idx_messages_role on public.messages using btree (rol
 
 create index IF not exists idx_messages_created on public.messages using btree (created_at) TABLESPACE pg_default;
 
-create index IF not exists idx_messages_whatsapp_id on public.messages using btree (whatsapp_message_id) TABLESPACE pg_default;
\ No newline at end of file
+create unique index IF not exists idx_messages_whatsapp_message_id on public.messages using btree (whatsapp_message_id) TABLESPACE pg_default;
\ No newline at end of file